@@ -0,0 +1,234 @@
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from collections import deque
+import asyncio
+import math
+import time
+from .config import get_settings
+from .metrics import register_metrics
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Admission lanes, highest priority first
+FIRST_PAGE_LANE = "first_page"
+LOAD_MORE_LANE = "load_more"
+PREFETCH_LANE = "prefetch"
+# Hedge requests never queue, see try_acquire
+HEDGE_LANE = "hedge"
+LANES = (FIRST_PAGE_LANE, LOAD_MORE_LANE, PREFETCH_LANE, HEDGE_LANE)
+
+class AdmissionRejected(Exception):
+    """Raised when a generation cannot be admitted within the maximum queue wait."""
+
+    def __init__(self, lane: str, retry_after: float):
+        super().__init__(f"No generation slot for {lane} within the queue wait")
+        self.lane = lane
+        self.retry_after = retry_after
+
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+class AdmissionSlot:
+    """Slots held by an admitted generation; release is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", lane: str, weight: int):
+        self._controller = controller
+        self.lane = lane
+        self.weight = weight
+        self.acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+class _Waiter:
+    def __init__(self, weight: int):
+        self.weight = weight
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+class LaneStats:
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.peak_depth = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+class AdmissionController:
+    """
+    Bounds the OpenAI generations one worker runs at a time.
+
+    A generation takes `weight` slots (a fan-out search takes one per
+    concurrent branch) out of `max_concurrent`. When none are free it
+    queues in its lane; freed slots go to the highest-priority lane first
+    and in arrival order within a lane. A generation that is not admitted
+    within `max_wait` seconds, or that finds `max_queue` generations
+    already waiting, is rejected with an estimated retry delay so the
+    caller can shed it quickly instead of piling up on the event loop.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_wait: float = 2.0, max_queue: int = 100):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        self._lanes: Dict[str, LaneStats] = {lane: LaneStats() for lane in LANES}
+        self.hold_seconds_total = 0.0
+        self.released = 0
+
+    def _depth(self, lane: Optional[str] = None) -> int:
+        """Waiters still queued; ones that gave up are dropped lazily."""
+        lanes = LANES if lane is None else (lane,)
+        return sum(1 for queued_lane in lanes for waiter in self._queues[queued_lane] if not waiter.future.done())
+
+    def _ahead_of(self, lane: str) -> bool:
+        """Whether anything of the same or higher priority is waiting."""
+        for queued_lane in LANES:
+            if self._depth(queued_lane):
+                return True
+            if queued_lane == lane:
+                return False
+        return False
+
+    def _retry_after(self) -> float:
+        """Rough time for the current queue to drain through the slots."""
+        avg_hold = self.hold_seconds_total / self.released if self.released else 1.0
+        return avg_hold * (self._depth() + 1) / self.max_concurrent
+
+    def _grant(self, weight: int):
+        self.in_flight += weight
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _dispatch(self):
+        # Strict priority: a waiting higher lane is never overtaken
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                waiter = queue[0]
+                if waiter.future.done():
+                    queue.popleft()
+                    continue
+                if self.in_flight + waiter.weight > self.max_concurrent:
+                    return
+                queue.popleft()
+                self._grant(waiter.weight)
+                waiter.future.set_result(None)
+
+    def _release(self, slot: AdmissionSlot):
+        self.in_flight -= slot.weight
+        self.released += 1
+        self.hold_seconds_total += time.monotonic() - slot.acquired_at
+        self._dispatch()
+
+    def try_acquire(self, lane: str, weight: int = 1) -> Optional[AdmissionSlot]:
+        """Take `weight` slots in `lane` only if they are free and nothing is queued."""
+        stats = self._lanes[lane]
+        if self._depth() or self.in_flight + weight > self.max_concurrent:
+            stats.rejected += 1
+            return None
+        self._grant(weight)
+        stats.admitted += 1
+        stats.record_wait(0.0)
+        return AdmissionSlot(self, lane, weight)
+
+    async def acquire(self, lane: str, weight: int = 1) -> AdmissionSlot:
+        """Wait for `weight` slots in `lane`, or raise AdmissionRejected."""
+        weight = max(1, min(weight, self.max_concurrent))
+        stats = self._lanes[lane]
+
+        if not self._ahead_of(lane) and self.in_flight + weight <= self.max_concurrent:
+            self._grant(weight)
+            stats.admitted += 1
+            stats.record_wait(0.0)
+            return AdmissionSlot(self, lane, weight)
+
+        if self._depth() >= self.max_queue or self.max_wait <= 0:
+            stats.rejected += 1
+            raise AdmissionRejected(lane, self._retry_after())
+
+        waiter = _Waiter(weight)
+        queue = self._queues[lane]
+        queue.append(waiter)
+        stats.queued += 1
+        stats.peak_depth = max(stats.peak_depth, len(queue))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            stats.record_wait(time.monotonic() - started)
+            # Slots may have been granted just as the wait ran out
+            if not waiter.future.done():
+                waiter.future.cancel()
+                stats.rejected += 1
+                raise AdmissionRejected(lane, self._retry_after())
+            stats.admitted += 1
+            return AdmissionSlot(self, lane, weight)
+        except asyncio.CancelledError:
+            # The caller went away; hand back slots granted in the meantime
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.in_flight -= weight
+                self._dispatch()
+            else:
+                waiter.future.cancel()
+            raise
+
+        stats.record_wait(time.monotonic() - started)
+        stats.admitted += 1
+        return AdmissionSlot(self, lane, weight)
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for lane, lane_stats in self._lanes.items():
+            waits = lane_stats.admitted + lane_stats.rejected
+            lanes[lane] = {
+                "depth": self._depth(lane),
+                "peak_depth": lane_stats.peak_depth,
+                "admitted": lane_stats.admitted,
+                "queued": lane_stats.queued,
+                "rejected": lane_stats.rejected,
+                "avg_wait_ms": round(lane_stats.wait_seconds_total / waits * 1000, 2) if waits else 0.0,
+                "max_wait_ms": round(lane_stats.wait_seconds_max * 1000, 2),
+            }
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_hold_ms": round(self.hold_seconds_total / self.released * 1000, 2) if self.released else 0.0,
+            "lanes": lanes,
+        }
+
+async def release_after(source: AsyncIterator[Any], slot: Optional[AdmissionSlot]) -> AsyncIterator[Any]:
+    """Iterate `source`, releasing `slot` once it ends or is closed."""
+    try:
+        async for item in source:
+            yield item
+    finally:
+        if slot is not None:
+            slot.release()
+
+async def admitted(lane: str, weight: int, factory) -> AsyncIterator[Any]:
+    """Run the generation made by `factory` once admitted in `lane`."""
+    slot = await admission_controller.acquire(lane, weight)
+    async for item in release_after(factory(), slot):
+        yield item
+
+# Shared admission controller for OpenAI generations in this worker
+admission_controller = AdmissionController(
+    max_concurrent=settings.OPENAI_MAX_CONCURRENT_GENERATIONS,
+    max_wait=settings.ADMISSION_MAX_WAIT,
+    max_queue=settings.ADMISSION_MAX_QUEUE
+)
+
+register_metrics("admission", admission_controller.stats)
\ No newline at end of file
@@ -0,0 +1,250 @@
+from typing import Any, Deque, Dict, Optional, Tuple
+from collections import deque
+import asyncio
+import math
+import time
+import openai
+from .config import get_settings
+from .metrics import register_metrics
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Upstream errors that say OpenAI is unhealthy. Client errors such as a bad
+# request say nothing about its health and are not counted.
+OPENAI_FAILURES = (
+    openai.APIConnectionError,  # Includes timeouts
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+def is_openai_failure(error: BaseException) -> bool:
+    return isinstance(error, OPENAI_FAILURES)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable")
+        self.retry_after = retry_after
+
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+class BreakerPermit:
+    """
+    Permission for one call; report its outcome or release it.
+
+    Only the first report counts, so a permit can be released in a
+    `finally` after success or failure was recorded.
+    """
+
+    def __init__(self, breaker: "CircuitBreaker", probe: bool, period: int = 0):
+        self._breaker = breaker
+        self.probe = probe
+        # The half-open period a probe was let through in
+        self.period = period
+        self.started = time.perf_counter()
+        self.latency: Optional[float] = None
+        self._done = False
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def mark_response(self):
+        """Note the first response, e.g. a stream's first chunk; its delay is the call's latency."""
+        if self.latency is None:
+            self.latency = self.elapsed()
+
+    def success(self):
+        if not self._done:
+            self._done = True
+            self._breaker._record(self, True, self.elapsed() if self.latency is None else self.latency)
+
+    def failure(self):
+        if not self._done:
+            self._done = True
+            self._breaker._record(self, False, self.elapsed())
+
+    def abandon(self):
+        """
+        The caller stopped waiting. The call counts as healthy if it had
+        responded, as slow if it had already taken too long, and not at all
+        otherwise.
+        """
+        if self.latency is not None or self.elapsed() >= self._breaker.slow_seconds:
+            self.success()
+        else:
+            self.release()
+
+    def release(self):
+        """Give the permit back without an outcome, e.g. when the caller went away."""
+        if not self._done:
+            self._done = True
+            self._breaker._release(self)
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream dependency.
+
+    Closed: calls go through and their outcomes are kept for
+    `window_seconds`. Once the window holds `min_calls` calls and the share
+    of failures reaches `error_rate`, or the share of calls slower than
+    `slow_seconds` reaches `slow_rate`, the circuit opens.
+
+    Open: calls fail fast with CircuitOpenError for `open_seconds`, after
+    which the circuit is half-open.
+
+    Half-open: up to `probes` calls at a time are let through. That many
+    healthy probes close the circuit; a failed or slow one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_seconds: float = 10,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30,
+        probes: int = 2
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # (finished at, succeeded, slow) per call in the window
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # Counts half-open periods, so probes from an earlier one are told apart
+        self._half_open_period = 0
+        self.transitions: Dict[str, int] = {}
+        self.rejected = 0
+        self.latency_seconds_total = 0.0
+        self.latency_count = 0
+
+    def _transition(self, state: str):
+        name = f"{self.state}_to_{state}"
+        self.transitions[name] = self.transitions.get(name, 0) + 1
+        logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._half_open_period += 1
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+
+    def current_state(self) -> str:
+        if self.state == OPEN and time.monotonic() >= self.opened_at + self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self.state
+
+    def allows(self) -> bool:
+        """Whether a call would be let through now, without taking a permit."""
+        state = self.current_state()
+        return state == CLOSED or (state == HALF_OPEN and self._probes_in_flight < self.probes)
+
+    def retry_after(self) -> float:
+        if self.current_state() == OPEN:
+            return self.opened_at + self.open_seconds - time.monotonic()
+        # Half-open with every probe slot taken; probes settle quickly
+        return 1.0
+
+    def acquire(self) -> BreakerPermit:
+        """Take a permit for one call, or raise CircuitOpenError."""
+        if not self.allows():
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_after())
+        probe = self.state == HALF_OPEN
+        if probe:
+            self._probes_in_flight += 1
+        return BreakerPermit(self, probe, self._half_open_period)
+
+    def _is_current_probe(self, permit: BreakerPermit) -> bool:
+        """Whether a probe was let through in the current half-open period."""
+        return self.state == HALF_OPEN and permit.period == self._half_open_period
+
+    def _release(self, permit: BreakerPermit):
+        if permit.probe and self._is_current_probe(permit):
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _window(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _record(self, permit: BreakerPermit, succeeded: bool, latency: float):
+        slow = latency >= self.slow_seconds
+        if succeeded:
+            self.latency_seconds_total += latency
+            self.latency_count += 1
+
+        if permit.probe:
+            # Probes from an earlier half-open period no longer count
+            if not self._is_current_probe(permit):
+                return
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not succeeded or slow:
+                self._transition(OPEN)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self._transition(CLOSED)
+            return
+
+        self._outcomes.append((time.monotonic(), succeeded, slow))
+        self._window()
+        if self.state != CLOSED or len(self._outcomes) < self.min_calls:
+            return
+        failures = sum(1 for _, ok, _ in self._outcomes if not ok)
+        slow_calls = sum(1 for _, ok, was_slow in self._outcomes if ok and was_slow)
+        if failures / len(self._outcomes) >= self.error_rate or slow_calls / len(self._outcomes) >= self.slow_rate:
+            self._transition(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        self._window()
+        calls = len(self._outcomes)
+        failures = sum(1 for _, ok, _ in self._outcomes if not ok)
+        slow_calls = sum(1 for _, ok, slow in self._outcomes if ok and slow)
+        return {
+            "state": self.current_state(),
+            "window_calls": calls,
+            "window_error_rate": round(failures / calls, 3) if calls else 0.0,
+            "window_slow_rate": round(slow_calls / calls, 3) if calls else 0.0,
+            "avg_latency_ms": round(self.latency_seconds_total / self.latency_count * 1000, 2) if self.latency_count else 0.0,
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+        }
+
+# Breaker for OpenAI generations; latency is time to the first streamed token
+openai_breaker = CircuitBreaker(
+    "openai",
+    window_seconds=settings.OPENAI_BREAKER_WINDOW,
+    min_calls=settings.OPENAI_BREAKER_MIN_CALLS,
+    error_rate=settings.OPENAI_BREAKER_ERROR_RATE,
+    slow_seconds=settings.OPENAI_BREAKER_SLOW_SECONDS,
+    slow_rate=settings.OPENAI_BREAKER_SLOW_RATE,
+    open_seconds=settings.OPENAI_BREAKER_OPEN_SECONDS,
+    probes=settings.OPENAI_BREAKER_PROBES
+)
+
+register_metrics("openai_breaker", openai_breaker.stats)
\ No newline at end of file
@@ -19,9 +19,45 @@ class Settings(BaseModel):
     # Supabase settings
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
+    # Shared async database client connection pool and timeout (seconds)
+    DATABASE_MAX_CONNECTIONS: int = int(os.getenv("DATABASE_MAX_CONNECTIONS", "50"))
+    DATABASE_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("DATABASE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    DATABASE_KEEPALIVE_EXPIRY: float = float(os.getenv("DATABASE_KEEPALIVE_EXPIRY", "30"))
+    DATABASE_TIMEOUT: float = float(os.getenv("DATABASE_TIMEOUT", "30"))
+    # Direct Postgres connection string, used only by the migration runner
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    
+    # Page size for project, collection and saved word listings
+    LIST_PAGE_SIZE: int = int(os.getenv("LIST_PAGE_SIZE", "50"))
+    LIST_MAX_PAGE_SIZE: int = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
     
     # OpenAI settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Shared OpenAI client connection pool and timeouts (seconds)
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    OPENAI_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    OPENAI_CONNECT_TIMEOUT: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    OPENAI_POOL_TIMEOUT: float = float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))
+    # Circuit breaker: opens when, over WINDOW seconds and at least MIN_CALLS
+    # generations, ERROR_RATE failed or SLOW_RATE took SLOW_SECONDS to the
+    # first token; stays open OPEN_SECONDS, then closes after PROBES good calls
+    OPENAI_BREAKER_WINDOW: float = float(os.getenv("OPENAI_BREAKER_WINDOW", "30"))
+    OPENAI_BREAKER_MIN_CALLS: int = int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "10"))
+    OPENAI_BREAKER_ERROR_RATE: float = float(os.getenv("OPENAI_BREAKER_ERROR_RATE", "0.5"))
+    OPENAI_BREAKER_SLOW_SECONDS: float = float(os.getenv("OPENAI_BREAKER_SLOW_SECONDS", "10"))
+    OPENAI_BREAKER_SLOW_RATE: float = float(os.getenv("OPENAI_BREAKER_SLOW_RATE", "0.8"))
+    OPENAI_BREAKER_OPEN_SECONDS: float = float(os.getenv("OPENAI_BREAKER_OPEN_SECONDS", "30"))
+    OPENAI_BREAKER_PROBES: int = int(os.getenv("OPENAI_BREAKER_PROBES", "2"))
+    # Hedged streaming requests: when no token arrives within the rolling
+    # HEDGE_QUANTILE of time to first token (clamped to MIN/MAX_DELAY seconds),
+    # a second request races the first; at most MAX_RATE of generations hedge
+    OPENAI_HEDGING_ENABLED: bool = os.getenv("OPENAI_HEDGING_ENABLED", "False").lower() in ("true", "1", "t")
+    OPENAI_HEDGE_QUANTILE: float = float(os.getenv("OPENAI_HEDGE_QUANTILE", "0.9"))
+    OPENAI_HEDGE_MIN_DELAY: float = float(os.getenv("OPENAI_HEDGE_MIN_DELAY", "0.3"))
+    OPENAI_HEDGE_MAX_DELAY: float = float(os.getenv("OPENAI_HEDGE_MAX_DELAY", "5"))
+    OPENAI_HEDGE_MAX_RATE: float = float(os.getenv("OPENAI_HEDGE_MAX_RATE", "0.05"))
     
     # API settings
     API_V1_STR: str = "/api/v1"  # Never add a trailing slash here; all route decorators should also avoid trailing slashes
@@ -39,9 +75,78 @@ class Settings(BaseModel):
     # Debug settings
     DEBUG: bool = os.getenv("DEBUG", "True").lower() in ("true", "1", "t")
     
-    # Redis settings for rate limiting
+    # Redis settings for rate limiting and shared caches
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
+    REDIS_ENABLED: bool = os.getenv("REDIS_ENABLED", "True").lower() in ("true", "1", "t")
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+    
+    # Rate limits per user (requests per minute); the pre-filter lets a
+    # worker count up to MAX_PENDING requests locally while a user has more
+    # than HEADROOM of their limit left, syncing to Redis every SYNC_SECONDS
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() in ("true", "1", "t")
+    RATE_LIMIT_DEFAULT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_DEFAULT_PER_MINUTE", "100"))
+    RATE_LIMIT_SEARCH_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_SEARCH_PER_MINUTE", "20"))
+    RATE_LIMIT_BULK_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_BULK_PER_MINUTE", "10"))
+    RATE_LIMIT_PREFILTER_HEADROOM: float = float(os.getenv("RATE_LIMIT_PREFILTER_HEADROOM", "0.5"))
+    RATE_LIMIT_PREFILTER_MAX_PENDING: int = int(os.getenv("RATE_LIMIT_PREFILTER_MAX_PENDING", "5"))
+    RATE_LIMIT_PREFILTER_SYNC_SECONDS: float = float(os.getenv("RATE_LIMIT_PREFILTER_SYNC_SECONDS", "1"))
+    
+    # Suggestion cache settings (seconds for TTLs)
+    SUGGESTION_CACHE_MAX_ENTRIES: int = int(os.getenv("SUGGESTION_CACHE_MAX_ENTRIES", "1024"))
+    SUGGESTION_CACHE_LOCAL_TTL: int = int(os.getenv("SUGGESTION_CACHE_LOCAL_TTL", "300"))
+    SUGGESTION_CACHE_REDIS_TTL: int = int(os.getenv("SUGGESTION_CACHE_REDIS_TTL", "3600"))
+    # Expired suggestions kept this long as a fallback while OpenAI is down
+    SUGGESTION_CACHE_STALE_TTL: int = int(os.getenv("SUGGESTION_CACHE_STALE_TTL", "86400"))
+    # Per-user index of owned project and collection IDs for access checks
+    OWNERSHIP_CACHE_MAX_USERS: int = int(os.getenv("OWNERSHIP_CACHE_MAX_USERS", "10000"))
+    OWNERSHIP_CACHE_LOCAL_TTL: int = int(os.getenv("OWNERSHIP_CACHE_LOCAL_TTL", "60"))
+    OWNERSHIP_CACHE_REDIS_TTL: int = int(os.getenv("OWNERSHIP_CACHE_REDIS_TTL", "3600"))
+    # Per-user cache of project and collection reads; memory is bounded by
+    # max entries times max entry bytes
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(64 * 1024)))
+    RESPONSE_CACHE_LOCAL_TTL: int = int(os.getenv("RESPONSE_CACHE_LOCAL_TTL", "30"))
+    RESPONSE_CACHE_REDIS_TTL: int = int(os.getenv("RESPONSE_CACHE_REDIS_TTL", "600"))
+    
+    # Streaming search session store ("memory" or "redis")
+    SESSION_STORE_BACKEND: str = os.getenv("SESSION_STORE_BACKEND", "memory")
+    SESSION_STORE_TTL: int = int(os.getenv("SESSION_STORE_TTL", "1800"))
+    SESSION_STORE_MAX_SESSIONS: int = int(os.getenv("SESSION_STORE_MAX_SESSIONS", "10000"))
+    SESSION_STORE_MAX_BYTES: int = int(os.getenv("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Session dedup structure: "set", "fingerprint" or "fingerprint_bloom"
+    SESSION_DEDUP_MODE: str = os.getenv("SESSION_DEDUP_MODE", "set")
+    
+    # Opt-in SSE suggestion batching (flushed by size or delay)
+    SSE_BATCH_MAX_SIZE: int = int(os.getenv("SSE_BATCH_MAX_SIZE", "20"))
+    SSE_BATCH_MAX_DELAY_MS: int = int(os.getenv("SSE_BATCH_MAX_DELAY_MS", "50"))
+    # Requested result counts: upper bound and extra keywords asked for to cover duplicates
+    SEARCH_MAX_LIMIT: int = int(os.getenv("SEARCH_MAX_LIMIT", "300"))
+    SEARCH_OVERGENERATION_FACTOR: float = float(os.getenv("SEARCH_OVERGENERATION_FACTOR", "1.3"))
+    # Concurrent per-phrase generations for fan-out OR searches
+    FAN_OUT_MAX_CONCURRENCY: int = int(os.getenv("FAN_OUT_MAX_CONCURRENCY", "4"))
+    # Concurrent OpenAI generations per worker; searches queue by priority
+    # (first page, load more, prefetch) for up to ADMISSION_MAX_WAIT seconds
+    OPENAI_MAX_CONCURRENT_GENERATIONS: int = int(os.getenv("OPENAI_MAX_CONCURRENT_GENERATIONS", "32"))
+    ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "2"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+    # OpenAI token budgets (prompt plus completion per minute) for search;
+    # past CONTENTION of the global budget each active user gets an equal share
+    TOKEN_QUOTA_ENABLED: bool = os.getenv("TOKEN_QUOTA_ENABLED", "True").lower() in ("true", "1", "t")
+    TOKEN_QUOTA_USER_PER_MINUTE: int = int(os.getenv("TOKEN_QUOTA_USER_PER_MINUTE", "20000"))
+    TOKEN_QUOTA_GLOBAL_PER_MINUTE: int = int(os.getenv("TOKEN_QUOTA_GLOBAL_PER_MINUTE", "200000"))
+    TOKEN_QUOTA_CONTENTION: float = float(os.getenv("TOKEN_QUOTA_CONTENTION", "0.8"))
+    # Speculative load-more prefetch (off by default since it spends tokens)
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "False").lower() in ("true", "1", "t")
+    PREFETCH_TTL: int = int(os.getenv("PREFETCH_TTL", "300"))
+    PREFETCH_MAX_PER_USER: int = int(os.getenv("PREFETCH_MAX_PER_USER", "1"))
+    PREFETCH_MAX_ENTRIES: int = int(os.getenv("PREFETCH_MAX_ENTRIES", "200"))
+    # Load-more prompts list a sample of already-sent words to avoid repeats
+    LOAD_MORE_EXCLUSIONS: bool = os.getenv("LOAD_MORE_EXCLUSIONS", "True").lower() in ("true", "1", "t")
+    LOAD_MORE_EXCLUSION_MAX_WORDS: int = int(os.getenv("LOAD_MORE_EXCLUSION_MAX_WORDS", "80"))
+    LOAD_MORE_EXCLUSION_MAX_CHARS: int = int(os.getenv("LOAD_MORE_EXCLUSION_MAX_CHARS", "1200"))
+    # Seconds between client disconnect checks while streaming
+    DISCONNECT_POLL_INTERVAL: float = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
     
     class Config:
         case_sensitive = True
@@ -1,11 +1,75 @@
-from supabase import create_client, Client
+from typing import Dict, Optional, Union
+from httpx import AsyncClient, Limits, Timeout
+from postgrest import AsyncPostgrestClient
+import logging
 from .config import get_settings
 
+# Set up logging
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
-def get_supabase_client() -> Client:
-    """Get a Supabase client instance."""
-    return create_client(
-        settings.SUPABASE_URL,
-        settings.SUPABASE_KEY
-    ) 
\ No newline at end of file
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose HTTP session uses the configured pool limits."""
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, Timeout],
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> AsyncClient:
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+            follow_redirects=True,
+            http2=True,
+            limits=Limits(
+                max_connections=settings.DATABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DATABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.DATABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+_database: Optional[PooledPostgrestClient] = None
+
+def create_database() -> PooledPostgrestClient:
+    """Create the shared async database client for the Supabase REST API."""
+    global _database
+
+    _database = PooledPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": settings.SUPABASE_KEY,
+            "Authorization": f"Bearer {settings.SUPABASE_KEY}",
+        },
+        timeout=settings.DATABASE_TIMEOUT,
+    )
+    return _database
+
+def get_database() -> PooledPostgrestClient:
+    """
+    Get the shared async database client.
+
+    The client is normally created at application startup; it is created
+    on first use when running outside the app lifespan.
+    """
+    if _database is None:
+        return create_database()
+    return _database
+
+async def close_database():
+    """Close the shared database client and its connection pool."""
+    global _database
+
+    if _database is None:
+        return
+    try:
+        await _database.aclose()
+    except Exception as e:
+        logger.warning(f"Failed to close database client: {str(e)}")
+    _database = None
@@ -0,0 +1,98 @@
+from typing import Any, AsyncIterator, Dict
+import asyncio
+from fastapi import Request
+from .metrics import register_metrics
+
+class ClientDisconnected(Exception):
+    """Raised when the client of a streaming response has gone away."""
+
+async def _wait_for_disconnect(request: Request, poll_interval: float):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+async def iterate_until_disconnect(
+    source: AsyncIterator[Any],
+    request: Request,
+    poll_interval: float = 0.5
+) -> AsyncIterator[Any]:
+    """
+    Iterate `source` while polling the request for a client disconnect.
+
+    The disconnect is noticed even while `source` is waiting on upstream
+    data. On disconnect `source` is closed, so its cleanup runs right away,
+    and ClientDisconnected is raised to the caller.
+    """
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request, poll_interval))
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(source.__anext__())
+            done, _ = await asyncio.wait({pending, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if pending not in done:
+                raise ClientDisconnected()
+
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        watcher.cancel()
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await source.aclose()
+
+class CancellationStats:
+    """
+    Counters for generations that ended before the model finished.
+
+    A generation is cancelled when no client is left reading it, either
+    because the client disconnected or because it got the results it asked
+    for.
+    """
+
+    def __init__(self):
+        self.client_disconnects = 0
+        self.cancelled_generations = 0
+        self.completed_generations = 0
+        self.completion_tokens_completed = 0
+        self.completion_tokens_before_cancel = 0
+        self.estimated_tokens_saved = 0
+
+    @property
+    def average_completion_tokens(self) -> float:
+        if not self.completed_generations:
+            return 0.0
+        return self.completion_tokens_completed / self.completed_generations
+
+    def record_disconnect(self):
+        self.client_disconnects += 1
+
+    def record_completed(self, completion_tokens: int):
+        self.completed_generations += 1
+        self.completion_tokens_completed += completion_tokens
+
+    def record_cancelled(self, completion_tokens: int):
+        """Record an aborted generation and estimate the tokens it did not use."""
+        self.cancelled_generations += 1
+        self.completion_tokens_before_cancel += completion_tokens
+        self.estimated_tokens_saved += max(0, round(self.average_completion_tokens - completion_tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "client_disconnects": self.client_disconnects,
+            "cancelled_generations": self.cancelled_generations,
+            "completed_generations": self.completed_generations,
+            "average_completion_tokens": round(self.average_completion_tokens, 1),
+            "completion_tokens_before_cancel": self.completion_tokens_before_cancel,
+            "estimated_tokens_saved": self.estimated_tokens_saved,
+        }
+
+# Shared cancellation counters for streaming searches in this worker
+cancellation_stats = CancellationStats()
+
+register_metrics("stream_cancellations", cancellation_stats.stats)
@@ -0,0 +1,36 @@
+from typing import Dict
+import hashlib
+from fastapi import Request, Response
+
+# Clients may cache project reads but must revalidate them every time
+CACHE_CONTROL = "private, no-cache"
+
+def project_etag(request: Request, version: int) -> str:
+    """
+    Strong ETag for a read of a project's data at `version`.
+
+    The project version is bumped by the database on every change to the
+    project, its collections or their words. The request path and query
+    are hashed in so each representation (page, projection) gets its own tag.
+    """
+    representation = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.sha1(representation.encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check If-None-Match against the current ETag (weak comparison, as for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().replace("W/", "", 1) == etag for tag in header.split(","))
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+def set_cache_headers(response: Response, etag: str):
+    response.headers.update(cache_headers(etag))
@@ -0,0 +1,75 @@
+from typing import Any, AsyncIterator, Callable, List
+import asyncio
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+async def interleave(
+    factories: List[Callable[[], AsyncIterator[Any]]],
+    max_concurrency: int = 4,
+    buffer_size: int = 16
+) -> AsyncIterator[Any]:
+    """
+    Run several async iterators concurrently and merge them fairly.
+
+    At most `max_concurrency` branches run at once. Ready items are taken
+    round-robin, one per branch per turn, so a fast branch cannot starve
+    the others; each branch buffers at most `buffer_size` items ahead. A
+    failing branch is logged and dropped, and the error is only raised if
+    every branch failed. Closing the merged iterator cancels all branches
+    and closes their iterators.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    queues = [asyncio.Queue(buffer_size) for _ in factories]
+    # Set outside the bounded queues, so a cancelled branch never blocks
+    # on a full buffer to report that it finished
+    done = [False] * len(factories)
+    wakeup = asyncio.Event()
+    errors: List[BaseException] = []
+
+    async def run(index: int, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async with semaphore:
+                source = factory()
+                try:
+                    async for item in source:
+                        await queues[index].put(item)
+                        wakeup.set()
+                finally:
+                    # Release the branch's upstream now rather than at garbage collection
+                    if hasattr(source, "aclose"):
+                        await source.aclose()
+        except Exception as e:
+            logger.warning(f"Fan-out branch {index} failed: {str(e)}")
+            errors.append(e)
+        finally:
+            done[index] = True
+            wakeup.set()
+
+    tasks = [asyncio.ensure_future(run(index, factory)) for index, factory in enumerate(factories)]
+    active = list(range(len(factories)))
+    try:
+        while active:
+            progressed = False
+            for index in list(active):
+                if queues[index].empty():
+                    # Items queued before the branch finished are yielded first
+                    if done[index]:
+                        active.remove(index)
+                        progressed = True
+                    continue
+                progressed = True
+                yield queues[index].get_nowait()
+
+            if not progressed:
+                wakeup.clear()
+                if all(queues[index].empty() and not done[index] for index in active):
+                    await wakeup.wait()
+
+        if errors and len(errors) == len(factories):
+            raise errors[-1]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,277 @@
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from collections import deque
+import asyncio
+import math
+import time
+from .admission import HEDGE_LANE, AdmissionSlot, admission_controller
+from .config import get_settings
+from .metrics import register_metrics
+from .token_usage import TokenUsage, estimate_tokens
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+def has_content(chunk: Any) -> bool:
+    """Whether a streamed chat completion chunk carries generated text."""
+    return bool(chunk.choices) and bool(chunk.choices[0].delta.content)
+
+def _quantile(samples: Deque[float], quantile: float) -> Optional[float]:
+    """Nearest-rank quantile, or None without samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(quantile * len(ordered)) - 1)]
+
+def _quantiles_ms(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    snapshot = {}
+    for name, quantile in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        value = _quantile(samples, quantile)
+        snapshot[name] = round(value * 1000, 1) if value is not None else None
+    return snapshot
+
+class _Attempt:
+    """One upstream streaming request, read up to its first generated text."""
+
+    def __init__(self, start: Callable[[], Awaitable[Any]]):
+        self.started = time.perf_counter()
+        self.first_content_at: Optional[float] = None
+        self.stream = None
+        self.iterator = None
+        # Chunks read while racing, replayed to the caller if this one wins
+        self.buffered: List[Any] = []
+        self.task = asyncio.ensure_future(self._open(start))
+
+    async def _open(self, start: Callable[[], Awaitable[Any]]):
+        self.stream = await start()
+        self.iterator = self.stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await self.iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                self.buffered.append(chunk)
+                if has_content(chunk):
+                    break
+        except BaseException:
+            await self.stream.close()
+            raise
+        self.first_content_at = time.perf_counter()
+
+    def failed(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is not None
+
+    def ttft(self) -> Optional[float]:
+        if self.first_content_at is None:
+            return None
+        return self.first_content_at - self.started
+
+    def content(self) -> str:
+        return "".join(chunk.choices[0].delta.content for chunk in self.buffered if has_content(chunk))
+
+    async def cancel(self):
+        """Abort the request, closing its stream if it was opened."""
+        if not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        elif not self.failed() and not self.task.cancelled():
+            await self.stream.close()
+
+class HedgedStream:
+    """The stream that produced text first; iterating replays what was read while racing."""
+
+    def __init__(self, attempt: _Attempt, hedged: bool, hedge_won: bool):
+        self._attempt = attempt
+        self.hedged = hedged
+        self.hedge_won = hedge_won
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for chunk in self._attempt.buffered:
+            yield chunk
+        async for chunk in self._attempt.iterator:
+            yield chunk
+
+    async def close(self):
+        await self._attempt.stream.close()
+
+class Hedger:
+    """
+    Hedges streaming OpenAI requests that are slow to start.
+
+    Each request is read up to its first generated text. If none arrives
+    within `delay()`, the rolling `quantile` of recent first-token times
+    clamped to [`min_delay`, `max_delay`], an identical second request is
+    started and whichever produces text first is used; the other is
+    cancelled and its prompt tokens are counted as the hedge's cost.
+
+    Hedges are capped at `max_rate` of requests (with bursts of up to
+    `burst` hedges) and only use a free admission slot, so they never
+    queue behind or delay other generations. Until `min_samples` first-token
+    times are known the delay is `max_delay`.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.9,
+        min_delay: float = 0.3,
+        max_delay: float = 5.0,
+        max_rate: float = 0.05,
+        burst: float = 5.0,
+        window: int = 200,
+        min_samples: int = 20
+    ):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_samples = min_samples
+        # First-token times of first requests, which set the delay. A first
+        # request cancelled for a faster hedge counts with the time it had
+        # waited, a lower bound, so slow starts stay in the window.
+        self.primary_ttft: Deque[float] = deque(maxlen=window)
+        # First-token times seen by callers, hedged or not
+        self.delivered_ttft: Deque[float] = deque(maxlen=window)
+        self._credit = burst
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self.capacity_denied = 0
+        self.extra_prompt_tokens = 0
+        self.extra_completion_tokens = 0
+
+    def delay(self) -> float:
+        """Time to wait for the first text before hedging."""
+        if len(self.primary_ttft) < self.min_samples:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, _quantile(self.primary_ttft, self.quantile)))
+
+    def _hedge_slot(self) -> Optional[AdmissionSlot]:
+        if self._credit < 1:
+            self.budget_denied += 1
+            return None
+        slot = admission_controller.try_acquire(HEDGE_LANE)
+        if slot is None:
+            self.capacity_denied += 1
+            return None
+        self._credit -= 1
+        return slot
+
+    async def _first(self, attempts: List[_Attempt]) -> _Attempt:
+        """Wait for the first attempt to produce text; raise if all fail."""
+        pending = {attempt.task for attempt in attempts}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # The first request wins ties
+            for attempt in attempts:
+                if attempt.task in done:
+                    if not attempt.failed():
+                        return attempt
+                    if error is None:
+                        error = attempt.task.exception()
+        raise error
+
+    def _record_loser(self, loser: _Attempt, prompt_tokens: int, usage: Optional[TokenUsage]):
+        """Charge the cancelled request's tokens; failed requests are not billed."""
+        if loser.failed():
+            return
+        content = loser.content()
+        self.extra_prompt_tokens += prompt_tokens
+        self.extra_completion_tokens += estimate_tokens(content)
+        if usage is not None:
+            cost = usage.add_child()
+            cost.prompt_tokens = prompt_tokens
+            cost.record_content(content)
+
+    async def open(
+        self,
+        start: Callable[[], Awaitable[Any]],
+        hedge: bool = True,
+        prompt_tokens: int = 0,
+        usage: Optional[TokenUsage] = None
+    ) -> HedgedStream:
+        """
+        Open a streaming request made by `start`, hedged if `hedge` is set.
+
+        A hedge's extra cost, `prompt_tokens` plus any text the cancelled
+        request produced, is added to `usage` as a child.
+        """
+        self.requests += 1
+        self._credit = min(self.burst, self._credit + self.max_rate)
+        primary = _Attempt(start)
+        attempts = [primary]
+        slot = None
+        try:
+            if hedge:
+                await asyncio.wait({primary.task}, timeout=self.delay())
+                if not primary.task.done():
+                    slot = self._hedge_slot()
+                    if slot is not None:
+                        self.hedged += 1
+                        attempts.append(_Attempt(start))
+            winner = await self._first(attempts)
+
+            for loser in attempts:
+                if loser is not winner:
+                    elapsed = time.perf_counter() - loser.started
+                    await loser.cancel()
+                    if loser is primary and not primary.failed():
+                        ttft = primary.ttft()
+                        self.primary_ttft.append(elapsed if ttft is None else ttft)
+                    self._record_loser(loser, prompt_tokens, usage)
+        except BaseException:
+            for attempt in attempts:
+                await attempt.cancel()
+            raise
+        finally:
+            if slot is not None:
+                slot.release()
+
+        if winner is primary:
+            self.primary_ttft.append(primary.ttft())
+        else:
+            self.hedge_wins += 1
+        self.delivered_ttft.append(winner.first_content_at - primary.started)
+        return HedgedStream(winner, len(attempts) > 1, winner is not primary)
+
+    def stats(self) -> Dict[str, Any]:
+        primary = _quantiles_ms(self.primary_ttft)
+        delivered = _quantiles_ms(self.delivered_ttft)
+        improvement = None
+        if primary["p99"] is not None and delivered["p99"] is not None:
+            improvement = round(primary["p99"] - delivered["p99"], 1)
+        return {
+            "delay_ms": round(self.delay() * 1000, 1),
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "capacity_denied": self.capacity_denied,
+            # Without hedging callers would wait at least as long as the
+            # first requests; their p99 is a lower bound while hedges win
+            "primary_ttft_ms": primary,
+            "delivered_ttft_ms": delivered,
+            "p99_improvement_ms": improvement,
+            "extra_prompt_tokens": self.extra_prompt_tokens,
+            "extra_completion_tokens": self.extra_completion_tokens,
+            "extra_tokens_per_hedge": round((self.extra_prompt_tokens + self.extra_completion_tokens) / self.hedged, 1) if self.hedged else None,
+        }
+
+# Hedging for OpenAI streaming generations in this worker
+openai_hedger = Hedger(
+    quantile=settings.OPENAI_HEDGE_QUANTILE,
+    min_delay=settings.OPENAI_HEDGE_MIN_DELAY,
+    max_delay=settings.OPENAI_HEDGE_MAX_DELAY,
+    max_rate=settings.OPENAI_HEDGE_MAX_RATE
+)
+
+register_metrics("openai_hedging", openai_hedger.stats)
@@ -0,0 +1,40 @@
+from typing import List, Optional
+
+class IncrementalLineSplitter:
+    """
+    Split a stream of text chunks into complete lines.
+
+    Each chunk is scanned once and partial lines are kept as a list of
+    fragments joined only when their newline arrives, so the work is linear
+    in the streamed text instead of re-copying a growing buffer per chunk.
+    """
+
+    def __init__(self):
+        self._pending: List[str] = []
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add a chunk and return the lines it completed (without newlines)."""
+        lines = []
+        start = 0
+        newline = chunk.find("\n")
+        while newline != -1:
+            if self._pending:
+                self._pending.append(chunk[start:newline])
+                lines.append("".join(self._pending))
+                self._pending.clear()
+            else:
+                lines.append(chunk[start:newline])
+            start = newline + 1
+            newline = chunk.find("\n", start)
+
+        if start < len(chunk):
+            self._pending.append(chunk[start:])
+        return lines
+
+    def flush(self) -> Optional[str]:
+        """Return any trailing partial line once the stream has ended."""
+        if not self._pending:
+            return None
+        line = "".join(self._pending)
+        self._pending.clear()
+        return line
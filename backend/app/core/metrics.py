@@ -0,0 +1,31 @@
+from typing import Any, Callable, Dict
+import inspect
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Named providers returning a snapshot of a component's counters
+_providers: Dict[str, Callable[[], Any]] = {}
+
+def register_metrics(name: str, provider: Callable[[], Any]):
+    """
+    Register a callable that returns the current metrics for a component.
+
+    Providers may be plain functions or coroutine functions.
+    """
+    _providers[name] = provider
+
+async def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    """Collect a snapshot from every registered metrics provider."""
+    snapshot = {}
+    for name, provider in _providers.items():
+        try:
+            result = provider()
+            if inspect.isawaitable(result):
+                result = await result
+            snapshot[name] = result
+        except Exception as e:
+            logger.error(f"Failed to collect metrics for {name}: {str(e)}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
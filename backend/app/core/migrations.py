@@ -0,0 +1,170 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import logging
+import re
+import sys
+import asyncpg
+from .config import get_settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent.parent.parent / "sql" / "migrations"
+
+# Files are named like 0003_query_indexes.sql and applied in version order
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# First line of a migration that must run outside a transaction, such as
+# CREATE INDEX CONCURRENTLY. Its statements are split on trailing
+# semicolons and run one by one, so it cannot contain function bodies.
+NO_TRANSACTION = "-- migrate:no-transaction"
+
+# Held while migrating so concurrent deploys apply each migration once
+ADVISORY_LOCK_ID = 4172930651
+
+class MigrationError(Exception):
+    """Raised when the migrations on disk and in the database disagree."""
+
+class Migration:
+    def __init__(self, path: Path):
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            raise MigrationError(f"Migration file name must look like 0001_name.sql: {path.name}")
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.sql = path.read_text()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+        self.transactional = not self.sql.startswith(NO_TRANSACTION)
+
+    @property
+    def label(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+    def statements(self) -> List[str]:
+        """Split a no-transaction migration into its statements."""
+        statements = re.split(r";\s*$", self.sql, flags=re.MULTILINE)
+        return [statement.strip() for statement in statements if _has_code(statement)]
+
+def _has_code(sql: str) -> bool:
+    return any(line.strip() and not line.strip().startswith("--") for line in sql.splitlines())
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = sorted(
+        (Migration(path) for path in directory.glob("*.sql")),
+        key=lambda migration: migration.version
+    )
+    versions = [migration.version for migration in migrations]
+    duplicates = {version for version in versions if versions.count(version) > 1}
+    if duplicates:
+        raise MigrationError(f"Duplicate migration versions: {sorted(duplicates)}")
+    return migrations
+
+async def _ensure_history_table(conn: asyncpg.Connection):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            checksum text NOT NULL,
+            applied_at timestamp with time zone DEFAULT now()
+        )
+    """)
+
+async def applied_checksums(conn: asyncpg.Connection) -> Dict[int, str]:
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row["version"]: row["checksum"] for row in rows}
+
+def _check_history(migrations: List[Migration], applied: Dict[int, str]):
+    """Refuse to run if an applied migration was edited or removed."""
+    on_disk = {migration.version: migration for migration in migrations}
+    for version, checksum in applied.items():
+        migration = on_disk.get(version)
+        if migration is None:
+            raise MigrationError(f"Migration {version:04d} was applied but is missing from {MIGRATIONS_DIR}")
+        if migration.checksum != checksum:
+            raise MigrationError(f"Migration {migration.label} changed after it was applied; add a new migration instead")
+
+async def _apply(conn: asyncpg.Connection, migration: Migration):
+    record = "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)"
+    if migration.transactional:
+        async with conn.transaction():
+            await conn.execute(migration.sql)
+            await conn.execute(record, migration.version, migration.name, migration.checksum)
+    else:
+        # Statements are idempotent (IF NOT EXISTS), so a failed run can be retried
+        for statement in migration.statements():
+            await conn.execute(statement)
+        await conn.execute(record, migration.version, migration.name, migration.checksum)
+
+async def migrate(
+    database_url: str,
+    target: Optional[int] = None,
+    dry_run: bool = False,
+    directory: Path = MIGRATIONS_DIR
+) -> List[Migration]:
+    """Apply pending migrations up to `target` and return the ones applied."""
+    migrations = load_migrations(directory)
+    conn = await asyncpg.connect(database_url)
+    try:
+        await _ensure_history_table(conn)
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_ID)
+        try:
+            applied = await applied_checksums(conn)
+            _check_history(migrations, applied)
+            pending = [
+                migration for migration in migrations
+                if migration.version not in applied and (target is None or migration.version <= target)
+            ]
+            for migration in pending:
+                if dry_run:
+                    logger.info(f"Would apply {migration.label}")
+                    continue
+                logger.info(f"Applying {migration.label}")
+                await _apply(conn, migration)
+            return pending
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_ID)
+    finally:
+        await conn.close()
+
+async def status(database_url: str, directory: Path = MIGRATIONS_DIR) -> List[str]:
+    migrations = load_migrations(directory)
+    conn = await asyncpg.connect(database_url)
+    try:
+        await _ensure_history_table(conn)
+        applied = await applied_checksums(conn)
+    finally:
+        await conn.close()
+    _check_history(migrations, applied)
+    return [
+        f"{'applied' if migration.version in applied else 'pending':<9}{migration.label}"
+        for migration in migrations
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the SQL migrations in sql/migrations.")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    parser.add_argument("--database-url", default=get_settings().DATABASE_URL, help="defaults to DATABASE_URL")
+    parser.add_argument("--target", type=int, help="highest version to apply")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations without applying them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set")
+    try:
+        if args.command == "status":
+            for line in asyncio.run(status(args.database_url)):
+                print(line)
+        else:
+            applied = asyncio.run(migrate(args.database_url, args.target, args.dry_run))
+            if not applied:
+                logger.info("Database is up to date")
+    except MigrationError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,197 @@
+from typing import Any, AsyncIterator, Dict, Optional
 from openai import AsyncOpenAI
+import httpx
+import logging
+import time
 from .config import get_settings
+from .metrics import register_metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+class PoolStats:
+    """Connection pool usage of the shared OpenAI client."""
+
+    def __init__(self):
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.acquired = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+
+    def request_started(self):
+        self.requests += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def request_finished(self):
+        self.in_use -= 1
+
+    def record_acquire(self, seconds: float):
+        self.acquired += 1
+        self.acquire_seconds_total += seconds
+        self.acquire_seconds_max = max(self.acquire_seconds_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        avg_acquire = self.acquire_seconds_total / self.acquired if self.acquired else 0.0
+        return {
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": max(0, self.acquired - self.new_connections),
+            "avg_acquire_ms": round(avg_acquire * 1000, 2),
+            "max_acquire_ms": round(self.acquire_seconds_max * 1000, 2),
+        }
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that releases its pool slot in the stats once closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, stats: PoolStats):
+        self._stream = stream
+        self._stats = stats
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.request_finished()
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that records pool usage for each request.
+
+    A request is in use from when it is sent until its response body is
+    closed. Acquire time runs until the request headers start being sent,
+    so it covers waiting for a free connection plus any connect and TLS
+    handshake.
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: PoolStats):
+        self._transport = transport
+        self._stats = stats
+
+    def connection_counts(self) -> Dict[str, int]:
+        # httpx does not expose its httpcore pool publicly
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", [])
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal acquired
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+            if event_name.endswith("connect_tcp.started"):
+                self._stats.new_connections += 1
+            elif event_name.endswith("send_request_headers.started") and not acquired:
+                acquired = True
+                self._stats.record_acquire(time.perf_counter() - started)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self._stats.request_started()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._stats.request_finished()
+            raise
+
+        response.stream = _TrackedStream(response.stream, self._stats)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+pool_stats = PoolStats()
+
+_openai_client: Optional[AsyncOpenAI] = None
+_transport: Optional[InstrumentedTransport] = None
+
+def create_openai_client() -> AsyncOpenAI:
+    """Create the shared OpenAI client with the configured pool and timeouts."""
+    global _openai_client, _transport
+
+    _transport = InstrumentedTransport(
+        httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+            )
+        ),
+        pool_stats
+    )
+    _openai_client = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(
+            transport=_transport,
+            timeout=httpx.Timeout(
+                settings.OPENAI_TIMEOUT,
+                connect=settings.OPENAI_CONNECT_TIMEOUT,
+                pool=settings.OPENAI_POOL_TIMEOUT,
+            ),
+        )
+    )
+    return _openai_client
+
+def init_openai_client():
+    """
+    Create the shared client at startup.
+
+    A missing API key only fails the searches that need the client, as it
+    did before the client was shared, so startup does not fail on it.
+    """
+    try:
+        create_openai_client()
+    except Exception as e:
+        logger.warning(f"Failed to create OpenAI client at startup: {str(e)}")
+
 def get_openai_client() -> AsyncOpenAI:
-    """Get an OpenAI client instance."""
-    return AsyncOpenAI(
-        api_key=settings.OPENAI_API_KEY
-    ) 
\ No newline at end of file
+    """
+    Get the shared OpenAI client.
+
+    The client is normally created at application startup; it is created
+    on first use when running outside the app lifespan.
+    """
+    if _openai_client is None:
+        return create_openai_client()
+    return _openai_client
+
+async def close_openai_client():
+    """Close the shared client and its connection pool."""
+    global _openai_client, _transport
+
+    if _openai_client is None:
+        return
+    try:
+        await _openai_client.close()
+    except Exception as e:
+        logger.warning(f"Failed to close OpenAI client: {str(e)}")
+    _openai_client = None
+    _transport = None
+
+def openai_pool_stats() -> Dict[str, Any]:
+    snapshot = pool_stats.stats()
+    if _transport is not None:
+        snapshot.update(_transport.connection_counts())
+    return snapshot
+
+register_metrics("openai_pool", openai_pool_stats)
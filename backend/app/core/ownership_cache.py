@@ -0,0 +1,225 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .config import get_settings
+from .metrics import register_metrics
+from .redis_client import get_redis_client
+from .ttl_cache import TTLCache
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+class UserOwnership:
+    """Project IDs and collection IDs (with their project) owned by one user."""
+
+    def __init__(self):
+        self.projects = set()
+        self.collections: Dict[str, str] = {}
+
+class OwnershipCache:
+    """
+    Two-tier index of the projects and collections each user owns.
+
+    Only confirmed ownership is cached, and entries are filled lazily by
+    the access checks that hit the database. Projects never change owner
+    and collections only move between projects of the same user, so a
+    stale entry can only mean the resource was deleted, which the query
+    that follows the check finds out anyway. A move rewrites the moved
+    collections' collection -> project entries, and handlers that create or
+    delete resources update the index too, so it stays small and accurate.
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_users: int = 10000,
+        local_ttl_seconds: int = 60,
+        redis_ttl_seconds: int = 3600,
+        key_prefix: str = "ownership"
+    ):
+        self.local = TTLCache(max_entries=max_users, ttl_seconds=local_ttl_seconds)
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.key_prefix = key_prefix
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+
+    def _redis_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:{user_id}"
+
+    def _local_index(self, user_id: str) -> UserOwnership:
+        index = self.local.get(user_id)
+        if index is None:
+            index = UserOwnership()
+            self.local.set(user_id, index)
+        return index
+
+    async def _redis_lookup(self, user_id: str, fields: List[str]) -> List[Optional[str]]:
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return [None] * len(fields)
+        try:
+            return await redis_client.hmget(self._redis_key(user_id), fields)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Ownership cache Redis read failed: {str(e)}")
+            return [None] * len(fields)
+
+    async def _redis_store(self, user_id: str, mapping: Dict[str, str]):
+        redis_client = get_redis_client()
+        if redis_client is None or not mapping:
+            return
+        try:
+            key = self._redis_key(user_id)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.redis_ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Ownership cache Redis write failed: {str(e)}")
+
+    async def owns_project(self, user_id: str, project_id: str) -> bool:
+        """Return True if the user is known to own the project."""
+        index = self.local.get(user_id)
+        if index is not None and project_id in index.projects:
+            self.local_hits += 1
+            return True
+
+        value, = await self._redis_lookup(user_id, [f"project:{project_id}"])
+        if value is not None:
+            self._local_index(user_id).projects.add(project_id)
+            self.redis_hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    async def owned_collections(self, user_id: str, collection_ids: List[str]) -> List[str]:
+        """Return which of the collections the user is known to own."""
+        if not collection_ids:
+            return []
+
+        index = self.local.get(user_id)
+        known = set()
+        if index is not None:
+            known = {collection_id for collection_id in collection_ids if collection_id in index.collections}
+
+        unknown = [collection_id for collection_id in collection_ids if collection_id not in known]
+        if not unknown:
+            self.local_hits += 1
+            return list(collection_ids)
+
+        values = await self._redis_lookup(user_id, [f"collection:{collection_id}" for collection_id in unknown])
+        found = {collection_id: project_id for collection_id, project_id in zip(unknown, values) if project_id is not None}
+        if found:
+            self._local_index(user_id).collections.update(found)
+        if len(found) == len(unknown):
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+        return [collection_id for collection_id in collection_ids if collection_id in known or collection_id in found]
+
+    async def collection_projects(self, user_id: str, collection_ids: List[str]) -> Dict[str, str]:
+        """Return the project of each collection the user is known to own."""
+        owned = await self.owned_collections(user_id, collection_ids)
+        index = self.local.get(user_id)
+        if index is None:
+            return {}
+        return {collection_id: index.collections[collection_id] for collection_id in owned if collection_id in index.collections}
+
+    async def add_projects(self, user_id: str, project_ids: Iterable[str]):
+        project_ids = list(project_ids)
+        self._local_index(user_id).projects.update(project_ids)
+        await self._redis_store(user_id, {f"project:{project_id}": "1" for project_id in project_ids})
+
+    async def add_collections(self, user_id: str, collections: Iterable[Tuple[str, str]]):
+        """Record `(collection_id, project_id)` pairs owned by the user."""
+        collections = dict(collections)
+        self._local_index(user_id).collections.update(collections)
+        await self._redis_store(user_id, {
+            f"collection:{collection_id}": project_id
+            for collection_id, project_id in collections.items()
+        })
+
+    async def remove_collections(self, user_id: str, collection_ids: Iterable[str]):
+        collection_ids = list(collection_ids)
+        self.invalidations += 1
+        index = self.local.get(user_id)
+        if index is not None:
+            for collection_id in collection_ids:
+                index.collections.pop(collection_id, None)
+
+        redis_client = get_redis_client()
+        if redis_client is None or not collection_ids:
+            return
+        try:
+            await redis_client.hdel(self._redis_key(user_id), *[f"collection:{collection_id}" for collection_id in collection_ids])
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Ownership cache Redis delete failed: {str(e)}")
+
+    async def remove_projects(self, user_id: str, project_ids: Iterable[str]):
+        """Forget the projects and every collection in them."""
+        project_ids = set(project_ids)
+        self.invalidations += 1
+        index = self.local.get(user_id)
+        if index is not None:
+            index.projects.difference_update(project_ids)
+            for collection_id, project_id in list(index.collections.items()):
+                if project_id in project_ids:
+                    del index.collections[collection_id]
+
+        redis_client = get_redis_client()
+        if redis_client is None or not project_ids:
+            return
+        try:
+            key = self._redis_key(user_id)
+            entries = await redis_client.hgetall(key)
+            fields = [f"project:{project_id}" for project_id in project_ids]
+            fields.extend(
+                field for field, value in entries.items()
+                if field.startswith("collection:") and value in project_ids
+            )
+            await redis_client.hdel(key, *fields)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Ownership cache Redis delete failed: {str(e)}")
+
+    async def clear_user(self, user_id: str):
+        self.invalidations += 1
+        self.local.delete(user_id)
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return
+        try:
+            await redis_client.delete(self._redis_key(user_id))
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Ownership cache Redis delete failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+            "local": self.local.stats(),
+        }
+
+# Shared ownership index used by the access checks in the repository
+ownership_cache = OwnershipCache(
+    max_users=settings.OWNERSHIP_CACHE_MAX_USERS,
+    local_ttl_seconds=settings.OWNERSHIP_CACHE_LOCAL_TTL,
+    redis_ttl_seconds=settings.OWNERSHIP_CACHE_REDIS_TTL
+)
+
+register_metrics("ownership_cache", ownership_cache.stats)
@@ -0,0 +1,83 @@
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+import re
+from fastapi import HTTPException, Response
+from .config import get_settings
+
+settings = get_settings()
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Listings sort newest first on (column, id); a cursor holds the last row's
+# pair and the next page starts strictly after it
+_TIMESTAMP = re.compile(r"^[0-9T:.+\- ]+$")
+_UUID = re.compile(r"^[0-9a-fA-F-]{36}$")
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor token that was not issued by `encode_cursor`."""
+
+def encode_cursor(sort_value: str, row_id: str) -> str:
+    """Return an opaque token for the position after a row."""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    # Values are interpolated into a PostgREST filter, so only accept the
+    # shapes encode_cursor is given
+    if not isinstance(sort_value, str) or not _TIMESTAMP.match(sort_value):
+        raise InvalidCursor(cursor)
+    if not isinstance(row_id, str) or not _UUID.match(row_id):
+        raise InvalidCursor(cursor)
+    return sort_value, row_id
+
+def after_cursor(query, column: str, cursor: str):
+    """Filter a descending (column, id) listing to the rows after the cursor."""
+    sort_value, row_id = decode_cursor(cursor)
+    # PostgREST has no row comparison, so `or` breaks ties on id and the
+    # redundant `lte` gives the index a range to start from instead of
+    # scanning every earlier page
+    return query\
+        .lte(column, sort_value)\
+        .or_(f'{column}.lt."{sort_value}",and({column}.eq."{sort_value}",id.lt.{row_id})')
+
+def split_page(rows: List[Dict[str, Any]], column: str, limit: Optional[int]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Trim rows fetched with `limit + 1` to one page.
+
+    Returns the page and the cursor for the next one, or None on the last
+    page (and always when `limit` is None, i.e. an unpaginated listing).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1][column], page[-1]["id"])
+
+def page_request(limit: Optional[int], cursor: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Resolve a listing's `limit` and `cursor` query parameters.
+
+    Listings are paginated when either is given; a bare request returns the
+    whole listing as before. Limits are capped at LIST_MAX_PAGE_SIZE.
+    """
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if limit is None:
+            limit = settings.LIST_PAGE_SIZE
+    if limit is not None:
+        limit = min(limit, settings.LIST_MAX_PAGE_SIZE)
+    return limit, cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Advertise the next page, if any, in the X-Next-Cursor header."""
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
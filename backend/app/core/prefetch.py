@@ -0,0 +1,154 @@
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+import asyncio
+import time
+from .config import get_settings
+from .metrics import register_metrics
+from .stream_coalescer import SharedGeneration
+from .token_usage import TokenUsage
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+class PrefetchEntry:
+    """A next-page generation running or buffered for one search session."""
+
+    def __init__(self, user_id: str, query_key: str, usage: TokenUsage, ttl_seconds: float):
+        self.user_id = user_id
+        self.query_key = query_key
+        self.usage = usage
+        self.expires_at = time.monotonic() + ttl_seconds
+        self.generation = SharedGeneration()
+
+class Prefetcher:
+    """
+    Speculatively generates the next load-more page for a search session.
+
+    Each user may hold at most `max_per_user` prefetches (running or
+    buffered) and the worker at most `max_entries`. A prefetch not claimed
+    within `ttl_seconds` is discarded and counted as wasted.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_per_user: int = 1, max_entries: int = 200):
+        self.ttl_seconds = ttl_seconds
+        self.max_per_user = max_per_user
+        self.max_entries = max_entries
+        self._entries: Dict[str, PrefetchEntry] = {}
+        self.scheduled = 0
+        self.budget_rejections = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.wasted_tokens = 0
+        self.used_tokens = 0
+
+    def _discard(self, session_id: str):
+        entry = self._entries.pop(session_id)
+        if entry.generation.task is not None and not entry.generation.task.done():
+            entry.generation.task.cancel()
+        self.wasted += 1
+        self.wasted_tokens += entry.usage.completion_tokens
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id in [sid for sid, entry in self._entries.items() if entry.expires_at <= now]:
+            self._discard(session_id)
+
+    def schedule(
+        self,
+        session_id: str,
+        user_id: str,
+        query_key: str,
+        factory: Callable[[TokenUsage], AsyncIterator[Any]]
+    ) -> bool:
+        """
+        Start generating the next page for a session in the background.
+
+        Returns False if the session already has a prefetch or the user or
+        worker budget is used up.
+        """
+        self._expire()
+        if session_id in self._entries:
+            return False
+
+        user_entries = sum(1 for entry in self._entries.values() if entry.user_id == user_id)
+        if user_entries >= self.max_per_user or len(self._entries) >= self.max_entries:
+            self.budget_rejections += 1
+            return False
+
+        usage = TokenUsage()
+        entry = PrefetchEntry(user_id, query_key, usage, self.ttl_seconds)
+        entry.generation.task = asyncio.create_task(entry.generation.run(factory(usage)))
+        self._entries[session_id] = entry
+        self.scheduled += 1
+        return True
+
+    def has(self, session_id: str, query_key: str) -> bool:
+        """Whether `take` would find a usable prefetch, without claiming it."""
+        entry = self._entries.get(session_id)
+        return (
+            entry is not None
+            and entry.query_key == query_key
+            and entry.expires_at > time.monotonic()
+            and entry.generation.error is None
+        )
+
+    def take(self, session_id: str, query_key: str) -> Optional[PrefetchEntry]:
+        """Claim the prefetched page for a load-more request, if there is one."""
+        self._expire()
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.query_key != query_key:
+            # Prefetched for a different query or page size
+            self._discard(session_id)
+            self.misses += 1
+            return None
+
+        if entry.generation.error is not None:
+            # Failed or shed; the request generates its page itself
+            self._discard(session_id)
+            self.misses += 1
+            return None
+
+        del self._entries[session_id]
+        self.hits += 1
+        return entry
+
+    async def iterate(self, entry: PrefetchEntry) -> AsyncIterator[Any]:
+        """Stream a claimed prefetch, cancelling it if the reader stops early."""
+        try:
+            async for item in entry.generation.iterate():
+                yield item
+        finally:
+            if entry.generation.task is not None and not entry.generation.task.done():
+                entry.generation.task.cancel()
+            self.used_tokens += entry.usage.completion_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        claims = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "scheduled": self.scheduled,
+            "budget_rejections": self.budget_rejections,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else 0.0,
+            "wasted": self.wasted,
+            "wasted_tokens": self.wasted_tokens,
+            "used_tokens": self.used_tokens,
+        }
+
+# Shared prefetcher for load-more pages in this worker
+prefetcher = Prefetcher(
+    ttl_seconds=settings.PREFETCH_TTL,
+    max_per_user=settings.PREFETCH_MAX_PER_USER,
+    max_entries=settings.PREFETCH_MAX_ENTRIES
+)
+
+register_metrics("prefetch", prefetcher.stats)
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Optional, Set
+from fastapi import HTTPException
+
+PROJECT_FIELDS = ("id", "user_id", "name", "created_at", "updated_at")
+
+# Nested data a client can ask for with `include`: "words" implies
+# "collections", and "counts" adds a word_count to each collection
+INCLUDE_OPTIONS = ("collections", "words", "counts")
+
+# Saved word columns sent per collection; collection_id is implied by the parent
+COLUMNAR_WORD_FIELDS = ("id", "word", "created_at")
+
+def _split(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a `fields` list of project columns; id is always included."""
+    requested = _split(fields)
+    if not requested:
+        return list(PROJECT_FIELDS)
+    unknown = [field for field in requested if field not in PROJECT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [field for field in PROJECT_FIELDS if field in requested and field != "id"]
+
+def parse_include(include: Optional[str]) -> Set[str]:
+    requested = set(_split(include))
+    unknown = requested - set(INCLUDE_OPTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    if requested & {"words", "counts"}:
+        requested.add("collections")
+    return requested
+
+def project_select(fields: List[str], include: Set[str]) -> str:
+    """PostgREST select for a project with only the requested nested data."""
+    columns = list(fields)
+    if "collections" in include:
+        nested = ["*"]
+        if "words" in include:
+            nested.append("saved_words(*)")
+        if "counts" in include:
+            # Aliased so it does not collide with the embedded words
+            nested.append("word_count:saved_words(count)")
+        columns.append(f"collections({', '.join(nested)})")
+    return ",".join(columns)
+
+def flatten_counts(project: Dict[str, Any]):
+    """Turn PostgREST's `[{"count": n}]` aggregate into a plain word_count."""
+    for collection in project.get("collections", []):
+        counted = collection.get("word_count")
+        if isinstance(counted, list):
+            collection["word_count"] = counted[0]["count"] if counted else 0
+
+def columnar_words(words: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Encode saved words as one array per column instead of one object per word."""
+    return {field: [word[field] for word in words] for field in COLUMNAR_WORD_FIELDS}
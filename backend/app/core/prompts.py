@@ -0,0 +1,135 @@
+from typing import Dict, List
+import random
+from .search_query import effective_search_mode
+from .word_dedup import WordSet
+
+# System prompts contain no query-specific text, so every search in a mode
+# sends an identical prefix that the provider can serve from its prompt cache.
+# OpenAI only caches prompts of at least 1024 tokens and these are about 200,
+# so cached_prompt_tokens reports 0 until the instructions grow past that.
+BROAD_SYSTEM_PROMPT = """You are a Scattershot Brainstormer. Your job is to generate a diverse list of keywords related to the phrases given by the user.
+Instructions:
+- Generate at least the number of words or phrases the user asks for
+- When several phrases are given, each suggestion should clearly relate to ONE OR MORE of them
+- Include both single words and multi-word phrases, evenly mixed
+- The words should not be organized in any particular order
+- Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
+- Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
+- Do not number your list
+- Separate items using ONLY line breaks
+
+The goal is to provide a wide range of potential connections to the given phrases across different domains and contexts."""
+
+INTERSECTION_SYSTEM_PROMPT = """You are a Focused Brainstormer. Your job is to generate keywords that MUST be strongly related to ALL of the concepts given by the user simultaneously.
+Instructions:
+- Generate words or phrases that have a DIRECT and MEANINGFUL connection to EACH of the given concepts
+- Each suggestion MUST strongly relate to ALL concepts, not just one or some of them
+- Be extremely strict about this requirement - if a word only relates to one phrase but not others, DO NOT include it
+- Aim for quality over quantity - it's better to provide fewer results that truly connect all concepts
+- Prefer more specific terms that clearly demonstrate the intersection of all concepts
+- Include both single words and multi-word phrases
+- Each item should be on its own line with NO prefix characters
+- Do not number your list
+- Separate items using ONLY line breaks
+
+The goal is to find the TRUE intersection of these different concepts - words that genuinely relate to ALL of them simultaneously."""
+
+def _quoted(phrases: List[str], separator: str) -> str:
+    return separator.join(f'"{phrase}"' for phrase in phrases)
+
+def search_user_message(phrases: List[str], search_mode: str, keyword_target: int) -> str:
+    """The query-specific part of a search prompt."""
+    if effective_search_mode(phrases, search_mode) == "and":
+        return f"Concepts: {_quoted(phrases, ' AND ')}"
+    if len(phrases) == 1:
+        return f"Phrase: {_quoted(phrases, ', ')}\nGenerate at least {keyword_target} keywords related to this phrase."
+    return f"Phrases: {_quoted(phrases, ', ')}\nGenerate at least {keyword_target} keywords related to ONE OR MORE of these phrases."
+
+def build_search_messages(
+    phrases: List[str],
+    search_mode: str,
+    keyword_target: int,
+    extra_instructions: str = ""
+) -> List[Dict[str, str]]:
+    """
+    Chat messages for a keyword generation.
+
+    The static instructions go in the system message and everything that
+    depends on the query, including `extra_instructions`, goes last in the
+    user message.
+    """
+    if effective_search_mode(phrases, search_mode) == "and":
+        system_prompt = INTERSECTION_SYSTEM_PROMPT
+    else:
+        system_prompt = BROAD_SYSTEM_PROMPT
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": search_user_message(phrases, search_mode, keyword_target) + extra_instructions},
+    ]
+
+# Fields the prompts ask the model to cover; load more rotates their order
+DIVERSITY_DOMAINS = [
+    "science",
+    "medicine",
+    "gaming",
+    "design",
+    "history",
+    "art",
+    "technology",
+    "nature",
+    "business",
+    "sports",
+    "music",
+    "food",
+    "language",
+    "mythology",
+]
+
+def rotated_domains(offset: int, count: int = 5) -> List[str]:
+    """Return `count` diversity domains starting at a rotating offset."""
+    start = offset % len(DIVERSITY_DOMAINS)
+    rotated = DIVERSITY_DOMAINS[start:] + DIVERSITY_DOMAINS[:start]
+    return rotated[:count]
+
+def exclusion_sample(existing_words: WordSet, max_words: int, max_chars: int) -> List[str]:
+    """
+    Pick already-sent words to list as exclusions in a load-more prompt.
+
+    Only string-based word sets can be sampled; fingerprint sets return an
+    empty list. The sample is capped by word count and total characters so
+    the prompt stays short.
+    """
+    if existing_words.mode != "set":
+        return []
+
+    members = list(existing_words.members())
+    if len(members) > max_words:
+        members = random.sample(members, max_words)
+
+    sample = []
+    total_chars = 0
+    for word in members:
+        total_chars += len(word) + 2
+        if total_chars > max_chars:
+            break
+        sample.append(word)
+    return sample
+
+def load_more_instructions(existing_words: WordSet, max_words: int = 80, max_chars: int = 1200) -> str:
+    """
+    Extra instructions for a load-more generation.
+
+    Lists a sample of what the session has already seen and rotates the
+    fields to focus on, so fewer generated lines are thrown away as
+    duplicates.
+    """
+    lines = [
+        "",
+        "This is a follow-up request: the user has already seen many suggestions.",
+        f"- Focus first on these fields: {', '.join(rotated_domains(len(existing_words)))}",
+        "- Prefer less obvious, more specific terms over common ones",
+    ]
+    excluded = exclusion_sample(existing_words, max_words, max_chars)
+    if excluded:
+        lines.append(f"- Do NOT repeat any of these already-suggested items or close variants: {', '.join(excluded)}")
+    return "\n".join(lines)
@@ -1,9 +1,12 @@
-from fastapi import Request, HTTPException
+from fastapi import Request
 from fastapi.responses import JSONResponse
-from typing import Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional
+import math
 import time
-import redis
 from .config import get_settings
+from .metrics import register_metrics
+from .redis_client import get_redis_client
+from .ttl_cache import TTLCache
 import logging
 
 # Set up logging
@@ -11,28 +14,107 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-# Initialize Redis client
-try:
-    redis_client = redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        db=0,
-        decode_responses=True
-    )
-except Exception as e:
-    logger.warning(f"Failed to connect to Redis: {str(e)}")
-    redis_client = None
+# GCRA (a token bucket stored as one timestamp). The key holds the
+# theoretical arrival time (TAT) in milliseconds of Redis server time; a
+# request is allowed while TAT stays within one period of now. ARGV[3]
+# charges requests the caller let through without asking Redis first.
+# Returns {allowed, retry_after_ms, remaining}. Reading TIME before a
+# write needs effects replication, which Redis 5+ uses by default.
+GCRA_SCRIPT = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local pending = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+tat = math.max(tat, now) + pending * interval
+local new_tat = tat + interval
+local allowed = new_tat - now <= period
+if allowed then
+    tat = new_tat
+end
+if tat > now then
+    redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+end
+local remaining = math.floor((period - (tat - now)) / interval)
+if allowed then
+    return {1, 0, remaining}
+end
+return {0, math.ceil(new_tat - now - period), 0}
+"""
+
+class RateLimitDecision:
+    """Outcome of a rate limit check."""
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, remaining)
+        self.retry_after = retry_after
+
+    def retry_after_seconds(self) -> int:
+        """Retry-After value; whole seconds, at least one."""
+        return max(1, math.ceil(self.retry_after))
 
 class RateLimiter:
+    """
+    Per-user (or per-IP) limit of `times` requests per `seconds`.
+
+    Checks run a GCRA script in Redis, so one key per user holds a single
+    timestamp and the check is one atomic round trip shared by all
+    workers. Bursts of up to `times` requests are allowed, then one per
+    `seconds / times`.
+
+    The local pre-filter skips Redis for users who had plenty of room at
+    their last check: their requests are counted locally and charged to
+    Redis on the next check, at least every `sync_seconds`. This lets each
+    worker overshoot the limit by at most `max_pending` requests.
+
+    When Redis is disabled or failing, the same algorithm runs in process,
+    so each worker enforces the full limit on its own. After a Redis error
+    the limiter stays local for `redis_retry_seconds` instead of paying the
+    socket timeout on every request.
+    """
+
     def __init__(
         self,
         times: int = 100,  # Number of requests allowed
         seconds: int = 60,  # Time window in seconds
-        key_prefix: str = "rate_limit"
+        key_prefix: str = "rate_limit",
+        headroom: float = 0.5,
+        max_pending: int = 5,
+        sync_seconds: float = 1.0,
+        redis_retry_seconds: float = 5.0,
+        max_keys: int = 10000
     ):
         self.times = times
         self.seconds = seconds
         self.key_prefix = key_prefix
+        self.interval = seconds / times
+        self.headroom = headroom
+        self.max_pending = max_pending
+        self.sync_seconds = sync_seconds
+        self.redis_retry_seconds = redis_retry_seconds
+        # Last Redis answer and unsynced requests per key, for the pre-filter.
+        # Kept for a whole period so unsynced requests are still charged to a
+        # user who pauses; by then their tokens have refilled anyway.
+        self.prefilter = TTLCache(max_entries=max_keys, ttl_seconds=seconds)
+        # In-process TATs used while Redis is unavailable
+        self.local = TTLCache(max_entries=max_keys, ttl_seconds=seconds)
+        self._script = None
+        self._redis_retry_at = 0.0
+        self.checks = 0
+        self.limited = 0
+        self.prefilter_skips = 0
+        self.redis_checks = 0
+        self.local_checks = 0
+        self.redis_errors = 0
+        self.check_seconds_total = 0.0
+        self.check_seconds_max = 0.0
+        self.redis_seconds_total = 0.0
 
     def _get_key(self, request: Request) -> str:
         """Generate a unique key for rate limiting based on user ID or IP."""
@@ -40,61 +122,138 @@ class RateLimiter:
         user_id = getattr(request.state, "user_id", None)
         if user_id:
             return f"{self.key_prefix}:{user_id}"
-        
+
         # Fall back to IP address
         forwarded = request.headers.get("X-Forwarded-For")
         if forwarded:
-            ip = forwarded.split(",")[0]
+            ip = forwarded.split(",")[0].strip()
         else:
-            ip = request.client.host
+            ip = request.client.host if request.client else "unknown"
         return f"{self.key_prefix}:{ip}"
 
-    async def is_rate_limited(self, request: Request) -> bool:
-        """Check if the request should be rate limited."""
-        # Skip rate limiting if Redis is not available
-        if redis_client is None:
-            logger.warning("Rate limiting disabled: Redis not connected")
-            return False
-            
+    def _prefiltered(self, key: str) -> Optional[RateLimitDecision]:
+        """Allow locally if the user had headroom at the last Redis check."""
+        state = self.prefilter.get(key)
+        if state is None or state["pending"] >= self.max_pending:
+            return None
+        elapsed = time.monotonic() - state["synced_at"]
+        if elapsed >= self.sync_seconds:
+            return None
+        # Tokens refill at one per interval since that check
+        refilled = elapsed / self.interval
+        remaining = min(self.times, state["remaining"] + refilled) - state["pending"] - 1
+        if remaining < self.headroom * self.times:
+            return None
+        state["pending"] += 1
+        return RateLimitDecision(True, self.times, int(remaining))
+
+    def _local_check(self, key: str, pending: int = 0) -> RateLimitDecision:
+        """In-process GCRA, used when Redis is unavailable."""
+        now = time.monotonic()
+        tat = max(self.local.get(key) or now, now) + pending * self.interval
+        new_tat = tat + self.interval
+        allowed = new_tat - now <= self.seconds
+        if allowed:
+            tat = new_tat
+        self.local.set(key, tat)
+        if not allowed:
+            return RateLimitDecision(False, self.times, 0, new_tat - now - self.seconds)
+        return RateLimitDecision(True, self.times, math.floor((self.seconds - (tat - now)) / self.interval))
+
+    async def _redis_check(self, redis_client, key: str, pending: int) -> RateLimitDecision:
+        if self._script is None or self._script.registered_client is not redis_client:
+            self._script = redis_client.register_script(GCRA_SCRIPT)
+        started = time.perf_counter()
+        allowed, retry_after_ms, remaining = await self._script(
+            keys=[key],
+            args=[self.interval * 1000, self.seconds * 1000, pending]
+        )
+        self.redis_seconds_total += time.perf_counter() - started
+        self.redis_checks += 1
+        return RateLimitDecision(bool(allowed), self.times, int(remaining), int(retry_after_ms) / 1000)
+
+    async def check(self, request: Request) -> RateLimitDecision:
+        """Count the request against its user's limit and decide whether it may proceed."""
+        started = time.perf_counter()
+        key = self._get_key(request)
         try:
-            key = self._get_key(request)
-            
-            # Use Redis pipeline for atomic operations
-            pipe = redis_client.pipeline()
-            now = time.time()
-            
-            # Clean old requests
-            pipe.zremrangebyscore(key, 0, now - self.seconds)
-            
-            # Count requests in the current window
-            pipe.zcard(key)
-            
-            # Add current request
-            pipe.zadd(key, {str(now): now})
-            
-            # Set expiry on the key
-            pipe.expire(key, self.seconds)
-            
-            # Execute pipeline
-            _, request_count, *_ = pipe.execute()
-            
-            return request_count > self.times
-        except Exception as e:
-            # Log error but don't rate limit the request
-            logger.error(f"Rate limiting error: {str(e)}")
-            return False
-
-    def get_retry_after(self) -> int:
-        """Get the number of seconds until the rate limit resets."""
-        return self.seconds
-
-# Rate limit configurations for different endpoint types
+            decision = self._prefiltered(key)
+            if decision is not None:
+                self.prefilter_skips += 1
+                return decision
+
+            state = self.prefilter.get(key)
+            pending = state["pending"] if state else 0
+            self.prefilter.delete(key)
+
+            redis_client = get_redis_client()
+            if redis_client is not None and time.monotonic() >= self._redis_retry_at:
+                try:
+                    decision = await self._redis_check(redis_client, key, pending)
+                    if decision.allowed:
+                        self.prefilter.set(key, {
+                            "remaining": decision.remaining,
+                            "synced_at": time.monotonic(),
+                            "pending": 0,
+                        })
+                    return decision
+                except Exception as e:
+                    self.redis_errors += 1
+                    self._redis_retry_at = time.monotonic() + self.redis_retry_seconds
+                    logger.warning(f"Rate limit Redis check failed, limiting locally: {str(e)}")
+
+            self.local_checks += 1
+            return self._local_check(key, pending)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.checks += 1
+            self.check_seconds_total += elapsed
+            self.check_seconds_max = max(self.check_seconds_max, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        avg_check = self.check_seconds_total / self.checks if self.checks else 0.0
+        avg_redis = self.redis_seconds_total / self.redis_checks if self.redis_checks else 0.0
+        return {
+            "limit": self.times,
+            "seconds": self.seconds,
+            "checks": self.checks,
+            "limited": self.limited,
+            "prefilter_skips": self.prefilter_skips,
+            "redis_checks": self.redis_checks,
+            "local_checks": self.local_checks,
+            "redis_errors": self.redis_errors,
+            "avg_check_ms": round(avg_check * 1000, 3),
+            "max_check_ms": round(self.check_seconds_max * 1000, 3),
+            "avg_redis_ms": round(avg_redis * 1000, 3),
+        }
+
+def _limiter(name: str, times: int) -> RateLimiter:
+    return RateLimiter(
+        times=times,
+        seconds=60,
+        key_prefix=f"rate_limit:{name}",
+        headroom=settings.RATE_LIMIT_PREFILTER_HEADROOM,
+        max_pending=settings.RATE_LIMIT_PREFILTER_MAX_PENDING,
+        sync_seconds=settings.RATE_LIMIT_PREFILTER_SYNC_SECONDS
+    )
+
+# Rate limit configurations for different endpoint types (requests per minute)
 RATE_LIMITS = {
-    "default": RateLimiter(times=100, seconds=60),  # 100 requests per minute
-    "search": RateLimiter(times=20, seconds=60),    # 20 searches per minute
-    "bulk": RateLimiter(times=10, seconds=60)       # 10 bulk operations per minute
+    "default": _limiter("default", settings.RATE_LIMIT_DEFAULT_PER_MINUTE),
+    "search": _limiter("search", settings.RATE_LIMIT_SEARCH_PER_MINUTE),
+    "bulk": _limiter("bulk", settings.RATE_LIMIT_BULK_PER_MINUTE)
 }
 
+def limiter_for_path(path: str) -> RateLimiter:
+    """Pick the rate limit class for a request path."""
+    if "/search" in path:
+        return RATE_LIMITS["search"]
+    if "/bulk" in path:
+        return RATE_LIMITS["bulk"]
+    return RATE_LIMITS["default"]
+
+register_metrics("rate_limit", lambda: {name: limiter.stats() for name, limiter in RATE_LIMITS.items()})
+
 async def rate_limit_middleware(
     request: Request,
     call_next: Callable,
@@ -105,15 +264,21 @@ async def rate_limit_middleware(
     if limiter is None:
         limiter = RATE_LIMITS["default"]
 
+    if not settings.RATE_LIMIT_ENABLED:
+        return await call_next(request)
+
     try:
-        # Check rate limit
-        if await limiter.is_rate_limited(request):
+        decision = await limiter.check(request)
+        if not decision.allowed:
+            limiter.limited += 1
+            retry_after = decision.retry_after_seconds()
             return JSONResponse(
                 status_code=429,
                 content={
                     "detail": "Too many requests",
-                    "retry_after": limiter.get_retry_after()
-                }
+                    "retry_after": retry_after
+                },
+                headers={"Retry-After": str(retry_after)}
             )
     except Exception as e:
         # Log rate limiting errors but allow the request
@@ -121,4 +286,4 @@ async def rate_limit_middleware(
 
     # Process the request if not rate limited or if rate limiting fails
     response = await call_next(request)
-    return response 
\ No newline at end of file
+    return response
\ No newline at end of file
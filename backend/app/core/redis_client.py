@@ -0,0 +1,39 @@
+from typing import Optional
+import redis.asyncio as aioredis
+from .config import get_settings
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_redis_client: Optional[aioredis.Redis] = None
+
+def get_redis_client() -> Optional[aioredis.Redis]:
+    """
+    Get the shared async Redis client, or None if Redis is disabled.
+
+    The client connects lazily, so callers must still handle connection
+    errors on each command and fall back to their in-process tier.
+    """
+    global _redis_client
+
+    if not settings.REDIS_ENABLED:
+        return None
+
+    if _redis_client is None:
+        try:
+            _redis_client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=0,
+                decode_responses=True,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to create async Redis client: {str(e)}")
+            return None
+
+    return _redis_client
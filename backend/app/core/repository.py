@@ -0,0 +1,261 @@
+from typing import Any, Dict, List, Optional, Tuple
+from .database import get_database
+from .ownership_cache import ownership_cache
+from .pagination import after_cursor, split_page
+
+# Ownership checks take the authenticated user's id and return None or an
+# empty list when the user does not own the rows
+Row = Dict[str, Any]
+
+async def _rpc(function: str, params: Row) -> List[Row]:
+    """Call a database function defined in sql/migrations."""
+    result = await get_database().rpc(function, params).execute()
+    return result.data
+
+async def _first(query) -> Optional[Row]:
+    """Run a query for at most one row."""
+    result = await query.limit(1).execute()
+    return result.data[0] if result.data else None
+
+async def _page(query, column: str, limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Row], Optional[str]]:
+    """
+    Run a listing newest first on (column, id), one page at a time.
+
+    Returns the rows and the cursor for the next page. Without a limit the
+    whole listing is returned.
+    """
+    query = query.order(column, desc=True).order("id", desc=True)
+    if cursor is not None:
+        query = after_cursor(query, column, cursor)
+    if limit is not None:
+        # One extra row tells whether there is a next page
+        query = query.limit(limit + 1)
+    result = await query.execute()
+    return split_page(result.data, column, limit)
+
+# Projects
+
+async def get_owned_project(project_id: str, user_id: str, columns: str = "id") -> Optional[Row]:
+    """Return the project if it belongs to the user."""
+    return await _first(
+        get_database().table("projects")
+        .select(columns)
+        .eq("id", project_id)
+        .eq("user_id", user_id)
+    )
+
+async def verify_project_owner(project_id: str, user_id: str) -> bool:
+    """Check project ownership, from the ownership cache when possible."""
+    if await ownership_cache.owns_project(user_id, project_id):
+        return True
+    if await get_owned_project(project_id, user_id) is None:
+        return False
+    await ownership_cache.add_projects(user_id, [project_id])
+    return True
+
+async def get_project_version(project_id: str, user_id: str) -> Optional[int]:
+    """Return the project's version stamp if the project belongs to the user."""
+    project = await get_owned_project(project_id, user_id, columns="version")
+    if project is None:
+        return None
+    await ownership_cache.add_projects(user_id, [project_id])
+    return project["version"]
+
+async def list_projects(
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    return await _page(
+        get_database().table("projects")
+        .select("*")
+        .eq("user_id", user_id),
+        "updated_at", limit, cursor
+    )
+
+async def create_project(user_id: str, name: str) -> Optional[Row]:
+    result = await get_database().table("projects")\
+        .insert({"name": name, "user_id": user_id})\
+        .execute()
+    return result.data[0] if result.data else None
+
+async def update_project(project_id: str, user_id: str, values: Row) -> Optional[Row]:
+    result = await get_database().table("projects")\
+        .update(values)\
+        .eq("id", project_id)\
+        .eq("user_id", user_id)\
+        .execute()
+    return result.data[0] if result.data else None
+
+async def delete_project(project_id: str, user_id: str) -> List[Row]:
+    result = await get_database().table("projects")\
+        .delete()\
+        .eq("id", project_id)\
+        .eq("user_id", user_id)\
+        .execute()
+    return result.data
+
+async def delete_all_projects(user_id: str) -> List[Row]:
+    result = await get_database().table("projects")\
+        .delete()\
+        .eq("user_id", user_id)\
+        .execute()
+    return result.data
+
+# Collections
+
+async def get_owned_collection(collection_id: str, user_id: str) -> Optional[Row]:
+    """Return the collection if its project belongs to the user."""
+    return await _first(
+        get_database().table("collections")
+        .select("*, projects!inner(*)")
+        .eq("id", collection_id)
+        .eq("projects.user_id", user_id)
+    )
+
+async def owned_collection_ids(collection_ids: List[str], user_id: str) -> List[str]:
+    """Return the listed collections whose projects belong to the user."""
+    owned = await ownership_cache.owned_collections(user_id, collection_ids)
+    unknown = [collection_id for collection_id in collection_ids if collection_id not in owned]
+    if not unknown:
+        return owned
+
+    result = await get_database().table("collections")\
+        .select("id, project_id, projects!inner(id)")\
+        .in_("id", unknown)\
+        .eq("projects.user_id", user_id)\
+        .execute()
+    await ownership_cache.add_collections(user_id, [(row["id"], row["project_id"]) for row in result.data])
+    return owned + [row["id"] for row in result.data]
+
+async def verify_collection_owner(collection_id: str, user_id: str) -> bool:
+    """Check collection ownership, from the ownership cache when possible."""
+    return bool(await owned_collection_ids([collection_id], user_id))
+
+async def get_collection_version(collection_id: str, user_id: str) -> Optional[int]:
+    """Return the version stamp of the collection's project if it belongs to the user."""
+    collection = await _first(
+        get_database().table("collections")
+        .select("project_id, projects!inner(version)")
+        .eq("id", collection_id)
+        .eq("projects.user_id", user_id)
+    )
+    if collection is None:
+        return None
+    await ownership_cache.add_collections(user_id, [(collection_id, collection["project_id"])])
+    return collection["projects"]["version"]
+
+async def find_collection_by_name(project_id: str, name: str) -> Optional[Row]:
+    return await _first(
+        get_database().table("collections")
+        .select("*, saved_words(*)")
+        .eq("project_id", project_id)
+        .eq("name", name)
+    )
+
+async def create_collection(project_id: str, name: str) -> Optional[Row]:
+    result = await get_database().table("collections")\
+        .insert({"name": name, "project_id": project_id})\
+        .execute()
+    return result.data[0] if result.data else None
+
+async def list_collections(
+    project_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_words: bool = True
+) -> Tuple[List[Row], Optional[str]]:
+    return await _page(
+        get_database().table("collections")
+        .select("*, saved_words(*)" if include_words else "*")
+        .eq("project_id", project_id),
+        "updated_at", limit, cursor
+    )
+
+async def rename_collections(user_id: str, collection_ids: List[str], name: str) -> List[Row]:
+    """Rename the user's collections among `collection_ids`."""
+    return await _rpc("rename_collections", {
+        "p_user_id": user_id,
+        "p_collection_ids": collection_ids,
+        "p_name": name,
+    })
+
+async def move_collections(user_id: str, collection_ids: List[str], target_project_id: str) -> List[Row]:
+    """Move the user's collections into a project the user owns."""
+    return await _rpc("move_collections", {
+        "p_user_id": user_id,
+        "p_collection_ids": collection_ids,
+        "p_target_project_id": target_project_id,
+    })
+
+async def delete_collections(user_id: str, collection_ids: List[str]) -> List[Row]:
+    """Delete the user's collections among `collection_ids`."""
+    return await _rpc("delete_collections", {
+        "p_user_id": user_id,
+        "p_collection_ids": collection_ids,
+    })
+
+async def add_word_to_collection(user_id: str, collection_id: str, word: str) -> Optional[Row]:
+    """Add a word unless already saved; return the collection with its words."""
+    rows = await _rpc("add_word_to_collection", {
+        "p_user_id": user_id,
+        "p_collection_id": collection_id,
+        "p_word": word,
+    })
+    return rows[0]["collection"] if rows else None
+
+async def remove_word_from_collection(user_id: str, collection_id: str, word: str) -> Optional[Row]:
+    """
+    Remove a word from a collection.
+
+    Returns None if the user does not own the collection, otherwise a row
+    with the updated `collection` and whether the word was `removed`.
+    """
+    rows = await _rpc("remove_word_from_collection", {
+        "p_user_id": user_id,
+        "p_collection_id": collection_id,
+        "p_word": word,
+    })
+    return rows[0] if rows else None
+
+# Saved words
+
+async def save_words(user_id: str, collection_id: str, words: List[str]) -> List[Row]:
+    """
+    Save words to a collection, skipping ones already saved there.
+
+    Returns a row per requested word with `inserted` set for new ones, or
+    no rows if the user does not own the collection.
+    """
+    return await _rpc("save_words", {
+        "p_user_id": user_id,
+        "p_collection_id": collection_id,
+        "p_words": words,
+    })
+
+async def list_saved_words(
+    collection_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    return await _page(
+        get_database().table("saved_words")
+        .select("*")
+        .eq("collection_id", collection_id),
+        "created_at", limit, cursor
+    )
+
+async def move_saved_words(user_id: str, word_ids: List[str], target_collection_id: str) -> List[Row]:
+    """Move the user's words into a collection the user owns."""
+    return await _rpc("move_saved_words", {
+        "p_user_id": user_id,
+        "p_word_ids": word_ids,
+        "p_target_collection_id": target_collection_id,
+    })
+
+async def delete_saved_words(user_id: str, word_ids: List[str]) -> List[Row]:
+    """Delete the user's words among `word_ids`."""
+    return await _rpc("delete_saved_words", {
+        "p_user_id": user_id,
+        "p_word_ids": word_ids,
+    })
@@ -0,0 +1,257 @@
+from typing import Any, Dict, Iterable, Optional
+import itertools
+import json
+import time
+from fastapi import Request
+from .config import get_settings
+from .metrics import register_metrics
+from .ownership_cache import ownership_cache
+from .redis_client import get_redis_client
+from .ttl_cache import TTLCache
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Scopes a cached read belongs to; a write invalidates the scopes it changes
+PROJECTS_SCOPE = "projects"
+# Bumping the user scope invalidates all of the user's cached reads
+USER_SCOPE = "user"
+
+def project_scope(project_id: str) -> str:
+    """Scope of everything read from one project: the project, its collections and words."""
+    return f"project:{project_id}"
+
+def request_variant(request: Request) -> str:
+    """Cache variant of a read: its path and query string."""
+    return f"{request.url.path}?{request.url.query}"
+
+class CachedRead:
+    """
+    Result of a cache lookup.
+
+    `value` is set on a hit. On a miss, `generation` records the scope's
+    generation before the database is read, so a write that lands while
+    the read is in flight invalidates what `store` saves for it.
+    """
+
+    def __init__(self, user_id: str, scope: str, variant: str, generation: Optional[str], value: Any = None):
+        self.user_id = user_id
+        self.scope = scope
+        self.variant = variant
+        self.generation = generation
+        self.value = value
+
+class ResponseCache:
+    """
+    Per-user read-through cache for project and collection reads.
+
+    Entries are keyed by user, scope and request variant (path and query)
+    plus the generation of the scope and of the user. Writes bump
+    generations instead of deleting entries, and old entries age out.
+
+    With Redis the generations live there, so every worker sees a write
+    as soon as it happens, and entries are shared as well. Without Redis
+    generations are per process: other workers can serve a replaced entry
+    until the local TTL, which the staleness metrics expose. Redis errors
+    are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_entry_bytes: int = 64 * 1024,
+        local_ttl_seconds: int = 60,
+        redis_ttl_seconds: int = 600,
+        key_prefix: str = "responses"
+    ):
+        self.local = TTLCache(max_entries=max_entries, ttl_seconds=local_ttl_seconds)
+        # Local generations. Numbers come from one process-wide counter and
+        # are never reused, so an evicted generation cannot revive old entries.
+        self.generations = TTLCache(max_entries=max_entries, ttl_seconds=redis_ttl_seconds)
+        self._next_generation = itertools.count(1)
+        self.max_entry_bytes = max_entry_bytes
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.key_prefix = key_prefix
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.oversized = 0
+        self.invalidations = 0
+        self.redis_errors = 0
+        self.served_age_total = 0.0
+        self.served_age_max = 0.0
+
+    def _generations_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:{user_id}:generations"
+
+    def _entry_key(self, user_id: str, scope: str, generation: str, variant: str) -> str:
+        return f"{self.key_prefix}:{user_id}:{scope}:{generation}:{variant}"
+
+    def _local_generation(self, user_id: str, scope: str) -> int:
+        generation = self.generations.get((user_id, scope))
+        if generation is None:
+            generation = next(self._next_generation)
+            self.generations.set((user_id, scope), generation)
+        return generation
+
+    async def _generation(self, user_id: str, scope: str) -> Optional[str]:
+        """Current generation of a scope combined with the user's, or None if unknown."""
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return f"{self._local_generation(user_id, USER_SCOPE)}.{self._local_generation(user_id, scope)}"
+        try:
+            user_generation, scope_generation = await redis_client.hmget(
+                self._generations_key(user_id), [USER_SCOPE, scope]
+            )
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Response cache Redis read failed: {str(e)}")
+            return None
+        return f"{user_generation or 0}.{scope_generation or 0}"
+
+    def _record_hit(self, stored_at: float):
+        age = time.time() - stored_at
+        self.served_age_total += age
+        self.served_age_max = max(self.served_age_max, age)
+
+    async def lookup(self, user_id: str, scope: str, variant: str) -> CachedRead:
+        generation = await self._generation(user_id, scope)
+        read = CachedRead(user_id, scope, variant, generation)
+        if generation is None:
+            self.misses += 1
+            return read
+
+        entry = self.local.get((user_id, scope, variant))
+        if entry is not None and entry["generation"] == generation:
+            self.local_hits += 1
+            self._record_hit(entry["stored_at"])
+            read.value = entry["value"]
+            return read
+
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            try:
+                raw = await redis_client.get(self._entry_key(user_id, scope, generation, variant))
+                if raw is not None:
+                    entry = json.loads(raw)
+                    entry["generation"] = generation
+                    self.local.set((user_id, scope, variant), entry)
+                    self.redis_hits += 1
+                    self._record_hit(entry["stored_at"])
+                    read.value = entry["value"]
+                    return read
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Response cache Redis read failed: {str(e)}")
+
+        self.misses += 1
+        return read
+
+    async def store(self, read: CachedRead, value: Any):
+        """Cache the value fetched after a missed lookup."""
+        if read.generation is None:
+            return
+
+        entry = {"value": value, "stored_at": time.time()}
+        raw = json.dumps(entry, default=str)
+        # Bound memory per entry; large projects are served uncached
+        if len(raw) > self.max_entry_bytes:
+            self.oversized += 1
+            return
+
+        self.local.set((read.user_id, read.scope, read.variant), dict(entry, generation=read.generation))
+        self.stores += 1
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(
+                    self._entry_key(read.user_id, read.scope, read.generation, read.variant),
+                    raw,
+                    ex=self.redis_ttl_seconds
+                )
+                # Generations outlive every entry keyed by them, so counters
+                # never restart under a live entry
+                pipe.expire(self._generations_key(read.user_id), self.redis_ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Response cache Redis write failed: {str(e)}")
+
+    async def invalidate(self, user_id: str, scopes: Iterable[str]):
+        """Invalidate the user's cached reads in the given scopes."""
+        scopes = set(scopes)
+        if not scopes:
+            return
+        self.invalidations += 1
+        for scope in scopes:
+            self.generations.set((user_id, scope), next(self._next_generation))
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return
+        try:
+            key = self._generations_key(user_id)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    pipe.hincrby(key, scope, 1)
+                pipe.expire(key, self.redis_ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Response cache Redis invalidation failed: {str(e)}")
+
+    async def invalidate_projects(self, user_id: str, project_ids: Iterable[str]):
+        await self.invalidate(user_id, [project_scope(project_id) for project_id in project_ids])
+
+    async def invalidate_collections(self, user_id: str, collection_ids: Iterable[str]):
+        """
+        Invalidate the projects the collections belong to.
+
+        Falls back to all of the user's reads when a collection's project
+        is not in the ownership index.
+        """
+        collection_ids = list(collection_ids)
+        projects = await ownership_cache.collection_projects(user_id, collection_ids)
+        if len(projects) < len(set(collection_ids)):
+            await self.invalidate(user_id, [USER_SCOPE])
+        else:
+            await self.invalidate_projects(user_id, projects.values())
+
+    async def invalidate_user(self, user_id: str):
+        await self.invalidate(user_id, [USER_SCOPE])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "oversized": self.oversized,
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+            # Age of entries when served; without Redis this bounds how stale
+            # another worker's copy can be
+            "served_age_avg_s": self.served_age_total / hits if hits else 0.0,
+            "served_age_max_s": self.served_age_max,
+            "local": self.local.stats(),
+        }
+
+# Shared response cache for project and collection reads
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    local_ttl_seconds=settings.RESPONSE_CACHE_LOCAL_TTL,
+    redis_ttl_seconds=settings.RESPONSE_CACHE_REDIS_TTL
+)
+
+register_metrics("response_cache", response_cache.stats)
@@ -0,0 +1,22 @@
+from typing import List
+
+# Suggestions longer than this are treated as model noise and dropped
+MAX_SUGGESTION_LENGTH = 100
+
+def parse_phrases(query: str) -> List[str]:
+    """Split a `+`-separated search query into its non-empty phrases."""
+    return [phrase.strip() for phrase in query.split("+") if phrase.strip()]
+
+def clean_suggestion(line: str) -> str:
+    """Strip whitespace and list markers from a generated line."""
+    return line.strip().lstrip('-•*').strip()
+
+def normalize_word(word: str) -> str:
+    """Return the form of a suggestion used for duplicate detection."""
+    return word.lower()
+
+def effective_search_mode(phrases: List[str], search_mode: str) -> str:
+    """Return the mode a query actually runs in ("and" needs several phrases)."""
+    if len(phrases) > 1 and search_mode == "and":
+        return "and"
+    return "or"
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Tuple
+import time
+from .config import get_settings
+from .metrics import register_metrics
+from .redis_client import get_redis_client
+from .word_dedup import WORD_SET_TYPES, WordSet, create_word_set
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+class InMemorySessionStore:
+    """
+    Per-worker store of the words already sent in each search session.
+
+    Sessions are kept in LRU order, expire `ttl_seconds` after their last
+    use, and the least recently used sessions are evicted whenever the
+    session count or the estimated memory use goes over its cap. Each
+    session's words are held in the word set for its dedup mode.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 30 * 60,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # (mode, session_id) -> [expires_at, word set, estimated bytes]
+        self._sessions: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key: tuple):
+        _, _, size = self._sessions.pop(key)
+        self._total_bytes -= size
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            key, (expires_at, _, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            self._drop(key)
+            self.expirations += 1
+
+    def _enforce_caps(self, keep: tuple):
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            key = next(iter(self._sessions))
+            if key == keep:
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(keep)
+                continue
+            self._drop(key)
+            self.evictions += 1
+
+    async def load(self, session_id: str, mode: str = "set") -> WordSet:
+        """Return a copy of the words already sent in a session."""
+        self._expire()
+        key = (mode, session_id)
+        entry = self._sessions.get(key)
+        if entry is None:
+            return create_word_set(mode)
+
+        entry[0] = time.monotonic() + self.ttl_seconds
+        self._sessions.move_to_end(key)
+        return entry[1].copy()
+
+    async def add(self, session_id: str, words: Iterable[str], mode: str = "set"):
+        """Record words as sent in a session and refresh its TTL."""
+        self._expire()
+        key = (mode, session_id)
+        entry = self._sessions.get(key)
+        if entry is None:
+            entry = [0.0, create_word_set(mode), 0]
+            self._sessions[key] = entry
+
+        for word in words:
+            entry[1].add(word)
+
+        size = entry[1].memory_bytes()
+        self._total_bytes += size - entry[2]
+        entry[2] = size
+        entry[0] = time.monotonic() + self.ttl_seconds
+        self._sessions.move_to_end(key)
+        self._enforce_caps(keep=key)
+
+    async def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {
+            "backend": "memory",
+            "entries": len(self._sessions),
+            "words": sum(len(entry[1]) for entry in self._sessions.values()),
+            "estimated_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class RedisSessionStore:
+    """
+    Redis-backed session store shared by every uvicorn worker.
+
+    Each session is a Redis set with its own TTL, so load more works no
+    matter which worker serves it. Fingerprint modes store signed 64-bit
+    integers, which Redis keeps in its compact intset encoding. A
+    sorted-set index of expiry times, keyed like the sessions themselves,
+    is used to report entry and expiration counts; Redis has no caps to
+    evict by. If Redis is unreachable the store degrades to an in-process
+    fallback.
+    """
+
+    def __init__(self, ttl_seconds: int = 30 * 60, key_prefix: str = "session_words"):
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.fallback = InMemorySessionStore(
+            ttl_seconds=ttl_seconds,
+            max_sessions=settings.SESSION_STORE_MAX_SESSIONS,
+            max_bytes=settings.SESSION_STORE_MAX_BYTES
+        )
+        self.redis_errors = 0
+
+    def _key(self, session_id: str, mode: str) -> str:
+        if mode == "set":
+            return f"{self.key_prefix}:{session_id}"
+        return f"{self.key_prefix}:fingerprints:{session_id}"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.key_prefix}:index"
+
+    @property
+    def _expirations_key(self) -> str:
+        return f"{self.key_prefix}:expirations"
+
+    async def load(self, session_id: str, mode: str = "set") -> WordSet:
+        """Return the words already sent in a session."""
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return await self.fallback.load(session_id, mode)
+
+        try:
+            key = self._key(session_id, mode)
+            pipe = redis_client.pipeline()
+            pipe.smembers(key)
+            pipe.expire(key, self.ttl_seconds)
+            members, _ = await pipe.execute()
+            return create_word_set(mode, members)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Session store Redis read failed: {str(e)}")
+            return await self.fallback.load(session_id, mode)
+
+    async def add(self, session_id: str, words: Iterable[str], mode: str = "set"):
+        """Record words as sent in a session and refresh its TTL."""
+        words = list(words)
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return await self.fallback.add(session_id, words, mode)
+
+        try:
+            now = time.time()
+            key = self._key(session_id, mode)
+            member = WORD_SET_TYPES[mode].member
+            pipe = redis_client.pipeline()
+            if words:
+                pipe.sadd(key, *[member(word) for word in words])
+            pipe.expire(key, self.ttl_seconds)
+            # One index member per session and dedup mode, like the data keys
+            pipe.zadd(self._index_key, {key: now + self.ttl_seconds})
+            pipe.zremrangebyscore(self._index_key, 0, now)
+            *_, expired = await pipe.execute()
+            if expired:
+                await redis_client.incrby(self._expirations_key, expired)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Session store Redis write failed: {str(e)}")
+            await self.fallback.add(session_id, words, mode)
+
+    async def stats(self) -> Dict[str, Any]:
+        snapshot = {
+            "backend": "redis",
+            "redis_errors": self.redis_errors,
+            "fallback": await self.fallback.stats(),
+        }
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return snapshot
+
+        try:
+            pipe = redis_client.pipeline()
+            pipe.zremrangebyscore(self._index_key, 0, time.time())
+            pipe.zcard(self._index_key)
+            pipe.get(self._expirations_key)
+            expired, entries, expirations = await pipe.execute()
+            snapshot["entries"] = entries
+            snapshot["expirations"] = int(expirations or 0) + expired
+            if expired:
+                await redis_client.incrby(self._expirations_key, expired)
+        except Exception as e:
+            self.redis_errors += 1
+            snapshot["error"] = str(e)
+        return snapshot
+
+def create_session_store():
+    """Create the session store selected by SESSION_STORE_BACKEND."""
+    if settings.SESSION_STORE_BACKEND == "redis":
+        return RedisSessionStore(ttl_seconds=settings.SESSION_STORE_TTL)
+    return InMemorySessionStore(
+        ttl_seconds=settings.SESSION_STORE_TTL,
+        max_sessions=settings.SESSION_STORE_MAX_SESSIONS,
+        max_bytes=settings.SESSION_STORE_MAX_BYTES
+    )
+
+# Shared store for words already sent per streaming search session
+session_store = create_session_store()
+
+register_metrics("session_store", session_store.stats)
@@ -0,0 +1,62 @@
+from typing import Any, AsyncIterator, Dict, List
+import asyncio
+import json
+import time
+
+def format_sse(payload: Dict[str, Any]) -> str:
+    """Frame a payload as a single Server-Sent Events `data:` message."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def batch_items(
+    source: AsyncIterator[Any],
+    max_size: int = 20,
+    max_delay: float = 0.05
+) -> AsyncIterator[List[Any]]:
+    """
+    Group items from an async iterator into batches.
+
+    A batch is flushed when it reaches `max_size` items or when its oldest
+    item has waited `max_delay` seconds, even if the source is stalled. The
+    first item is flushed on its own so time-to-first-item is unchanged.
+    The source is closed when the batches stop being consumed.
+    """
+    batch: List[Any] = []
+    deadline = None
+    first = True
+    pending = asyncio.ensure_future(source.__anext__())
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Deadline passed while waiting on the source
+                yield batch
+                batch, deadline = [], None
+                continue
+
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                break
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + max_delay
+            if first or len(batch) >= max_size or time.monotonic() >= deadline:
+                first = False
+                yield batch
+                batch, deadline = [], None
+
+            pending = asyncio.ensure_future(source.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await source.aclose()
+
+    if batch:
+        yield batch
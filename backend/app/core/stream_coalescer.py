@@ -0,0 +1,143 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import asyncio
+from .metrics import register_metrics
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class SharedGeneration:
+    """
+    Buffer of items produced by one upstream generation.
+
+    Every subscriber reads the buffer from the start, so late joiners see
+    the same sequence as the subscriber that started the generation.
+    """
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def _notify(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def append(self, item: Any):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def run(self, source: AsyncIterator[Any]):
+        """
+        Drain `source` into the buffer.
+
+        Errors are stored for subscribers rather than raised; cancellation
+        ends the generation for subscribers and is re-raised.
+        """
+        try:
+            async for item in source:
+                self.append(item)
+            self.finish()
+        except asyncio.CancelledError:
+            self.finish(ConnectionAbortedError("Shared generation was cancelled"))
+            raise
+        except Exception as e:
+            self.finish(e)
+
+    async def iterate(self) -> AsyncIterator[Any]:
+        """Yield every buffered item, then new ones until the generation ends."""
+        index = 0
+        while True:
+            wakeup = self._wakeup
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await wakeup.wait()
+
+class StreamCoalescer:
+    """
+    Single-flight wrapper for async generators.
+
+    Concurrent subscribers asking for the same key share one running
+    upstream generation instead of each opening their own. When the last
+    subscriber leaves before the generation finishes, the upstream is
+    cancelled rather than left running for nobody.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, SharedGeneration] = {}
+        self.generations_started = 0
+        self.coalesced_subscribers = 0
+        self.failed_generations = 0
+        self.cancelled_generations = 0
+
+    async def _pump(self, key: str, generation: SharedGeneration, source: AsyncIterator[Any]):
+        try:
+            await generation.run(source)
+            if generation.error is not None:
+                self.failed_generations += 1
+                logger.error(f"Shared generation {key} failed: {str(generation.error)}")
+        except asyncio.CancelledError:
+            self.cancelled_generations += 1
+            raise
+        finally:
+            if self._inflight.get(key) is generation:
+                del self._inflight[key]
+
+    async def subscribe(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """
+        Iterate the shared generation for a key, starting it if needed.
+
+        `factory` is only called when no generation for the key is in
+        flight; otherwise the caller joins the running one.
+        """
+        generation = self._inflight.get(key)
+        if generation is None:
+            generation = SharedGeneration()
+            self._inflight[key] = generation
+            generation.task = asyncio.create_task(self._pump(key, generation, factory()))
+            self.generations_started += 1
+        else:
+            self.coalesced_subscribers += 1
+
+        generation.subscribers += 1
+        try:
+            async for item in generation.iterate():
+                yield item
+        finally:
+            generation.subscribers -= 1
+            if generation.subscribers == 0 and not generation.done:
+                if self._inflight.get(key) is generation:
+                    del self._inflight[key]
+                generation.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "subscribers": sum(generation.subscribers for generation in self._inflight.values()),
+            "generations_started": self.generations_started,
+            "coalesced_subscribers": self.coalesced_subscribers,
+            "failed_generations": self.failed_generations,
+            "cancelled_generations": self.cancelled_generations,
+        }
+
+# Shared coalescer for streaming searches in this worker
+stream_coalescer = StreamCoalescer()
+
+register_metrics("stream_coalescer", stream_coalescer.stats)
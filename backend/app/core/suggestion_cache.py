@@ -0,0 +1,189 @@
+from typing import Any, Dict, List, Optional
+from itertools import zip_longest
+import hashlib
+import json
+from .config import get_settings
+from .metrics import register_metrics
+from .redis_client import get_redis_client
+from .search_query import effective_search_mode
+from .ttl_cache import TTLCache
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+def build_cache_key(phrases: List[str], search_mode: str) -> str:
+    """
+    Build a cache key from parsed phrases and the effective search mode.
+
+    Phrases are case and whitespace folded. In OR mode the phrase order does
+    not change the prompt's meaning, so the folded phrases are sorted.
+    """
+    mode = effective_search_mode(phrases, search_mode)
+    folded = [" ".join(phrase.lower().split()) for phrase in phrases]
+    if mode == "or":
+        folded = sorted(folded)
+    digest = hashlib.sha256(json.dumps([mode, folded]).encode("utf-8")).hexdigest()
+    return f"{mode}:{digest}"
+
+class SuggestionCache:
+    """
+    Two-tier cache for generated keyword suggestions.
+
+    Lookups hit an in-process LRU first and then Redis; Redis hits are
+    promoted into the local tier. Redis errors are logged and treated as
+    misses so searches keep working without it.
+
+    Stored suggestions are also kept for `stale_ttl_seconds` in a stale
+    tier that only `get_fallback` reads, for serving something while new
+    generations are unavailable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        local_ttl_seconds: int = 300,
+        redis_ttl_seconds: int = 3600,
+        stale_ttl_seconds: int = 86400,
+        key_prefix: str = "suggestions"
+    ):
+        self.local = TTLCache(max_entries=max_entries, ttl_seconds=local_ttl_seconds)
+        self.stale = TTLCache(max_entries=max_entries, ttl_seconds=stale_ttl_seconds)
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.key_prefix = key_prefix
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.fallback_hits = 0
+        self.fallback_misses = 0
+        self.redis_errors = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.key_prefix}:{key}"
+
+    def _stale_key(self, key: str) -> str:
+        return f"{self.key_prefix}:stale:{key}"
+
+    async def get(self, phrases: List[str], search_mode: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached suggestions for a query, or None on a miss."""
+        key = build_cache_key(phrases, search_mode)
+
+        suggestions = self.local.get(key)
+        if suggestions is not None:
+            self.local_hits += 1
+            return suggestions
+
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            try:
+                raw = await redis_client.get(self._redis_key(key))
+                if raw is not None:
+                    suggestions = json.loads(raw)
+                    self.local.set(key, suggestions)
+                    self.redis_hits += 1
+                    return suggestions
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Suggestion cache Redis read failed: {str(e)}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, phrases: List[str], search_mode: str, suggestions: List[Dict[str, Any]]):
+        """Store the suggestions generated for a query in both tiers."""
+        if not suggestions:
+            return
+
+        key = build_cache_key(phrases, search_mode)
+        self.local.set(key, suggestions)
+        self.stale.set(key, suggestions)
+        self.stores += 1
+
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            try:
+                raw = json.dumps(suggestions)
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.set(self._redis_key(key), raw, ex=self.redis_ttl_seconds)
+                    pipe.set(self._stale_key(key), raw, ex=self.stale_ttl_seconds)
+                    await pipe.execute()
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Suggestion cache Redis write failed: {str(e)}")
+
+    async def _get_any(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Fresh or stale suggestions for a cache key, from either tier."""
+        suggestions = self.local.get(key)
+        if suggestions is None:
+            suggestions = self.stale.get(key)
+        if suggestions is not None:
+            return suggestions
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return None
+        try:
+            for raw in await redis_client.mget([self._redis_key(key), self._stale_key(key)]):
+                if raw is not None:
+                    suggestions = json.loads(raw)
+                    self.stale.set(key, suggestions)
+                    return suggestions
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Suggestion cache Redis read failed: {str(e)}")
+        return None
+
+    async def get_fallback(self, phrases: List[str], search_mode: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Nearest suggestions previously generated for a query, fresh or stale.
+
+        A multi-phrase OR query without an entry of its own falls back to
+        the entries of its single phrases, interleaved like a fan-out search.
+        """
+        suggestions = await self._get_any(build_cache_key(phrases, search_mode))
+        if suggestions is None and len(phrases) > 1 and effective_search_mode(phrases, search_mode) == "or":
+            per_phrase = [await self._get_any(build_cache_key([phrase], "or")) for phrase in phrases]
+            seen = set()
+            merged = []
+            for round_suggestions in zip_longest(*[found for found in per_phrase if found]):
+                for suggestion in round_suggestions:
+                    if suggestion and suggestion["word"].lower() not in seen:
+                        seen.add(suggestion["word"].lower())
+                        merged.append({"word": suggestion["word"], "match_type": "or"})
+            suggestions = merged or None
+
+        if suggestions is None:
+            self.fallback_misses += 1
+        else:
+            self.fallback_hits += 1
+        return suggestions
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "fallback_hits": self.fallback_hits,
+            "fallback_misses": self.fallback_misses,
+            "redis_errors": self.redis_errors,
+            "local": self.local.stats(),
+            "stale": self.stale.stats(),
+        }
+
+# Shared cache instance used by both search routes
+suggestion_cache = SuggestionCache(
+    max_entries=settings.SUGGESTION_CACHE_MAX_ENTRIES,
+    local_ttl_seconds=settings.SUGGESTION_CACHE_LOCAL_TTL,
+    redis_ttl_seconds=settings.SUGGESTION_CACHE_REDIS_TTL,
+    stale_ttl_seconds=settings.SUGGESTION_CACHE_STALE_TTL
+)
+
+register_metrics("suggestion_cache", suggestion_cache.stats)
@@ -0,0 +1,288 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import math
+import time
+from fastapi import Response
+from .config import get_settings
+from .metrics import register_metrics
+from .prompts import build_search_messages
+from .redis_client import get_redis_client
+from .token_usage import DEFAULT_KEYWORD_TARGET, TokenUsage, estimate_prompt_tokens, max_tokens_for_target
+from .ttl_cache import TTLCache
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+TOKEN_BUDGET_LIMIT_HEADER = "X-Token-Budget-Limit"
+TOKEN_BUDGET_REMAINING_HEADER = "X-Token-Budget-Remaining"
+
+# Token buckets, one per user and one for the whole API, each stored as the
+# time (Redis server milliseconds) at which it will have drained; tokens
+# used = (TAT - now) * rate. A reservation is allowed if it fits in the
+# user's cap and in the global budget. Once global usage passes the
+# contention threshold, the user's cap shrinks to a fair share of the
+# global budget among users active in the last period. "settle" applies
+# a correction (possibly negative) without checks.
+# Returns {allowed, cap, remaining, retry_after_ms, reserved}.
+TOKEN_QUOTA_SCRIPT = """
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local mode = ARGV[1]
+local cost = tonumber(ARGV[2])
+local user_limit = tonumber(ARGV[3])
+local global_limit = tonumber(ARGV[4])
+local period = tonumber(ARGV[5])
+local contention = tonumber(ARGV[6])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local user_rate = user_limit / period
+local global_rate = global_limit / period
+local user_tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local global_tat = math.max(tonumber(redis.call('GET', KEYS[2])) or now, now)
+local user_used = (user_tat - now) * user_rate
+local global_used = (global_tat - now) * global_rate
+local cap = user_limit
+
+if mode == 'reserve' then
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now - period)
+    redis.call('ZADD', KEYS[3], now, ARGV[7])
+    redis.call('PEXPIRE', KEYS[3], period)
+    if global_used + cost > global_limit * contention then
+        cap = math.min(user_limit, global_limit / redis.call('ZCARD', KEYS[3]))
+    end
+    cost = math.min(cost, cap)
+    local user_wait = (user_used + cost - cap) / user_rate
+    local global_wait = (global_used + cost - global_limit) / global_rate
+    if user_wait > 0 or global_wait > 0 then
+        return {0, math.floor(cap), math.floor(math.max(cap - user_used, 0)), math.ceil(math.max(user_wait, global_wait)), 0}
+    end
+end
+
+user_tat = math.max(user_tat + cost / user_rate, now)
+global_tat = math.max(global_tat + cost / global_rate, now)
+if user_tat > now then
+    redis.call('SET', KEYS[1], string.format('%.3f', user_tat), 'PX', math.ceil(user_tat - now))
+end
+if global_tat > now then
+    redis.call('SET', KEYS[2], string.format('%.3f', global_tat), 'PX', math.ceil(global_tat - now))
+end
+return {1, math.floor(cap), math.floor(math.max(cap - (user_tat - now) * user_rate, 0)), 0, math.floor(cost)}
+"""
+
+def estimate_search_tokens(
+    phrases: List[str],
+    search_mode: str,
+    keyword_target: int,
+    max_tokens: Optional[int] = None,
+    fan_out: bool = False
+) -> int:
+    """
+    Tokens a search generation is expected to use, for reserving quota.
+
+    Fan-out searches send one prompt per phrase. Load-more exclusions are
+    not known yet; the reservation is settled with the real usage anyway.
+    """
+    prompts = [[phrase] for phrase in phrases] if fan_out else [phrases]
+    prompt_tokens = sum(
+        estimate_prompt_tokens(build_search_messages(prompt_phrases, search_mode, keyword_target))
+        for prompt_phrases in prompts
+    )
+    completion_tokens = max_tokens if max_tokens else max_tokens_for_target(DEFAULT_KEYWORD_TARGET)
+    return prompt_tokens + completion_tokens
+
+class QuotaDecision:
+    """Outcome of a token reservation; settled once the generation's usage is known."""
+
+    def __init__(
+        self,
+        user_id: str,
+        allowed: bool,
+        limit: int,
+        remaining: int,
+        retry_after: float = 0.0,
+        reserved: int = 0,
+        shared: bool = True
+    ):
+        self.user_id = user_id
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, remaining)
+        self.retry_after = retry_after
+        self.reserved = reserved
+        # Whether the reservation was made in Redis or in process
+        self.shared = shared
+        self.settled = False
+
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            TOKEN_BUDGET_LIMIT_HEADER: str(self.limit),
+            TOKEN_BUDGET_REMAINING_HEADER: str(self.remaining),
+        }
+
+class TokenQuota:
+    """
+    Per-user and global budgets of OpenAI tokens (prompt plus completion)
+    per `seconds`.
+
+    A search reserves its estimated tokens before the upstream request is
+    opened and settles the difference once the usage reported by the API,
+    or estimated from the streamed text, is known. While global usage is
+    below `contention` of the global budget each user may spend up to
+    `user_limit`; above it, each active user is capped at an equal share
+    of the global budget, so heavy users cannot starve interactive ones.
+
+    With Redis the buckets are shared by all workers and updated by one
+    script per call. Without Redis, or after a Redis error (retried after
+    `redis_retry_seconds`), each worker enforces both budgets on its own.
+    """
+
+    def __init__(
+        self,
+        user_limit: int = 20000,
+        global_limit: int = 200000,
+        seconds: int = 60,
+        contention: float = 0.8,
+        redis_retry_seconds: float = 5.0,
+        max_users: int = 10000,
+        key_prefix: str = "token_quota"
+    ):
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.seconds = seconds
+        self.contention = contention
+        self.redis_retry_seconds = redis_retry_seconds
+        self.key_prefix = key_prefix
+        # In-process TATs (monotonic seconds) and last reservation per user
+        self.local = TTLCache(max_entries=max_users, ttl_seconds=seconds)
+        self.active = TTLCache(max_entries=max_users, ttl_seconds=seconds)
+        self.local_global_tat = 0.0
+        self._script = None
+        self._redis_retry_at = 0.0
+        self.reservations = 0
+        self.rejections = 0
+        self.fair_share_rejections = 0
+        self.reserved_tokens = 0
+        self.used_tokens = 0
+        self.redis_errors = 0
+
+    def _keys(self, user_id: str) -> List[str]:
+        return [
+            f"{self.key_prefix}:user:{user_id}",
+            f"{self.key_prefix}:global",
+            f"{self.key_prefix}:active",
+        ]
+
+    def _local_apply(self, mode: str, user_id: str, cost: int) -> List[float]:
+        """In-process mirror of TOKEN_QUOTA_SCRIPT, in seconds."""
+        now = time.monotonic()
+        user_rate = self.user_limit / self.seconds
+        global_rate = self.global_limit / self.seconds
+        user_tat = max(self.local.get(user_id) or now, now)
+        global_tat = max(self.local_global_tat, now)
+        user_used = (user_tat - now) * user_rate
+        global_used = (global_tat - now) * global_rate
+        cap = self.user_limit
+
+        if mode == "reserve":
+            self.active.set(user_id, now)
+            if global_used + cost > self.global_limit * self.contention:
+                cap = min(self.user_limit, self.global_limit / len(self.active))
+            cost = min(cost, cap)
+            user_wait = (user_used + cost - cap) / user_rate
+            global_wait = (global_used + cost - self.global_limit) / global_rate
+            if user_wait > 0 or global_wait > 0:
+                return [0, cap, max(cap - user_used, 0), max(user_wait, global_wait) * 1000, 0]
+
+        user_tat = max(user_tat + cost / user_rate, now)
+        self.local_global_tat = max(global_tat + cost / global_rate, now)
+        self.local.set(user_id, user_tat)
+        return [1, cap, max(cap - (user_tat - now) * user_rate, 0), 0, cost]
+
+    async def _apply(self, mode: str, user_id: str, cost: int, shared: bool = True) -> List[Any]:
+        redis_client = get_redis_client()
+        if shared and redis_client is not None and time.monotonic() >= self._redis_retry_at:
+            if self._script is None or self._script.registered_client is not redis_client:
+                self._script = redis_client.register_script(TOKEN_QUOTA_SCRIPT)
+            try:
+                result = await self._script(
+                    keys=self._keys(user_id),
+                    args=[mode, cost, self.user_limit, self.global_limit, self.seconds * 1000, self.contention, user_id]
+                )
+                return result + [True]
+            except Exception as e:
+                self.redis_errors += 1
+                self._redis_retry_at = time.monotonic() + self.redis_retry_seconds
+                logger.warning(f"Token quota Redis update failed, enforcing locally: {str(e)}")
+        return self._local_apply(mode, user_id, cost) + [False]
+
+    async def reserve(self, user_id: str, tokens: int) -> QuotaDecision:
+        """Reserve the estimated tokens of a generation about to be started."""
+        allowed, cap, remaining, retry_after_ms, reserved, shared = await self._apply("reserve", user_id, tokens)
+        decision = QuotaDecision(
+            user_id,
+            bool(allowed),
+            int(cap),
+            int(remaining),
+            retry_after=float(retry_after_ms) / 1000,
+            reserved=int(reserved),
+            shared=shared
+        )
+        if decision.allowed:
+            self.reservations += 1
+            self.reserved_tokens += decision.reserved
+        else:
+            self.rejections += 1
+            if decision.limit < self.user_limit:
+                self.fair_share_rejections += 1
+        return decision
+
+    async def settle(self, decision: QuotaDecision, used_tokens: int):
+        """Replace a reservation with the tokens the generation actually used."""
+        if not decision.allowed or decision.settled:
+            return
+        decision.settled = True
+        self.used_tokens += used_tokens
+        correction = used_tokens - decision.reserved
+        if correction:
+            await self._apply("settle", decision.user_id, correction, shared=decision.shared)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "user_limit": self.user_limit,
+            "global_limit": self.global_limit,
+            "reservations": self.reservations,
+            "rejections": self.rejections,
+            "fair_share_rejections": self.fair_share_rejections,
+            "reserved_tokens": self.reserved_tokens,
+            "used_tokens": self.used_tokens,
+            # Above 1 the estimates are conservative and hold back budget
+            "reserved_per_used": round(self.reserved_tokens / self.used_tokens, 3) if self.used_tokens else None,
+            "redis_errors": self.redis_errors,
+        }
+
+def set_budget_headers(response: Response, decision: QuotaDecision):
+    response.headers.update(decision.headers())
+
+async def settle_after(source: AsyncIterator[Any], decision: Optional[QuotaDecision], usage: TokenUsage) -> AsyncIterator[Any]:
+    """Iterate `source`, settling `decision` with `usage` once it ends, fails or is cancelled."""
+    try:
+        async for item in source:
+            yield item
+    finally:
+        if decision is not None:
+            await token_quota.settle(decision, usage.total_prompt_tokens + usage.completion_tokens)
+
+# Shared token budgets for LLM-backed search
+token_quota = TokenQuota(
+    user_limit=settings.TOKEN_QUOTA_USER_PER_MINUTE,
+    global_limit=settings.TOKEN_QUOTA_GLOBAL_PER_MINUTE,
+    contention=settings.TOKEN_QUOTA_CONTENTION
+)
+
+register_metrics("token_quota", token_quota.stats)
\ No newline at end of file
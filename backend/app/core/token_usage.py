@@ -0,0 +1,177 @@
+from typing import Any, Dict, List, Optional
+import math
+from .metrics import register_metrics
+
+# Rough average for English text with the GPT-4o tokenizer
+CHARS_PER_TOKEN = 4
+
+# Typical completion tokens per generated suggestion line, newline included
+TOKENS_PER_SUGGESTION_LINE = 6
+
+# Keyword count the prompts ask for when no result count is requested
+DEFAULT_KEYWORD_TARGET = 100
+
+# Chat formatting tokens added per message on top of its content
+TOKENS_PER_MESSAGE = 4
+
+def estimate_tokens_for_chars(char_count: int) -> int:
+    """Estimate the token count of `char_count` characters of generated text."""
+    if char_count <= 0:
+        return 0
+    return max(1, round(char_count / CHARS_PER_TOKEN))
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text when the API does not report usage."""
+    return estimate_tokens_for_chars(len(text))
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of chat messages."""
+    return sum(estimate_tokens(message["content"]) + TOKENS_PER_MESSAGE for message in messages)
+
+def generation_target(limit: Optional[int], overgeneration: float) -> int:
+    """
+    Number of keywords to ask the model for when `limit` results are wanted.
+
+    Some generated lines are dropped as duplicates, so a little more than
+    the limit is requested.
+    """
+    if limit is None:
+        return DEFAULT_KEYWORD_TARGET
+    return max(1, math.ceil(limit * overgeneration))
+
+def max_tokens_for_target(target: int) -> int:
+    """Completion token cap sized for `target` suggestion lines."""
+    return target * TOKENS_PER_SUGGESTION_LINE + TOKENS_PER_SUGGESTION_LINE
+
+def tokens_per_suggestion(completion_tokens: int, unique_suggestions: int) -> Optional[float]:
+    """Completion tokens per unique suggestion, or None if none were sent."""
+    if not unique_suggestions:
+        return None
+    return round(completion_tokens / unique_suggestions, 2)
+
+def unique_per_line(unique_suggestions: int, generated_lines: int) -> Optional[float]:
+    """Share of generated lines that reached the client as new suggestions."""
+    if not generated_lines:
+        return None
+    return round(unique_suggestions / generated_lines, 3)
+
+def cached_prompt_ratio(prompt_tokens: int, cached_prompt_tokens: int) -> Optional[float]:
+    """Share of prompt tokens served from the provider's prompt cache."""
+    if not prompt_tokens:
+        return None
+    return round(cached_prompt_tokens / prompt_tokens, 3)
+
+class TokenUsage:
+    """
+    Token usage of one generation, reported by the API or estimated.
+
+    Generations made of several upstream requests track each request in a
+    child and report the sum.
+    """
+
+    def __init__(self):
+        self.prompt_tokens: Optional[int] = None
+        self.cached_prompt_tokens: Optional[int] = None
+        self.reported_completion_tokens: Optional[int] = None
+        self.completion_chars = 0
+        self.generated_lines = 0
+        self.children: List["TokenUsage"] = []
+
+    def add_child(self) -> "TokenUsage":
+        child = TokenUsage()
+        self.children.append(child)
+        return child
+
+    def record_content(self, content: str):
+        self.completion_chars += len(content)
+
+    def record_reported(self, usage: Any):
+        """Record the `usage` object sent by the API, if any."""
+        if usage is None:
+            return
+        self.prompt_tokens = usage.prompt_tokens
+        self.reported_completion_tokens = usage.completion_tokens
+        # Only reported by API versions with automatic prompt caching
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_prompt_tokens = getattr(details, "cached_tokens", None) or 0
+
+    def record_line(self):
+        self.generated_lines += 1
+
+    @property
+    def total_generated_lines(self) -> int:
+        return self.generated_lines + sum(child.total_generated_lines for child in self.children)
+
+    @property
+    def total_prompt_tokens(self) -> int:
+        return (self.prompt_tokens or 0) + sum(child.total_prompt_tokens for child in self.children)
+
+    @property
+    def total_cached_prompt_tokens(self) -> int:
+        return (self.cached_prompt_tokens or 0) + sum(child.total_cached_prompt_tokens for child in self.children)
+
+    @property
+    def completion_tokens(self) -> int:
+        if self.reported_completion_tokens is not None:
+            own = self.reported_completion_tokens
+        else:
+            own = estimate_tokens_for_chars(self.completion_chars)
+        return own + sum(child.completion_tokens for child in self.children)
+
+class GenerationEfficiency:
+    """
+    Tokens and lines spent per unique suggestion delivered to a client.
+
+    First pages and load-more pages are tracked separately, since load more
+    loses many generated lines to session dedup.
+    """
+
+    def __init__(self):
+        self._buckets = {
+            "first_page": self._empty_bucket(),
+            "load_more": self._empty_bucket(),
+        }
+
+    @staticmethod
+    def _empty_bucket() -> Dict[str, int]:
+        return {
+            "generations": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "generated_lines": 0,
+            "unique_suggestions": 0,
+        }
+
+    def record(
+        self,
+        completion_tokens: int,
+        unique_suggestions: int,
+        generated_lines: int = 0,
+        is_load_more: bool = False,
+        prompt_tokens: int = 0,
+        cached_prompt_tokens: int = 0
+    ):
+        bucket = self._buckets["load_more" if is_load_more else "first_page"]
+        bucket["generations"] += 1
+        bucket["prompt_tokens"] += prompt_tokens
+        bucket["cached_prompt_tokens"] += cached_prompt_tokens
+        bucket["completion_tokens"] += completion_tokens
+        bucket["generated_lines"] += generated_lines
+        bucket["unique_suggestions"] += unique_suggestions
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = {}
+        for name, bucket in self._buckets.items():
+            snapshot[name] = {
+                **bucket,
+                "tokens_per_unique_suggestion": tokens_per_suggestion(bucket["completion_tokens"], bucket["unique_suggestions"]),
+                "unique_per_line": unique_per_line(bucket["unique_suggestions"], bucket["generated_lines"]),
+                "cached_prompt_ratio": cached_prompt_ratio(bucket["prompt_tokens"], bucket["cached_prompt_tokens"]),
+            }
+        return snapshot
+
+# Shared efficiency counters for search generations in this worker
+generation_efficiency = GenerationEfficiency()
+
+register_metrics("search_tokens", generation_efficiency.stats)
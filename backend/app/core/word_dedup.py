@@ -0,0 +1,206 @@
+from array import array
+from typing import Iterable, Iterator, Union
+import hashlib
+import sys
+from .search_query import normalize_word
+
+FINGERPRINT_BITS = 64
+_SIGNED_LIMIT = 1 << (FINGERPRINT_BITS - 1)
+_UNSIGNED_RANGE = 1 << FINGERPRINT_BITS
+
+def fingerprint(word: str) -> int:
+    """Return a non-zero unsigned 64-bit hash of a normalized word."""
+    digest = hashlib.blake2b(normalize_word(word).encode("utf-8"), digest_size=8).digest()
+    # 0 marks an empty slot in FingerprintSet, so it is never a valid fingerprint
+    return int.from_bytes(digest, "little") or 1
+
+def _to_signed(value: int) -> int:
+    return value - _UNSIGNED_RANGE if value >= _SIGNED_LIMIT else value
+
+def _to_unsigned(value: int) -> int:
+    return value + _UNSIGNED_RANGE if value < 0 else value
+
+class StringWordSet:
+    """Word dedup backed by a plain `set` of normalized strings."""
+
+    mode = "set"
+
+    def __init__(self, members: Iterable[str] = ()):
+        self._words = set()
+        self._string_bytes = 0
+        for member in members:
+            self._add_member(member)
+
+    @staticmethod
+    def member(word: str) -> str:
+        """Return the serialized form stored for a word (e.g. in Redis)."""
+        return normalize_word(word)
+
+    def _add_member(self, member: str) -> bool:
+        if member in self._words:
+            return False
+        self._words.add(member)
+        self._string_bytes += sys.getsizeof(member)
+        return True
+
+    def add(self, word: str) -> bool:
+        """Add a word, returning True if it was not already present."""
+        return self._add_member(normalize_word(word))
+
+    def __contains__(self, word: str) -> bool:
+        return normalize_word(word) in self._words
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def members(self) -> Iterator[str]:
+        return iter(self._words)
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self._words) + self._string_bytes
+
+    def copy(self) -> "StringWordSet":
+        clone = StringWordSet()
+        clone._words = set(self._words)
+        clone._string_bytes = self._string_bytes
+        return clone
+
+class FingerprintSet:
+    """
+    Word dedup storing 64-bit fingerprints in an open-addressing table.
+
+    Each word costs one 8-byte slot (plus load-factor headroom) instead of
+    a full string object. Collisions between distinct words are possible
+    but at 64 bits are negligible for per-session word counts. An optional
+    Bloom filter answers most negative lookups without probing the table.
+    """
+
+    mode = "fingerprint"
+    MAX_LOAD = 0.7
+    BLOOM_HASHES = 4
+
+    def __init__(self, members: Iterable[Union[int, str]] = (), capacity: int = 64, bloom_bits: int = 0):
+        size = 8
+        while size < capacity:
+            size <<= 1
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+        self._bloom_bits = bloom_bits
+        self._bloom = bytearray((bloom_bits + 7) // 8) if bloom_bits else None
+        for member in members:
+            self.add_fingerprint(_to_unsigned(int(member)))
+
+    @staticmethod
+    def member(word: str) -> str:
+        """Return the serialized form stored for a word (a signed 64-bit int)."""
+        return str(_to_signed(fingerprint(word)))
+
+    def _bloom_positions(self, value: int) -> Iterator[int]:
+        low = value & 0xFFFFFFFF
+        high = (value >> 32) | 1
+        for i in range(self.BLOOM_HASHES):
+            yield (low + i * high) % self._bloom_bits
+
+    def _bloom_may_contain(self, value: int) -> bool:
+        bloom = self._bloom
+        for position in self._bloom_positions(value):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _slot(self, value: int) -> int:
+        table = self._table
+        mask = self._mask
+        index = value & mask
+        while True:
+            current = table[index]
+            if current == 0 or current == value:
+                return index
+            index = (index + 1) & mask
+
+    def _grow(self):
+        old = self._table
+        self._table = array("Q", bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        for value in old:
+            if value:
+                self._table[self._slot(value)] = value
+
+    def contains_fingerprint(self, value: int) -> bool:
+        if self._bloom is not None and not self._bloom_may_contain(value):
+            return False
+        return self._table[self._slot(value)] == value
+
+    def add_fingerprint(self, value: int) -> bool:
+        """Add a precomputed fingerprint, returning True if it was new."""
+        if self._bloom is not None and not self._bloom_may_contain(value):
+            index = None
+        else:
+            index = self._slot(value)
+            if self._table[index] == value:
+                return False
+
+        if (self._count + 1) > self.MAX_LOAD * len(self._table):
+            self._grow()
+            index = None
+        if index is None:
+            index = self._slot(value)
+
+        self._table[index] = value
+        self._count += 1
+        if self._bloom is not None:
+            for position in self._bloom_positions(value):
+                self._bloom[position >> 3] |= 1 << (position & 7)
+        return True
+
+    def add(self, word: str) -> bool:
+        """Add a word, returning True if it was not already present."""
+        return self.add_fingerprint(fingerprint(word))
+
+    def __contains__(self, word: str) -> bool:
+        return self.contains_fingerprint(fingerprint(word))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def members(self) -> Iterator[str]:
+        return (str(_to_signed(value)) for value in self._table if value)
+
+    def memory_bytes(self) -> int:
+        size = sys.getsizeof(self._table)
+        if self._bloom is not None:
+            size += sys.getsizeof(self._bloom)
+        return size
+
+    def copy(self) -> "FingerprintSet":
+        clone = type(self)(bloom_bits=self._bloom_bits)
+        clone._table = array("Q", self._table)
+        clone._mask = self._mask
+        clone._count = self._count
+        if self._bloom is not None:
+            clone._bloom = bytearray(self._bloom)
+        return clone
+
+class BloomFingerprintSet(FingerprintSet):
+    """FingerprintSet with a Bloom-filter prefilter in front of the table."""
+
+    mode = "fingerprint_bloom"
+    DEFAULT_BLOOM_BITS = 4096
+
+    def __init__(self, members: Iterable[Union[int, str]] = (), capacity: int = 64, bloom_bits: int = DEFAULT_BLOOM_BITS):
+        super().__init__(members, capacity=capacity, bloom_bits=bloom_bits)
+
+WORD_SET_TYPES = {
+    StringWordSet.mode: StringWordSet,
+    FingerprintSet.mode: FingerprintSet,
+    BloomFingerprintSet.mode: BloomFingerprintSet,
+}
+
+WordSet = Union[StringWordSet, FingerprintSet]
+
+def create_word_set(mode: str, members: Iterable[str] = ()) -> WordSet:
+    """Create an empty (or pre-filled) word set for a dedup mode."""
+    if mode not in WORD_SET_TYPES:
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    return WORD_SET_TYPES[mode](members)
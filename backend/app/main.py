@@ -2,9 +2,14 @@ from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from datetime import timedelta
 from starlette.responses import PlainTextResponse
 from .core.config import get_settings
+from .core.database import close_database, create_database
+from .core.openai_client import close_openai_client, init_openai_client
+from .core.pagination import NEXT_CURSOR_HEADER
+from .core.token_quota import TOKEN_BUDGET_LIMIT_HEADER, TOKEN_BUDGET_REMAINING_HEADER
 from .core.auth import (
     Token,
     authenticate_user,
@@ -12,14 +17,25 @@ from .core.auth import (
     verify_user_auth,
     get_current_active_user
 )
-# from .core.rate_limit import rate_limit_middleware, RATE_LIMITS # Commented out
-from .routes import projects, collections, saved_words, search, search_streaming
+from .core.rate_limit import RATE_LIMITS, limiter_for_path, rate_limit_middleware
+from .routes import projects, collections, saved_words, search, search_streaming, metrics
 
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One OpenAI client and one database client, each with its own
+    # connection pool, for the whole process
+    init_openai_client()
+    create_database()
+    yield
+    await close_openai_client()
+    await close_database()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -28,8 +44,8 @@ app.add_middleware(
     allow_origins=["http://localhost:5173"],  # Frontend origin
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["Authorization", "Content-Type"],
-    expose_headers=["Content-Length", "Content-Type"],  # Only expose necessary headers
+    allow_headers=["Authorization", "Content-Type", "If-None-Match"],
+    expose_headers=["Content-Length", "Content-Type", "ETag", "Retry-After", NEXT_CURSOR_HEADER, TOKEN_BUDGET_LIMIT_HEADER, TOKEN_BUDGET_REMAINING_HEADER],  # Only expose necessary headers
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
@@ -38,14 +54,10 @@ app.add_middleware(
 async def options_route(request: Request, full_path: str):
     """Handle OPTIONS preflight requests"""
     # Apply rate limiting to OPTIONS requests to prevent abuse
-    # limiter = RATE_LIMITS["default"] # Commented out
-    # return await rate_limit_middleware( # Commented out
-    #     request, 
-    #     lambda req: PlainTextResponse(""), 
-    #     limiter
-    # )
-    # Simpler response for OPTIONS when rate limiting is disabled
-    return PlainTextResponse("")
+    async def empty_response(req: Request):
+        return PlainTextResponse("")
+    
+    return await rate_limit_middleware(request, empty_response, RATE_LIMITS["default"])
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -87,16 +99,8 @@ async def auth_and_rate_limit_middleware(request: Request, call_next):
         )
     
     # Apply rate limiting based on endpoint type
-    path = request.url.path
-    # if "/search" in path: # Commented out
-    #     limiter = RATE_LIMITS["search"] # Commented out
-    # elif "/bulk" in path: # Commented out
-    #     limiter = RATE_LIMITS["bulk"] # Commented out
-    # else: # Commented out
-    #     limiter = RATE_LIMITS["default"] # Commented out
-    
-    # return await rate_limit_middleware(request, call_next, limiter) # Commented out
-    return await call_next(request) # Directly call next without rate limiting
+    limiter = limiter_for_path(request.url.path)
+    return await rate_limit_middleware(request, call_next, limiter)
 
 # Include routers
 app.include_router(projects.router, prefix=settings.API_V1_STR)
@@ -104,6 +108,7 @@ app.include_router(collections.router, prefix=settings.API_V1_STR)
 app.include_router(saved_words.router, prefix=settings.API_V1_STR)
 app.include_router(search.router, prefix=settings.API_V1_STR)
 app.include_router(search_streaming.router, prefix=settings.API_V1_STR)
+app.include_router(metrics.router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 async def root():
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from ..core.database import get_supabase_client
+from ..core import repository
+from ..core.etag import is_not_modified, not_modified, project_etag, set_cache_headers
+from ..core.ownership_cache import ownership_cache
+from ..core.pagination import page_request, set_next_cursor
+from ..core.response_cache import project_scope, request_variant, response_cache
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
@@ -53,85 +57,126 @@ async def create_collection(
     request: Request
 ):
     """Create a new collection in a project."""
-    supabase = get_supabase_client()
-    
     # Verify project ownership
-    project = supabase.table("projects")\
-        .select("id")\
-        .eq("id", collection.project_id)\
-        .eq("user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not project.data:
+    if not await repository.verify_project_owner(collection.project_id, request.state.user_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Check if collection with same name already exists in project
-    existing_collection = supabase.table("collections")\
-        .select("*, saved_words(*)")\
-        .eq("project_id", collection.project_id)\
-        .eq("name", collection.name)\
-        .execute()
+    existing_collection = await repository.find_collection_by_name(collection.project_id, collection.name)
     
-    if existing_collection.data and len(existing_collection.data) > 0:
+    if existing_collection:
         # Return the existing collection instead of throwing an error
-        return existing_collection.data[0]
-    
-    data = {
-        "name": collection.name,
-        "project_id": collection.project_id
-    }
+        await ownership_cache.add_collections(request.state.user_id, [(existing_collection["id"], collection.project_id)])
+        return existing_collection
     
     try:
-        result = supabase.table("collections").insert(data).execute()
+        result = await repository.create_collection(collection.project_id, collection.name)
         
-        if not result.data or len(result.data) == 0:
+        if not result:
             raise HTTPException(status_code=500, detail="Failed to create collection - no data returned")
-            
-        return result.data[0]
+        
+        await ownership_cache.add_collections(request.state.user_id, [(result["id"], collection.project_id)])
+        await response_cache.invalidate_projects(request.state.user_id, [collection.project_id])
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create collection: {str(e)}")
 
 @router.get("/project/{project_id}", response_model=List[Collection])
-async def list_collections(project_id: str, request: Request):
-    """List all collections in a project."""
-    supabase = get_supabase_client()
-    
-    # Verify project ownership
-    project = supabase.table("projects")\
-        .select("id")\
-        .eq("id", project_id)\
-        .eq("user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not project.data:
+async def list_collections(
+    project_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    include_words: bool = True
+):
+    """
+    List collections in a project, most recently updated first.
+    
+    Pass `limit` and/or `cursor` to page through them; the next page's
+    cursor is returned in the X-Next-Cursor header. With
+    `include_words=false` collections come without their saved words, which
+    can then be paged separately from /saved-words/collection/{id}.
+    
+    Responses carry an ETag; send it back in If-None-Match to get 304 Not
+    Modified without the collections being fetched again.
+    """
+    page = page_request(limit, cursor)
+    
+    # Entries are per user, so a hit also means the project is the user's
+    read = await response_cache.lookup(request.state.user_id, project_scope(project_id), request_variant(request))
+    if read.value is not None:
+        return _cached_response(request, response, read.value)
+    
+    # Verify project ownership and read its version in one query. The version
+    # is read before the data, so a concurrent change can only make the ETag
+    # older than the data, never newer.
+    version = await repository.get_project_version(project_id, request.state.user_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    result = supabase.table("collections")\
-        .select("*, saved_words(*)")\
-        .eq("project_id", project_id)\
-        .order("updated_at", desc=True)\
-        .execute()
-    
-    return result.data
+    etag = project_etag(request, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    
+    collections, next_cursor = await repository.list_collections(
+        project_id,
+        *page,
+        include_words=include_words
+    )
+    await response_cache.store(read, {"collections": collections, "next_cursor": next_cursor, "etag": etag})
+    set_next_cursor(response, next_cursor)
+    set_cache_headers(response, etag)
+    return collections
+
+def _cached_response(request: Request, response: Response, cached: dict):
+    if is_not_modified(request, cached["etag"]):
+        return not_modified(cached["etag"])
+    set_next_cursor(response, cached.get("next_cursor"))
+    set_cache_headers(response, cached["etag"])
+    return cached["collections"] if "collections" in cached else cached["collection"]
 
 @router.get("/{collection_id}", response_model=Collection)
-async def get_collection(collection_id: str, request: Request):
-    """Get a specific collection by ID."""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not result.data:
+async def get_collection(collection_id: str, request: Request, response: Response):
+    """
+    Get a specific collection by ID.
+    
+    Responses carry an ETag; send it back in If-None-Match to get 304 Not
+    Modified without the collection being fetched again.
+    """
+    # Cached under its project's scope, so only once the project is known
+    read = None
+    projects = await ownership_cache.collection_projects(request.state.user_id, [collection_id])
+    if collection_id in projects:
+        read = await response_cache.lookup(
+            request.state.user_id,
+            project_scope(projects[collection_id]),
+            request_variant(request)
+        )
+        if read.value is not None:
+            return _cached_response(request, response, read.value)
+    
+    if request.headers.get("if-none-match"):
+        version = await repository.get_collection_version(collection_id, request.state.user_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        etag = project_etag(request, version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    
+    result = await repository.get_owned_collection(collection_id, request.state.user_id)
+    
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    return result.data
+    await ownership_cache.add_collections(request.state.user_id, [(collection_id, result["project_id"])])
+    
+    # The embedded project carries the version
+    etag = project_etag(request, result["projects"]["version"])
+    if read is not None:
+        await response_cache.store(read, {"collection": result, "etag": etag})
+    set_cache_headers(response, etag)
+    return result
 
 @router.put("/{collection_id}", response_model=Collection)
 async def update_collection(
@@ -140,52 +185,26 @@ async def update_collection(
     request: Request
 ):
     """Update a collection's name."""
-    supabase = get_supabase_client()
+    # Rename only if the collection's project belongs to the user
+    result = await repository.rename_collections(request.state.user_id, [collection_id], collection.name)
     
-    # Verify collection ownership through project
-    existing = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not existing.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    result = supabase.table("collections")\
-        .update({"name": collection.name})\
-        .eq("id", collection_id)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to update collection")
-    
-    return result.data[0]
+    await response_cache.invalidate_projects(request.state.user_id, [result[0]["project_id"]])
+    return result[0]
 
 @router.delete("/{collection_id}")
 async def delete_collection(collection_id: str, request: Request):
     """Delete a collection."""
-    supabase = get_supabase_client()
+    # Delete only if the collection's project belongs to the user
+    result = await repository.delete_collections(request.state.user_id, [collection_id])
     
-    # Verify collection ownership through project
-    existing = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not existing.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    result = supabase.table("collections")\
-        .delete()\
-        .eq("id", collection_id)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to delete collection")
+    await ownership_cache.remove_collections(request.state.user_id, [collection_id])
+    await response_cache.invalidate_projects(request.state.user_id, [result[0]["project_id"]])
     
     return {"message": "Collection deleted successfully"}
 
@@ -195,28 +214,14 @@ async def bulk_update_collections(
     request: Request
 ):
     """Update multiple collections' names."""
-    supabase = get_supabase_client()
-    
-    # Verify collections ownership through projects
-    collections = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .in_("id", bulk_update.collection_ids)\
-        .eq("projects.user_id", request.state.user_id)\
-        .execute()
+    # Rename the collections whose projects belong to the user
+    result = await repository.rename_collections(request.state.user_id, bulk_update.collection_ids, bulk_update.name)
     
-    if not collections.data:
+    if not result:
         raise HTTPException(status_code=404, detail="No collections found")
     
-    # Update all collections
-    result = supabase.table("collections")\
-        .update({"name": bulk_update.name})\
-        .in_("id", bulk_update.collection_ids)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to update collections")
-    
-    return result.data
+    await response_cache.invalidate_projects(request.state.user_id, {row["project_id"] for row in result})
+    return result
 
 @router.put("/bulk/move", response_model=List[Collection])
 async def bulk_move_collections(
@@ -224,39 +229,33 @@ async def bulk_move_collections(
     request: Request
 ):
     """Move multiple collections to a different project."""
-    supabase = get_supabase_client()
-    
     # Verify target project ownership
-    target_project = supabase.table("projects")\
-        .select("id")\
-        .eq("id", bulk_move.target_project_id)\
-        .eq("user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not target_project.data:
+    if not await repository.verify_project_owner(bulk_move.target_project_id, request.state.user_id):
         raise HTTPException(status_code=404, detail="Target project not found")
     
-    # Verify collections ownership through projects
-    collections = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .in_("id", bulk_move.collection_ids)\
-        .eq("projects.user_id", request.state.user_id)\
-        .execute()
+    # The move only returns the new project, so note the old ones first
+    sources = await ownership_cache.collection_projects(request.state.user_id, bulk_move.collection_ids)
     
-    if not collections.data:
+    # Move the collections whose projects belong to the user
+    result = await repository.move_collections(request.state.user_id, bulk_move.collection_ids, bulk_move.target_project_id)
+    
+    if not result:
         raise HTTPException(status_code=404, detail="No collections found")
     
-    # Move collections to target project
-    result = supabase.table("collections")\
-        .update({"project_id": bulk_move.target_project_id})\
-        .in_("id", bulk_move.collection_ids)\
-        .execute()
+    await ownership_cache.add_collections(
+        request.state.user_id,
+        [(row["id"], bulk_move.target_project_id) for row in result]
+    )
     
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to move collections")
+    if any(row["id"] not in sources for row in result):
+        await response_cache.invalidate_user(request.state.user_id)
+    else:
+        await response_cache.invalidate_projects(
+            request.state.user_id,
+            set(sources.values()) | {bulk_move.target_project_id}
+        )
     
-    return result.data
+    return result
 
 @router.delete("/bulk")
 async def bulk_delete_collections(
@@ -264,26 +263,14 @@ async def bulk_delete_collections(
     request: Request
 ):
     """Delete multiple collections."""
-    supabase = get_supabase_client()
-    
-    # Verify collections ownership through projects
-    collections = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .in_("id", collection_ids)\
-        .eq("projects.user_id", request.state.user_id)\
-        .execute()
+    # Delete the collections whose projects belong to the user
+    result = await repository.delete_collections(request.state.user_id, collection_ids)
     
-    if not collections.data:
+    if not result:
         raise HTTPException(status_code=404, detail="No collections found")
     
-    # Delete collections
-    result = supabase.table("collections")\
-        .delete()\
-        .in_("id", collection_ids)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to delete collections")
+    await ownership_cache.remove_collections(request.state.user_id, [row["id"] for row in result])
+    await response_cache.invalidate_projects(request.state.user_id, {row["project_id"] for row in result})
     
     return {"message": "Collections deleted successfully"}
 
@@ -294,42 +281,14 @@ async def add_word_to_collection(
     request: Request
 ):
     """Add a single word to a collection."""
-    supabase = get_supabase_client()
+    # Add the word unless it is already saved, in one ownership-checked call
+    result = await repository.add_word_to_collection(request.state.user_id, collection_id, request_data.word)
     
-    # Verify collection ownership through project
-    existing = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not existing.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    # Check if word already exists in the collection
-    existing_word = supabase.table("saved_words")\
-        .select("word")\
-        .eq("collection_id", collection_id)\
-        .eq("word", request_data.word)\
-        .execute()
-    
-    # Only add the word if it doesn't already exist
-    if not existing_word.data:
-        # Insert the new word
-        supabase.table("saved_words").insert({
-            "word": request_data.word,
-            "collection_id": collection_id
-        }).execute()
-    
-    # Get updated collection with words
-    result = supabase.table("collections")\
-        .select("*, saved_words(*)")\
-        .eq("id", collection_id)\
-        .single()\
-        .execute()
-    
-    return result.data
+    await response_cache.invalidate_projects(request.state.user_id, [result["project_id"]])
+    return result
 
 
 
@@ -340,34 +299,14 @@ async def remove_word_from_collection(
     request: Request
 ):
     """Remove a single word from a collection."""
-    supabase = get_supabase_client()
-    
-    # Verify collection ownership through project
-    existing = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
+    result = await repository.remove_word_from_collection(request.state.user_id, collection_id, request_data.word)
     
-    if not existing.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    # Find and delete the word from the collection
-    word_result = supabase.table("saved_words")\
-        .delete()\
-        .eq("collection_id", collection_id)\
-        .eq("word", request_data.word)\
-        .execute()
-    
-    if not word_result.data:
+    if not result["removed"]:
         raise HTTPException(status_code=404, detail="Word not found in collection")
     
-    # Get updated collection with words
-    result = supabase.table("collections")\
-        .select("*, saved_words(*)")\
-        .eq("id", collection_id)\
-        .single()\
-        .execute()
+    await response_cache.invalidate_projects(request.state.user_id, [result["collection"]["project_id"]])
     
-    return result.data 
\ No newline at end of file
+    return result["collection"]
\ No newline at end of file
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from ..core.metrics import collect_metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("")
+async def get_metrics():
+    """Return counters from caches, stores and upstream clients in this worker."""
+    return await collect_metrics()
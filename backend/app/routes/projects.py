@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from ..core.database import get_supabase_client
+from ..core import repository
+from ..core.etag import cache_headers, is_not_modified, not_modified, project_etag, set_cache_headers
+from ..core.ownership_cache import ownership_cache
+from ..core.pagination import page_request, set_next_cursor
+from ..core.projection import columnar_words, flatten_counts, parse_fields, parse_include, project_select
+from ..core.response_cache import PROJECTS_SCOPE, project_scope, request_variant, response_cache
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -27,49 +33,111 @@ async def create_project(
     request: Request
 ):
     """Create a new project for the authenticated user."""
-    supabase = get_supabase_client()
+    result = await repository.create_project(request.state.user_id, project.name)
     
-    data = {
-        "name": project.name,
-        "user_id": request.state.user_id
-    }
-    
-    result = supabase.table("projects").insert(data).execute()
-    
-    if not result.data:
+    if not result:
         raise HTTPException(status_code=400, detail="Failed to create project")
     
-    return result.data[0]
+    await ownership_cache.add_projects(request.state.user_id, [result["id"]])
+    await response_cache.invalidate(request.state.user_id, [PROJECTS_SCOPE])
+    return result
 
 @router.get("", response_model=List[Project])
-async def list_projects(request: Request):
-    """List all projects for the authenticated user."""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("projects")\
-        .select("*")\
-        .eq("user_id", request.state.user_id)\
-        .order("updated_at", desc=True)\
-        .execute()
-    
-    return result.data
+async def list_projects(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None
+):
+    """
+    List projects for the authenticated user, most recently updated first.
+    
+    Pass `limit` and/or `cursor` to page through them; the next page's
+    cursor is returned in the X-Next-Cursor header.
+    """
+    page = page_request(limit, cursor)
+    
+    read = await response_cache.lookup(request.state.user_id, PROJECTS_SCOPE, request_variant(request))
+    if read.value is not None:
+        set_next_cursor(response, read.value["next_cursor"])
+        return read.value["projects"]
+    
+    projects, next_cursor = await repository.list_projects(request.state.user_id, *page)
+    await response_cache.store(read, {"projects": projects, "next_cursor": next_cursor})
+    set_next_cursor(response, next_cursor)
+    return projects
 
 @router.get("/{project_id}", response_model=Project)
-async def get_project(project_id: str, request: Request):
-    """Get a specific project by ID with its collections and saved words."""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("projects")\
-        .select("*, collections(*, saved_words(*))")\
-        .eq("id", project_id)\
-        .eq("user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not result.data:
+async def get_project(
+    project_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    words_format: Literal["rows", "columnar"] = "rows"
+):
+    """
+    Get a specific project by ID.
+    
+    By default only the project's own columns are fetched and returned.
+    Projection parameters shape the response instead:
+    - `fields`: comma-separated project columns to return (id is always included)
+    - `include`: comma-separated nested data, any of `collections`,
+      `words` (each collection's saved words) and `counts` (each
+      collection's `word_count`)
+    - `words_format=columnar`: saved words as one array per column
+      (`{"id": [...], "word": [...], "created_at": [...]}`), which is much
+      smaller for large collections
+    
+    Projected responses are returned as fetched, without response model validation.
+    
+    Responses carry an ETag; send it back in If-None-Match to get 304 Not
+    Modified without the project being fetched again.
+    """
+    project_fields = parse_fields(fields)
+    nested = parse_include(include)
+    projected = fields is not None or bool(nested)
+    
+    read = await response_cache.lookup(request.state.user_id, project_scope(project_id), request_variant(request))
+    if read.value is not None:
+        return _project_response(request, response, read.value["project"], read.value["etag"], projected)
+    
+    if request.headers.get("if-none-match"):
+        version = await repository.get_project_version(project_id, request.state.user_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        etag = project_etag(request, version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+    
+    result = await repository.get_owned_project(
+        project_id,
+        request.state.user_id,
+        columns=project_select(project_fields, nested) + ",version"
+    )
+    
+    if not result:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    return result.data
+    await ownership_cache.add_projects(request.state.user_id, [project_id])
+    etag = project_etag(request, result.pop("version"))
+    
+    if "counts" in nested:
+        flatten_counts(result)
+    if "words" in nested and words_format == "columnar":
+        for collection in result["collections"]:
+            collection["saved_words"] = columnar_words(collection["saved_words"])
+    
+    await response_cache.store(read, {"project": result, "etag": etag})
+    return _project_response(request, response, result, etag, projected)
+
+def _project_response(request: Request, response: Response, project: dict, etag: str, projected: bool):
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    if projected:
+        return JSONResponse(project, headers=cache_headers(etag))
+    set_cache_headers(response, etag)
+    return project
 
 @router.put("/{project_id}", response_model=Project)
 async def update_project(
@@ -78,31 +146,22 @@ async def update_project(
     request: Request
 ):
     """Update a project's name."""
-    supabase = get_supabase_client()
+    result = await repository.update_project(project_id, request.state.user_id, {"name": project.name})
     
-    result = supabase.table("projects")\
-        .update({"name": project.name})\
-        .eq("id", project_id)\
-        .eq("user_id", request.state.user_id)\
-        .execute()
-    
-    if not result.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    return result.data[0]
+    await response_cache.invalidate(request.state.user_id, [PROJECTS_SCOPE, project_scope(project_id)])
+    return result
 
 @router.delete("/{project_id}")
 async def delete_project(project_id: str, request: Request):
     """Delete a project by ID."""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("projects")\
-        .delete()\
-        .eq("id", project_id)\
-        .eq("user_id", request.state.user_id)\
-        .execute()
+    result = await repository.delete_project(project_id, request.state.user_id)
+    await ownership_cache.remove_projects(request.state.user_id, [project_id])
+    await response_cache.invalidate(request.state.user_id, [PROJECTS_SCOPE, project_scope(project_id)])
     
-    if not result.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Project not found")
     
     return {"message": "Project deleted successfully"}
@@ -110,11 +169,8 @@ async def delete_project(project_id: str, request: Request):
 @router.delete("/bulk/all")
 async def delete_all_projects(request: Request):
     """Delete all projects for the authenticated user."""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("projects")\
-        .delete()\
-        .eq("user_id", request.state.user_id)\
-        .execute()
+    await repository.delete_all_projects(request.state.user_id)
+    await ownership_cache.clear_user(request.state.user_id)
+    await response_cache.invalidate_user(request.state.user_id)
     
-    return {"message": "All projects deleted successfully"} 
\ No newline at end of file
+    return {"message": "All projects deleted successfully"}
\ No newline at end of file
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from ..core.database import get_supabase_client
+from ..core import repository
+from ..core.etag import is_not_modified, not_modified, project_etag, set_cache_headers
+from ..core.pagination import page_request, set_next_cursor
+from ..core.response_cache import response_cache
 
 router = APIRouter(prefix="/saved-words", tags=["saved-words"])
 
@@ -34,41 +37,19 @@ async def create_saved_word(
     request: Request
 ):
     """Save a single word to a collection."""
-    supabase = get_supabase_client()
+    # Insert the word unless it is already saved, checking ownership in the same call
+    result = await repository.save_words(request.state.user_id, saved_word.collection_id, [saved_word.word])
     
-    # Verify collection ownership through project
-    collection = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", saved_word.collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not collection.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    # Check if word already exists in collection
-    existing = supabase.table("saved_words")\
-        .select("id")\
-        .eq("collection_id", saved_word.collection_id)\
-        .eq("word", saved_word.word)\
-        .single()\
-        .execute()
+    inserted = [word for word in result if word["inserted"]]
     
-    if existing.data:
+    if not inserted:
         raise HTTPException(status_code=400, detail="Word already exists in collection")
     
-    data = {
-        "word": saved_word.word,
-        "collection_id": saved_word.collection_id
-    }
-    
-    result = supabase.table("saved_words").insert(data).execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to save word")
-    
-    return result.data[0]
+    await response_cache.invalidate_collections(request.state.user_id, [saved_word.collection_id])
+    return inserted[0]
 
 @router.post("/bulk", response_model=List[SavedWord])
 async def bulk_save_words(
@@ -76,93 +57,66 @@ async def bulk_save_words(
     request: Request
 ):
     """Save multiple words to a collection."""
-    supabase = get_supabase_client()
+    if not bulk_save.words:
+        raise HTTPException(status_code=400, detail="All words already exist in collection")
     
-    # Verify collection ownership through project
-    collection = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", bulk_save.collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
+    # Insert the new words, skipping duplicates, checking ownership in the same call
+    result = await repository.save_words(request.state.user_id, bulk_save.collection_id, bulk_save.words)
     
-    if not collection.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    # Get existing words to avoid duplicates
-    existing = supabase.table("saved_words")\
-        .select("word")\
-        .eq("collection_id", bulk_save.collection_id)\
-        .in_("word", bulk_save.words)\
-        .execute()
+    inserted = [word for word in result if word["inserted"]]
     
-    existing_words = {word["word"] for word in existing.data}
-    new_words = [word for word in bulk_save.words if word not in existing_words]
-    
-    if not new_words:
+    if not inserted:
         raise HTTPException(status_code=400, detail="All words already exist in collection")
     
-    # Prepare data for bulk insert
-    data = [
-        {"word": word, "collection_id": bulk_save.collection_id}
-        for word in new_words
-    ]
+    await response_cache.invalidate_collections(request.state.user_id, [bulk_save.collection_id])
+    return inserted
+
+@router.get("/collection/{collection_id}", response_model=List[SavedWord])
+async def list_saved_words(
+    collection_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None
+):
+    """
+    List saved words in a collection, newest first.
     
-    result = supabase.table("saved_words").insert(data).execute()
+    Pass `limit` and/or `cursor` to page through them; the next page's
+    cursor is returned in the X-Next-Cursor header.
     
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to save words")
+    Responses carry an ETag; send it back in If-None-Match to get 304 Not
+    Modified without the words being fetched again.
+    """
+    page = page_request(limit, cursor)
     
-    return result.data
-
-@router.get("/collection/{collection_id}", response_model=List[SavedWord])
-async def list_saved_words(collection_id: str, request: Request):
-    """List all saved words in a collection."""
-    supabase = get_supabase_client()
-    
-    # Verify collection ownership through project
-    collection = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not collection.data:
+    # Verify collection ownership through project and read the project's version
+    version = await repository.get_collection_version(collection_id, request.state.user_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    result = supabase.table("saved_words")\
-        .select("*")\
-        .eq("collection_id", collection_id)\
-        .order("created_at", desc=True)\
-        .execute()
+    etag = project_etag(request, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
     
-    return result.data
+    words, next_cursor = await repository.list_saved_words(collection_id, *page)
+    set_next_cursor(response, next_cursor)
+    set_cache_headers(response, etag)
+    return words
 
 @router.delete("/{word_id}")
 async def delete_saved_word(word_id: str, request: Request):
     """Delete a saved word."""
-    supabase = get_supabase_client()
-    
-    # Verify word ownership through collection and project
-    word = supabase.table("saved_words")\
-        .select("*, collections!inner(*, projects!inner(*))")\
-        .eq("id", word_id)\
-        .eq("collections.projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
+    # Delete only if the word's collection and project belong to the user
+    result = await repository.delete_saved_words(request.state.user_id, [word_id])
     
-    if not word.data:
+    if not result:
         raise HTTPException(status_code=404, detail="Word not found")
     
-    result = supabase.table("saved_words")\
-        .delete()\
-        .eq("id", word_id)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to delete word")
-    
+    await response_cache.invalidate_collections(request.state.user_id, [result[0]["collection_id"]])
     return {"message": "Word deleted successfully"}
 
 @router.put("/bulk/move", response_model=List[SavedWord])
@@ -171,39 +125,20 @@ async def bulk_move_words(
     request: Request
 ):
     """Move multiple words to a different collection."""
-    supabase = get_supabase_client()
-    
     # Verify target collection ownership through project
-    target_collection = supabase.table("collections")\
-        .select("*, projects!inner(*)")\
-        .eq("id", bulk_move.target_collection_id)\
-        .eq("projects.user_id", request.state.user_id)\
-        .single()\
-        .execute()
-    
-    if not target_collection.data:
+    if not await repository.verify_collection_owner(bulk_move.target_collection_id, request.state.user_id):
         raise HTTPException(status_code=404, detail="Target collection not found")
     
-    # Verify words ownership through collections and projects
-    words = supabase.table("saved_words")\
-        .select("*, collections!inner(*, projects!inner(*))")\
-        .in_("id", bulk_move.word_ids)\
-        .eq("collections.projects.user_id", request.state.user_id)\
-        .execute()
+    # Move the user's words, merging any the target collection already holds
+    result = await repository.move_saved_words(request.state.user_id, bulk_move.word_ids, bulk_move.target_collection_id)
     
-    if not words.data:
+    if not result:
         raise HTTPException(status_code=404, detail="No words found")
     
-    # Move words to target collection
-    result = supabase.table("saved_words")\
-        .update({"collection_id": bulk_move.target_collection_id})\
-        .in_("id", bulk_move.word_ids)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to move words")
-    
-    return result.data
+    # Only the target collection is returned, so the collections the words
+    # left are unknown
+    await response_cache.invalidate_user(request.state.user_id)
+    return result
 
 @router.delete("/bulk")
 async def bulk_delete_words(
@@ -211,25 +146,11 @@ async def bulk_delete_words(
     request: Request
 ):
     """Delete multiple saved words."""
-    supabase = get_supabase_client()
-    
-    # Verify words ownership through collections and projects
-    words = supabase.table("saved_words")\
-        .select("*, collections!inner(*, projects!inner(*))")\
-        .in_("id", word_ids)\
-        .eq("collections.projects.user_id", request.state.user_id)\
-        .execute()
+    # Delete the words whose collections and projects belong to the user
+    result = await repository.delete_saved_words(request.state.user_id, word_ids)
     
-    if not words.data:
+    if not result:
         raise HTTPException(status_code=404, detail="No words found")
     
-    # Delete words
-    result = supabase.table("saved_words")\
-        .delete()\
-        .in_("id", word_ids)\
-        .execute()
-    
-    if not result.data:
-        raise HTTPException(status_code=400, detail="Failed to delete words")
-    
-    return {"message": "Words deleted successfully"} 
\ No newline at end of file
+    await response_cache.invalidate_collections(request.state.user_id, {row["collection_id"] for row in result})
+    return {"message": "Words deleted successfully"}
\ No newline at end of file
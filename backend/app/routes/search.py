@@ -1,17 +1,38 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
-from ..core.database import get_supabase_client
+from itertools import zip_longest
+from openai import AsyncOpenAI
+import asyncio
+import math
+from ..core import repository
+from ..core.admission import FIRST_PAGE_LANE, AdmissionRejected, admission_controller
+from ..core.circuit_breaker import CircuitOpenError, is_openai_failure, openai_breaker
+from ..core.config import get_settings
 from ..core.openai_client import get_openai_client
-import re
+from ..core.prompts import build_search_messages
+from ..core.search_query import clean_suggestion, effective_search_mode, parse_phrases
+from ..core.suggestion_cache import suggestion_cache
+from ..core.token_quota import estimate_search_tokens, set_budget_headers, token_quota
+from ..core.token_usage import (
+    TokenUsage,
+    generation_efficiency,
+    generation_target,
+    max_tokens_for_target,
+    tokens_per_suggestion
+)
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+settings = get_settings()
+
 class SearchRequest(BaseModel):
     query: str
     project_id: str
     search_mode: Optional[str] = "or"  # "or" or "and"
+    limit: Optional[int] = Field(None, ge=1, le=settings.SEARCH_MAX_LIMIT)  # Maximum suggestions to return
+    fan_out: bool = False  # Run multi-phrase OR searches as one completion per phrase
 
 class KeywordSuggestion(BaseModel):
     word: str
@@ -20,120 +41,235 @@ class KeywordSuggestion(BaseModel):
 class SearchResponse(BaseModel):
     suggestions: List[KeywordSuggestion]
     search_id: Optional[str] = None
+    tokens_per_suggestion: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+    fallback: bool = False  # Previously generated suggestions served while OpenAI is unavailable
+
+async def _generate_words(
+    openai: AsyncOpenAI,
+    messages: List[Dict[str, str]],
+    usage: TokenUsage,
+    max_tokens: Optional[int] = None
+) -> List[str]:
+    """
+    Run one completion, record its usage and return its cleaned lines.
+    
+    Raises CircuitOpenError without calling OpenAI while it is unhealthy.
+    """
+    permit = openai_breaker.acquire()
+    try:
+        response = await openai.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=1.0,
+            max_tokens=max_tokens,
+        )
+    except Exception as e:
+        if is_openai_failure(e):
+            permit.failure()
+        else:
+            permit.release()
+        raise
+    except BaseException:
+        permit.abandon()
+        raise
+    permit.success()
+    
+    suggestions_text = response.choices[0].message.content.strip()
+    usage.record_content(suggestions_text)
+    usage.record_reported(response.usage)
+    # Split by newlines and clean each item
+    words = [clean_suggestion(word) for word in suggestions_text.split('\n') if word.strip()]
+    # Count generated lines before fan-out merging drops duplicates
+    for word in words:
+        if word:
+            usage.record_line()
+    return words
+
+async def _generate_fan_out_words(
+    openai: AsyncOpenAI,
+    phrases: List[str],
+    keyword_target: int,
+    usage: TokenUsage,
+    max_tokens: Optional[int] = None
+) -> List[str]:
+    """
+    Run one completion per phrase concurrently for an OR search.
+
+    Results are interleaved round-robin across phrases and deduplicated.
+    Failed phrases are skipped unless every phrase failed.
+    """
+    semaphore = asyncio.Semaphore(settings.FAN_OUT_MAX_CONCURRENCY)
+    branch_target = math.ceil(keyword_target / len(phrases))
+    branch_max_tokens = math.ceil(max_tokens / len(phrases)) if max_tokens else None
+    
+    async def branch(phrase: str) -> List[str]:
+        async with semaphore:
+            messages = build_search_messages([phrase], "or", branch_target)
+            return await _generate_words(openai, messages, usage.add_child(), branch_max_tokens)
+    
+    results = await asyncio.gather(*[branch(phrase) for phrase in phrases], return_exceptions=True)
+    successful = [result for result in results if not isinstance(result, BaseException)]
+    if not successful:
+        raise results[-1]
+    
+    words = []
+    seen = set()
+    for round_words in zip_longest(*successful):
+        for word in round_words:
+            if word and word.lower() not in seen:
+                seen.add(word.lower())
+                words.append(word)
+    return words
 
 @router.post("", response_model=SearchResponse)
 async def search_keywords(
     search: SearchRequest,
-    request: Request
+    request: Request,
+    response: Response
 ):
-    """Search for keyword suggestions based on a query."""
-    supabase = get_supabase_client()
+    """
+    Search for keyword suggestions based on a query.
     
-    # Verify the project exists and user has access to it
-    project = supabase.table("projects")\
-        .select("id")\
-        .eq("id", search.project_id)\
-        .eq("user_id", request.state.user_id)\
-        .single()\
-        .execute()
+    Generations are charged to the user's token budget; the budget left is
+    sent in the X-Token-Budget-* headers, and 429 is returned when it is
+    used up. Cached results are free.
     
-    if not project.data:
+    Generations wait for a slot in the first-page admission lane and get
+    503 with Retry-After if none frees up in time.
+    """
+    # Verify the project exists and user has access to it
+    if not await repository.verify_project_owner(search.project_id, request.state.user_id):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Parse multiple phrases
-    phrases = [phrase.strip() for phrase in search.query.split("+") if phrase.strip()]
+    phrases = parse_phrases(search.query)
+    
+    # Serve repeated queries from the suggestion cache
+    cached = await suggestion_cache.get(phrases, search.search_mode)
+    if cached is not None:
+        return SearchResponse(
+            suggestions=[KeywordSuggestion(**suggestion) for suggestion in cached[:search.limit]],
+            tokens_per_suggestion=0.0
+        )
+    
+    # While OpenAI is failing, serve what was generated for the query before
+    if not openai_breaker.allows():
+        fallback = await suggestion_cache.get_fallback(phrases, search.search_mode)
+        if fallback is None:
+            retry_after = max(1, math.ceil(openai_breaker.retry_after()))
+            raise HTTPException(
+                status_code=503,
+                detail="Search is temporarily unavailable",
+                headers={"Retry-After": str(retry_after)}
+            )
+        return SearchResponse(
+            suggestions=[KeywordSuggestion(**suggestion) for suggestion in fallback[:search.limit]],
+            tokens_per_suggestion=0.0,
+            fallback=True
+        )
+    
+    # Size the generation from the requested result count
+    keyword_target = generation_target(search.limit, settings.SEARCH_OVERGENERATION_FACTOR)
+    
+    max_tokens = max_tokens_for_target(keyword_target) if search.limit else None
+    fan_out = search.fan_out and len(phrases) > 1 and effective_search_mode(phrases, search.search_mode) == "or"
+    
+    # Reserve the generation's estimated tokens before calling OpenAI
+    quota = None
+    if settings.TOKEN_QUOTA_ENABLED:
+        quota = await token_quota.reserve(
+            request.state.user_id,
+            estimate_search_tokens(phrases, search.search_mode, keyword_target, max_tokens, fan_out)
+        )
+        if not quota.allowed:
+            retry_after = quota.retry_after_seconds()
+            raise HTTPException(
+                status_code=429,
+                detail="Token budget exceeded",
+                headers={**quota.headers(), "Retry-After": str(retry_after)}
+            )
+        set_budget_headers(response, quota)
+    
+    try:
+        slot = await admission_controller.acquire(
+            FIRST_PAGE_LANE,
+            min(len(phrases), settings.FAN_OUT_MAX_CONCURRENCY) if fan_out else 1
+        )
+    except AdmissionRejected as e:
+        if quota is not None:
+            await token_quota.settle(quota, 0)
+        retry_after = e.retry_after_seconds()
+        raise HTTPException(
+            status_code=503,
+            detail="Search is busy, try again shortly",
+            headers={**(quota.headers() if quota is not None else {}), "Retry-After": str(retry_after)}
+        )
     
     # Get keyword suggestions from OpenAI
     openai = get_openai_client()
+    usage = TokenUsage()
     try:
         suggestions = []
         
-        # Generate results based on search mode
-        if len(phrases) == 1:
-            # Single phrase - always generate broad results (search_mode doesn't matter for single phrases)
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to "{search.query}".
-                Instructions:
-                - Generate at least 100 words or phrases related to "{search.query}"
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
-
-                The goal is to provide a wide range of potential connections to "{search.query}" across different domains and contexts."""
-            match_type = "or"
-            
-        elif len(phrases) > 1 and search.search_mode == "or":
-            # Multiple phrases in OR mode - generate OR results
-            phrases_list = ", ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to ANY of these phrases: {phrases_list}.
-                Instructions:
-                - Generate at least 100 words or phrases related to ONE OR MORE of these phrases: {phrases_list}
-                - Each suggestion should clearly relate to at least one of the phrases
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
+        # Only multi-phrase AND searches return intersection matches
+        match_type = effective_search_mode(phrases, search.search_mode)
 
-                The goal is to provide a wide range of potential connections to any of these phrases: {phrases_list}."""
-            match_type = "or"
-            
-        elif len(phrases) > 1 and search.search_mode == "and":
-            # Multiple phrases in AND mode - generate AND results
-            all_phrases = " AND ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Focused Brainstormer. Your job is to generate keywords that MUST be strongly related to ALL of the following concepts simultaneously: {all_phrases}.
-                Instructions:
-                - Generate words or phrases that have a DIRECT and MEANINGFUL connection to EACH of these concepts: {all_phrases}
-                - Each suggestion MUST strongly relate to ALL concepts, not just one or some of them
-                - Be extremely strict about this requirement - if a word only relates to one phrase but not others, DO NOT include it
-                - Aim for quality over quantity - it's better to provide fewer results that truly connect all concepts
-                - Prefer more specific terms that clearly demonstrate the intersection of all concepts
-                - Include both single words and multi-word phrases
-                - Each item should be on its own line with NO prefix characters
-                - Do not number your list
-                - Separate items using ONLY line breaks
-                
-                The goal is to find the TRUE intersection of these different concepts - words that genuinely relate to ALL of them simultaneously."""
-            match_type = "and"
-            
+        # Make the OpenAI API call(s)
+        if fan_out:
+            words = await _generate_fan_out_words(openai, phrases, keyword_target, usage, max_tokens)
         else:
-            # Fallback case - default to OR mode for multiple phrases
-            phrases_list = ", ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to ANY of these phrases: {phrases_list}.
-                Instructions:
-                - Generate at least 100 words or phrases related to ONE OR MORE of these phrases: {phrases_list}
-                - Each suggestion should clearly relate to at least one of the phrases
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
-
-                The goal is to provide a wide range of potential connections to any of these phrases: {phrases_list}."""
-            match_type = "or"
-
-        # Make the OpenAI API call
-        response = await openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": system_message}],
-            temperature=1.0,
-        )
+            messages = build_search_messages(phrases, search.search_mode, keyword_target)
+            words = await _generate_words(openai, messages, usage, max_tokens)
         
         # Process suggestions with the determined match_type
-        suggestions_text = response.choices[0].message.content.strip()
-        # Split by newlines and clean each item
         processed_suggestions = [
-            KeywordSuggestion(word=word.strip().lstrip('-•*').strip(), match_type=match_type) 
-            for word in suggestions_text.split('\n')
-            if word.strip()
+            KeywordSuggestion(word=word, match_type=match_type) 
+            for word in words
         ]
         suggestions.extend(processed_suggestions)
         
-        return SearchResponse(suggestions=suggestions)
+        if search.limit is None:
+            await suggestion_cache.set(
+                phrases,
+                search.search_mode,
+                [suggestion.dict() for suggestion in suggestions]
+            )
+        else:
+            # Keep the first `limit` unique suggestions
+            seen = set()
+            unique_suggestions = []
+            for suggestion in suggestions:
+                if suggestion.word.lower() not in seen:
+                    seen.add(suggestion.word.lower())
+                    unique_suggestions.append(suggestion)
+            suggestions = unique_suggestions[:search.limit]
+        
+        generation_efficiency.record(
+            usage.completion_tokens,
+            len(suggestions),
+            generated_lines=usage.total_generated_lines,
+            prompt_tokens=usage.total_prompt_tokens,
+            cached_prompt_tokens=usage.total_cached_prompt_tokens
+        )
         
+        return SearchResponse(
+            suggestions=suggestions,
+            tokens_per_suggestion=tokens_per_suggestion(usage.completion_tokens, len(suggestions)),
+            prompt_tokens=usage.total_prompt_tokens,
+            cached_prompt_tokens=usage.total_cached_prompt_tokens
+        )
+        
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Search is temporarily unavailable",
+            headers={"Retry-After": str(e.retry_after_seconds())}
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        slot.release()
+        if quota is not None:
+            await token_quota.settle(quota, usage.total_prompt_tokens + usage.completion_tokens) 
\ No newline at end of file
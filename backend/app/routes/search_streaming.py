@@ -1,205 +1,587 @@
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import StreamingResponse
-from typing import AsyncGenerator, Dict, Set
-from pydantic import BaseModel
-import json
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional
+from pydantic import BaseModel, Field
+from openai import AsyncOpenAI
+import asyncio
+import math
 import uuid
 import time
-from ..core.database import get_supabase_client
+from ..core import repository
+from ..core.admission import FIRST_PAGE_LANE, LOAD_MORE_LANE, PREFETCH_LANE, AdmissionRejected, admitted
+from ..core.circuit_breaker import CircuitOpenError, is_openai_failure, openai_breaker
+from ..core.config import get_settings
+from ..core.disconnect import ClientDisconnected, cancellation_stats, iterate_until_disconnect
+from ..core.fan_out import interleave
+from ..core.hedging import openai_hedger
+from ..core.line_splitter import IncrementalLineSplitter
 from ..core.openai_client import get_openai_client
+from ..core.prefetch import prefetcher
+from ..core.prompts import build_search_messages, load_more_instructions
+from ..core.search_query import MAX_SUGGESTION_LENGTH, clean_suggestion, effective_search_mode, parse_phrases
+from ..core.session_store import session_store
+from ..core.sse import batch_items, format_sse
+from ..core.stream_coalescer import stream_coalescer
+from ..core.suggestion_cache import build_cache_key, suggestion_cache
+from ..core.token_quota import QuotaDecision, estimate_search_tokens, settle_after, token_quota
+from ..core.token_usage import (
+    TokenUsage,
+    estimate_prompt_tokens,
+    generation_efficiency,
+    generation_target,
+    max_tokens_for_target,
+    tokens_per_suggestion,
+    unique_per_line
+)
+from ..core.word_dedup import WordSet
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+settings = get_settings()
+
 class StreamSearchRequest(BaseModel):
     query: str
     project_id: str
     search_mode: str = "or"  # "or" or "and"
     session_id: str = None  # For load more requests
     is_load_more: bool = False
+    batch: bool = False  # Group suggestions into "suggestions" events
+    limit: Optional[int] = Field(None, ge=1, le=settings.SEARCH_MAX_LIMIT)  # Stop after this many new suggestions
+    fan_out: bool = False  # Run multi-phrase OR searches as one generation per phrase
+
+def _load_more_instructions(existing_words: WordSet) -> str:
+    """Prompt instructions for a load-more page, if enabled."""
+    if not settings.LOAD_MORE_EXCLUSIONS:
+        return ""
+    return load_more_instructions(
+        existing_words,
+        max_words=settings.LOAD_MORE_EXCLUSION_MAX_WORDS,
+        max_chars=settings.LOAD_MORE_EXCLUSION_MAX_CHARS
+    )
+
+async def _iterate_cached(suggestions: List[Dict[str, str]]) -> AsyncGenerator[Dict[str, str], None]:
+    """Replay cached suggestions through the same path as a live generation."""
+    for suggestion in suggestions:
+        if suggestion["word"] and len(suggestion["word"]) <= MAX_SUGGESTION_LENGTH:
+            yield suggestion
+
+async def _filter_unseen(
+    source: AsyncIterator[Dict[str, str]],
+    existing_words: WordSet,
+    new_words: List[str],
+    limit: Optional[int] = None
+) -> AsyncGenerator[Dict[str, str], None]:
+    """
+    Yield suggestions not yet sent in the session, recording them as sent.
+
+    Stops after `limit` new suggestions; closing `source` then lets the
+    upstream generation be cancelled early.
+    """
+    try:
+        async for suggestion in source:
+            if existing_words.add(suggestion["word"]):
+                new_words.append(suggestion["word"])
+                yield suggestion
+                if limit is not None and len(new_words) >= limit:
+                    return
+    finally:
+        await source.aclose()
+
+async def generate_suggestions(
+    openai: AsyncOpenAI,
+    messages: List[Dict[str, str]],
+    match_type: str,
+    phrases: List[str],
+    search_mode: str,
+    cache_result: bool = True,
+    max_tokens: Optional[int] = None,
+    usage: Optional[TokenUsage] = None,
+    hedge: bool = False
+) -> AsyncGenerator[Dict[str, str], None]:
+    """
+    Stream unique suggestions from one upstream OpenAI generation.
+
+    Suggestions are deduplicated within the generation only; per-session
+    filtering is left to each subscriber. A complete generation is stored
+    in the suggestion cache when `cache_result` is set. Token usage is
+    recorded on `usage` as the stream progresses.
+    
+    The call goes through the OpenAI circuit breaker, so it fails fast
+    with CircuitOpenError while OpenAI is unhealthy. With `hedge`, a
+    request slow to produce its first token is raced by a second one
+    while the breaker is closed; the extra tokens are recorded on `usage`.
+    """
+    usage = usage if usage is not None else TokenUsage()
+    permit = openai_breaker.acquire()
+    try:
+        stream = await openai_hedger.open(
+            lambda: openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=1.0,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            ),
+            # Half-open probes test OpenAI one request at a time
+            hedge=hedge and not permit.probe,
+            prompt_tokens=estimate_prompt_tokens(messages),
+            usage=usage
+        )
+    except Exception as e:
+        if is_openai_failure(e):
+            permit.failure()
+        else:
+            permit.release()
+        raise
+    except BaseException:
+        permit.abandon()
+        raise
+
+    splitter = IncrementalLineSplitter()
+    generated = []
+    generated_words = set()
+    completed = False
+
+    def accept(line: str):
+        word = clean_suggestion(line)
+        if word:
+            usage.record_line()
+        if not word or len(word) > MAX_SUGGESTION_LENGTH or word.lower() in generated_words:
+            return None
+        generated_words.add(word.lower())
+        suggestion = {
+            "word": word,
+            "match_type": match_type
+        }
+        generated.append(suggestion)
+        return suggestion
+
+    try:
+        async for chunk in stream:
+            permit.mark_response()
+            # The final chunk carries usage and no choices
+            usage.record_reported(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                content = chunk.choices[0].delta.content
+                usage.record_content(content)
+
+                # Check for complete lines (words)
+                for line in splitter.feed(content):
+                    suggestion = accept(line)
+                    if suggestion is not None:
+                        yield suggestion
+
+        # Process any remaining content in buffer
+        remainder = splitter.flush()
+        if remainder is not None:
+            suggestion = accept(remainder)
+            if suggestion is not None:
+                yield suggestion
+
+        completed = True
+        permit.success()
+        cancellation_stats.record_completed(usage.completion_tokens)
+    except (asyncio.CancelledError, GeneratorExit):
+        permit.abandon()
+        cancellation_stats.record_cancelled(usage.completion_tokens)
+        raise
+    except Exception as e:
+        if is_openai_failure(e):
+            permit.failure()
+        raise
+    finally:
+        permit.release()
+        if not completed:
+            # Abort the upstream HTTP response instead of reading it to the end
+            await stream.close()
+
+    if cache_result:
+        await suggestion_cache.set(phrases, search_mode, generated)
 
-# Track sent words per session (in production, use Redis)
-session_words: Dict[str, Set[str]] = {}
-CACHE_EXPIRY = 30 * 60  # 30 minutes
+async def generate_fan_out_suggestions(
+    openai: AsyncOpenAI,
+    phrases: List[str],
+    keyword_target: int,
+    search_mode: str,
+    cache_result: bool = True,
+    max_tokens: Optional[int] = None,
+    usage: Optional[TokenUsage] = None,
+    extra_instructions: str = "",
+    hedge: bool = False
+) -> AsyncGenerator[Dict[str, str], None]:
+    """
+    Stream an OR search as one concurrent generation per phrase.
 
-def cleanup_expired_sessions():
-    """Remove expired session data.""" 
-    # For simplicity, we'll just clear old sessions periodically
-    # In production, use Redis with TTL
-    pass
+    Branches run with bounded concurrency and are interleaved fairly, so
+    every phrase contributes early results. Suggestions are deduplicated
+    across branches and the merged result is cached like a single
+    generation. `extra_instructions` are added to every branch's prompt,
+    and each branch is hedged on its own with `hedge`.
+    """
+    usage = usage if usage is not None else TokenUsage()
+    branch_target = math.ceil(keyword_target / len(phrases))
+    branch_max_tokens = math.ceil(max_tokens / len(phrases)) if max_tokens else None
+
+    def branch(phrase: str):
+        return lambda: generate_suggestions(
+            openai,
+            build_search_messages([phrase], "or", branch_target, extra_instructions),
+            "or",
+            [phrase],
+            search_mode,
+            cache_result=False,
+            max_tokens=branch_max_tokens,
+            usage=usage.add_child(),
+            hedge=hedge
+        )
+
+    generated = []
+    generated_words = set()
+    async for suggestion in interleave(
+        [branch(phrase) for phrase in phrases],
+        max_concurrency=settings.FAN_OUT_MAX_CONCURRENCY
+    ):
+        if suggestion["word"].lower() in generated_words:
+            continue
+        generated_words.add(suggestion["word"].lower())
+        generated.append(suggestion)
+        yield suggestion
+
+    if cache_result:
+        await suggestion_cache.set(phrases, search_mode, generated)
 
 async def stream_search_results(
     search: StreamSearchRequest,
-    user_id: str
+    user_id: str,
+    dedup_mode: str = settings.SESSION_DEDUP_MODE,
+    request: Optional[Request] = None,
+    quota: Optional[QuotaDecision] = None,
+    cached: Optional[List[Dict[str, str]]] = None,
+    cache_checked: bool = False
 ) -> AsyncGenerator[str, None]:
-    """Stream search results in real-time with load more support."""
-    supabase = get_supabase_client()
+    """
+    Stream search results in real-time with load more support.
+
+    `dedup_mode` selects how the session's sent words are tracked: "set"
+    keeps the normalized strings, "fingerprint" keeps 64-bit hashes and
+    "fingerprint_bloom" adds a Bloom-filter prefilter to those.
+
+    When `request` is given the client connection is polled, and the
+    upstream generation is aborted as soon as the client disconnects.
     
+    A token `quota` reserved for the search is settled with the tokens it
+    used; cached, fallback and shared generations cost this request nothing.
+    A search that needs a live generation but came without a `quota` (what
+    the caller expected to replay was gone) reserves one itself and ends
+    with an error event if the budget is used up. Prefetched pages are
+    charged when the prefetch is scheduled, so taking one is free too.
+
+    With `cache_checked`, the caller already looked the first page up in
+    the suggestion cache and `cached` is what it found.
+    """
     # Verify the project exists and user has access to it
-    project = supabase.table("projects")\
-        .select("id")\
-        .eq("id", search.project_id)\
-        .eq("user_id", user_id)\
-        .single()\
-        .execute()
-    
-    if not project.data:
-        yield f"data: {json.dumps({'type': 'error', 'message': 'Project not found'})}\n\n"
+    if not await repository.verify_project_owner(search.project_id, user_id):
+        if quota is not None:
+            await token_quota.settle(quota, 0)
+        yield format_sse({'type': 'error', 'message': 'Project not found'})
         return
     
     # Parse multiple phrases
-    phrases = [phrase.strip() for phrase in search.query.split("+") if phrase.strip()]
+    phrases = parse_phrases(search.query)
+    
+    # Size the generation from the requested result count
+    keyword_target = generation_target(search.limit, settings.SEARCH_OVERGENERATION_FACTOR)
+    max_tokens = max_tokens_for_target(keyword_target) if search.limit else None
     
     # Get keyword suggestions from OpenAI with streaming
     openai = get_openai_client()
     
+    new_words: List[str] = []
+    events = None
+    usage = TokenUsage()
     try:
-        # Generate system message based on search mode
-        if len(phrases) == 1:
-            # Single phrase
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to "{search.query}".
-                Instructions:
-                - Generate at least 100 words or phrases related to "{search.query}"
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
-
-                The goal is to provide a wide range of potential connections to "{search.query}" across different domains and contexts."""
-            match_type = "or"
-            
-        elif len(phrases) > 1 and search.search_mode == "or":
-            # Multiple phrases in OR mode
-            phrases_list = ", ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to ANY of these phrases: {phrases_list}.
-                Instructions:
-                - Generate at least 100 words or phrases related to ONE OR MORE of these phrases: {phrases_list}
-                - Each suggestion should clearly relate to at least one of the phrases
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
-
-                The goal is to provide a wide range of potential connections to any of these phrases: {phrases_list}."""
-            match_type = "or"
-            
-        elif len(phrases) > 1 and search.search_mode == "and":
-            # Multiple phrases in AND mode
-            all_phrases = " AND ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Focused Brainstormer. Your job is to generate keywords that MUST be strongly related to ALL of the following concepts simultaneously: {all_phrases}.
-                Instructions:
-                - Generate words or phrases that have a DIRECT and MEANINGFUL connection to EACH of these concepts: {all_phrases}
-                - Each suggestion MUST strongly relate to ALL concepts, not just one or some of them
-                - Be extremely strict about this requirement - if a word only relates to one phrase but not others, DO NOT include it
-                - Aim for quality over quantity - it's better to provide fewer results that truly connect all concepts
-                - Prefer more specific terms that clearly demonstrate the intersection of all concepts
-                - Include both single words and multi-word phrases
-                - Each item should be on its own line with NO prefix characters
-                - Do not number your list
-                - Separate items using ONLY line breaks
-                
-                The goal is to find the TRUE intersection of these different concepts - words that genuinely relate to ALL of them simultaneously."""
-            match_type = "and"
-            
-        else:
-            # Fallback case - default to OR mode for multiple phrases
-            phrases_list = ", ".join([f'"{phrase}"' for phrase in phrases])
-            system_message = f"""You are a Scattershot Brainstormer. Your job is to generate a diverse list of at least 100 keywords related to ANY of these phrases: {phrases_list}.
-                Instructions:
-                - Generate at least 100 words or phrases related to ONE OR MORE of these phrases: {phrases_list}
-                - Each suggestion should clearly relate to at least one of the phrases
-                - Include both single words and multi-word phrases, evenly mixed
-                - The words should not be organized in any particular order
-                - Ensure diversity across different fields: science, medicine, gaming, design, history, etc.
-                - Each item should be on its own line with NO prefix characters (no bullet points, no dashes)
-                - Do not number your list
-                - Separate items using ONLY line breaks
-
-                The goal is to provide a wide range of potential connections to any of these phrases: {phrases_list}."""
-            match_type = "or"
+        # Only multi-phrase AND searches return intersection matches
+        match_type = effective_search_mode(phrases, search.search_mode)
 
         # Get or create session ID
         session_id = search.session_id or str(uuid.uuid4())
         
         # Get existing words for this session (for load more)
-        if session_id not in session_words:
-            session_words[session_id] = set()
-        
-        existing_words = session_words[session_id]
+        existing_words = await session_store.load(session_id, dedup_mode)
         
         # Send initial status with session info
-        yield f"data: {json.dumps({'type': 'status', 'message': 'Generating keywords...', 'session_id': session_id, 'is_load_more': search.is_load_more})}\n\n"
-
-        # Create streaming OpenAI request
-        stream = await openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": system_message}],
-            temperature=1.0,
-            stream=True
-        )
+        yield format_sse({'type': 'status', 'message': 'Generating keywords...', 'session_id': session_id, 'is_load_more': search.is_load_more})
+
+        fan_out = _is_fan_out(search, phrases)
+        generation_key = _generation_key(search)
+
+        def make_generation(cache_result: bool, usage: TokenUsage, extra_instructions: str = "", hedge: bool = False):
+            if fan_out:
+                return generate_fan_out_suggestions(
+                    openai,
+                    phrases,
+                    keyword_target,
+                    search.search_mode,
+                    cache_result=cache_result,
+                    max_tokens=max_tokens,
+                    usage=usage,
+                    extra_instructions=extra_instructions,
+                    hedge=hedge
+                )
+            return generate_suggestions(
+                openai,
+                build_search_messages(phrases, search.search_mode, keyword_target, extra_instructions),
+                match_type,
+                phrases,
+                search.search_mode,
+                cache_result=cache_result,
+                max_tokens=max_tokens,
+                usage=usage,
+                hedge=hedge
+            )
+
+        # Replay cached suggestions for repeated first-page queries. Load more
+        # always needs a fresh generation since the cached words were sent.
+        if not cache_checked and not search.is_load_more:
+            cached = await suggestion_cache.get(phrases, search.search_mode)
+        prefetched = None
+        if search.is_load_more and settings.PREFETCH_ENABLED:
+            prefetched = prefetcher.take(session_id, generation_key)
+
+        fallback = None
+        if cached is not None:
+            source = _iterate_cached(cached)
+        elif prefetched is not None:
+            # The next page was generated in the background after the last one
+            usage = prefetched.usage
+            source = prefetcher.iterate(prefetched)
+        elif not openai_breaker.allows():
+            # OpenAI is failing; serve what was generated for the query before
+            fallback = await suggestion_cache.get_fallback(phrases, search.search_mode)
+            if fallback is None:
+                raise CircuitOpenError(openai_breaker.name, openai_breaker.retry_after())
+            source = _iterate_cached(fallback)
+        else:
+            # Size-limited generations are partial, so only full ones are cached
+            cache_result = not search.is_load_more and search.limit is None
+
+            # Load more steers the model away from what this session has seen,
+            # which makes the prompt specific to the session
+            extra_instructions = ""
+            coalesce_key = f"first:{generation_key}"
+            if search.is_load_more:
+                extra_instructions = _load_more_instructions(existing_words)
+                coalesce_key = f"more:{session_id}:{generation_key}"
 
-        # Stream results in real-time, filtering against session words
-        word_buffer = ""
+            # Identical concurrent searches share one upstream generation;
+            # only the subscriber that starts it has its tokens in `usage`.
+            # The generation takes its admission slot when it starts and
+            # holds it until it ends, however many subscribers read it.
+            # Prefetches are not hedged since nobody is waiting on them.
+            if quota is None and settings.TOKEN_QUOTA_ENABLED:
+                quota = await token_quota.reserve(user_id, _estimated_tokens(search))
+                if not quota.allowed:
+                    yield format_sse({'type': 'error', 'message': 'Token budget exceeded', 'retry_after': quota.retry_after_seconds()})
+                    return
+
+            source = stream_coalescer.subscribe(
+                coalesce_key,
+                lambda: admitted(
+                    LOAD_MORE_LANE if search.is_load_more else FIRST_PAGE_LANE,
+                    _admission_weight(search),
+                    lambda: make_generation(cache_result, usage, extra_instructions, hedge=settings.OPENAI_HEDGING_ENABLED)
+                )
+            )
+
+        # Stop reading upstream as soon as the client goes away
+        if request is not None:
+            source = iterate_until_disconnect(source, request, settings.DISCONNECT_POLL_INTERVAL)
+
+        # Filter against words already sent in this session
+        events = _filter_unseen(source, existing_words, new_words, search.limit)
+
+        # Stream results in real-time
         suggestions_sent = 0
-        
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                word_buffer += content
-                
-                # Check for complete lines (words)
-                while '\n' in word_buffer:
-                    line, word_buffer = word_buffer.split('\n', 1)
-                    word = line.strip().lstrip('-•*').strip()
-                    
-                    if word and len(word) <= 100 and word.lower() not in existing_words:  # Valid and not already sent
-                        existing_words.add(word.lower())
-                        suggestion = {
-                            "word": word,
-                            "match_type": match_type
-                        }
-                        print(f"Streaming word: {word}")  # Debug log
-                        yield f"data: {json.dumps({'type': 'suggestion', 'data': suggestion})}\n\n"
-                        suggestions_sent += 1
-                        
-                        # Send progress updates every 10 suggestions
-                        if suggestions_sent % 10 == 0:
-                            yield f"data: {json.dumps({'type': 'progress', 'count': suggestions_sent})}\n\n"
+        if search.batch:
+            events = batch_items(
+                events,
+                max_size=settings.SSE_BATCH_MAX_SIZE,
+                max_delay=settings.SSE_BATCH_MAX_DELAY_MS / 1000
+            )
+            async for batch in events:
+                previous = suggestions_sent
+                suggestions_sent += len(batch)
+                yield format_sse({'type': 'suggestions', 'data': batch})
 
-        # Process any remaining content in buffer
-        if word_buffer.strip():
-            word = word_buffer.strip().lstrip('-•*').strip()
-            if word and len(word) <= 100 and word.lower() not in existing_words:
-                existing_words.add(word.lower())
-                suggestion = {
-                    "word": word,
-                    "match_type": match_type
-                }
-                yield f"data: {json.dumps({'type': 'suggestion', 'data': suggestion})}\n\n"
+                # Send progress updates every 10 suggestions
+                if suggestions_sent // 10 > previous // 10:
+                    yield format_sse({'type': 'progress', 'count': suggestions_sent})
+        else:
+            async for suggestion in events:
+                yield format_sse({'type': 'suggestion', 'data': suggestion})
                 suggestions_sent += 1
 
+                # Send progress updates every 10 suggestions
+                if suggestions_sent % 10 == 0:
+                    yield format_sse({'type': 'progress', 'count': suggestions_sent})
+
+        # Release the upstream before reporting, in case the limit stopped it early
+        await events.aclose()
+        if usage.completion_tokens:
+            generation_efficiency.record(
+                usage.completion_tokens,
+                suggestions_sent,
+                generated_lines=usage.total_generated_lines,
+                is_load_more=search.is_load_more,
+                prompt_tokens=usage.total_prompt_tokens,
+                cached_prompt_tokens=usage.total_cached_prompt_tokens
+            )
+
         # Send completion message with session info
-        yield f"data: {json.dumps({'type': 'complete', 'total': suggestions_sent, 'session_id': session_id, 'total_session_words': len(existing_words)})}\n\n"
+        yield format_sse({'type': 'complete', 'total': suggestions_sent, 'session_id': session_id, 'total_session_words': len(existing_words), 'cached': cached is not None, 'prefetched': prefetched is not None, 'fallback': fallback is not None, 'tokens_per_suggestion': tokens_per_suggestion(usage.completion_tokens, suggestions_sent), 'unique_per_line': unique_per_line(suggestions_sent, usage.total_generated_lines), 'prompt_tokens': usage.total_prompt_tokens, 'cached_prompt_tokens': usage.total_cached_prompt_tokens})
+
+        # Speculatively generate the next load-more page within the user's
+        # budget, in the lowest admission lane so it never delays a request
+        if settings.PREFETCH_ENABLED and openai_breaker.allows() and not prefetcher.has(session_id, generation_key):
+            prefetch_instructions = _load_more_instructions(existing_words)
+            # The prefetch is charged to the user's budget up front and
+            # settled with what it used once it ends, claimed or not
+            prefetch_quota = None
+            if settings.TOKEN_QUOTA_ENABLED:
+                prefetch_quota = await token_quota.reserve(user_id, _estimated_tokens(search))
+            if prefetch_quota is None or prefetch_quota.allowed:
+                scheduled = prefetcher.schedule(session_id, user_id, generation_key, lambda prefetch_usage: settle_after(
+                    admitted(
+                        PREFETCH_LANE,
+                        _admission_weight(search),
+                        lambda: make_generation(False, prefetch_usage, prefetch_instructions)
+                    ),
+                    prefetch_quota,
+                    prefetch_usage
+                ))
+                if not scheduled and prefetch_quota is not None:
+                    await token_quota.settle(prefetch_quota, 0)
         
+    except CircuitOpenError as e:
+        yield format_sse({'type': 'error', 'message': 'Search is temporarily unavailable', 'retry_after': e.retry_after_seconds()})
+    except AdmissionRejected as e:
+        yield format_sse({'type': 'error', 'message': 'Search is busy, try again shortly', 'retry_after': e.retry_after_seconds()})
+    except ClientDisconnected:
+        cancellation_stats.record_disconnect()
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server cancelled the response because the client went away
+        cancellation_stats.record_disconnect()
+        raise
     except Exception as e:
-        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        yield format_sse({'type': 'error', 'message': str(e)})
+    finally:
+        # Close the pipeline so a shared upstream without subscribers stops
+        if events is not None:
+            await events.aclose()
+
+        # Persist what was actually sent, even if the stream ended early
+        if new_words:
+            await session_store.add(session_id, new_words, dedup_mode)
+
+        if quota is not None:
+            # A prefetched page was paid for by the prefetch's own reservation
+            used = 0 if prefetched is not None else usage.total_prompt_tokens + usage.completion_tokens
+            await token_quota.settle(quota, used)
+
+def _is_fan_out(search: StreamSearchRequest, phrases: List[str]) -> bool:
+    return search.fan_out and len(phrases) > 1 and effective_search_mode(phrases, search.search_mode) == "or"
+
+def _generation_key(search: StreamSearchRequest) -> str:
+    """Identity of the generation a search runs, for coalescing and prefetch."""
+    phrases = parse_phrases(search.query)
+    return f"{'fan' if _is_fan_out(search, phrases) else 'one'}:{search.limit or 'all'}:{build_cache_key(phrases, search.search_mode)}"
+
+def _admission_weight(search: StreamSearchRequest) -> int:
+    """Generation slots a search takes: one per concurrent fan-out branch."""
+    phrases = parse_phrases(search.query)
+    if _is_fan_out(search, phrases):
+        return min(len(phrases), settings.FAN_OUT_MAX_CONCURRENCY)
+    return 1
+
+def _estimated_tokens(search: StreamSearchRequest) -> int:
+    """Tokens to reserve for a search, sized like the generation it would start."""
+    phrases = parse_phrases(search.query)
+    keyword_target = generation_target(search.limit, settings.SEARCH_OVERGENERATION_FACTOR)
+    return estimate_search_tokens(
+        phrases,
+        search.search_mode,
+        keyword_target,
+        max_tokens=max_tokens_for_target(keyword_target) if search.limit else None,
+        fan_out=_is_fan_out(search, phrases)
+    )
+
+def _starts_generation(search: StreamSearchRequest, cached: Optional[List[Dict[str, str]]]) -> bool:
+    """Whether a search is expected to call OpenAI rather than replay suggestions."""
+    if cached is not None or not openai_breaker.allows():
+        return False
+    if search.is_load_more and settings.PREFETCH_ENABLED and search.session_id:
+        return not prefetcher.has(search.session_id, _generation_key(search))
+    return True
 
 @router.post("/stream")
 async def search_keywords_stream(
     search: StreamSearchRequest,
     request: Request
 ):
-    """Stream search results in real-time as they come from OpenAI."""
+    """
+    Stream search results in real-time as they come from OpenAI.
+    
+    When the search will call OpenAI, its estimated tokens are reserved
+    from the user's token budget before streaming starts; the budget left
+    is sent in the X-Token-Budget-* headers, and 429 is returned when it is
+    used up. Cached, prefetched and fallback results are free.
+    
+    A search that starts a generation waits for a generation slot, first
+    pages ahead of load more; searches sharing that generation and replays
+    take none. If no slot frees up in time the stream ends with an error
+    event carrying `retry_after`.
+    """
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "*",
+    }
+    
+    # First pages are looked up once, here, so the cache counts one lookup
+    phrases = parse_phrases(search.query)
+    cached = None if search.is_load_more else await suggestion_cache.get(phrases, search.search_mode)
+    
+    quota = None
+    if settings.TOKEN_QUOTA_ENABLED and _starts_generation(search, cached):
+        quota = await token_quota.reserve(request.state.user_id, _estimated_tokens(search))
+        if not quota.allowed:
+            retry_after = quota.retry_after_seconds()
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Token budget exceeded", "retry_after": retry_after},
+                headers={**quota.headers(), "Retry-After": str(retry_after)}
+            )
+        headers.update(quota.headers())
+    
+    async def refund():
+        # Settling twice is a no-op, so this only refunds a reservation the
+        # stream never got to settle, e.g. when the client left before it started
+        if quota is not None:
+            await token_quota.settle(quota, 0)
+    
     return StreamingResponse(
-        stream_search_results(search, request.state.user_id),
+        stream_search_results(
+            search,
+            request.state.user_id,
+            request=request,
+            quota=quota,
+            cached=cached,
+            cache_checked=not search.is_load_more
+        ),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-        }
+        headers=headers,
+        background=BackgroundTask(refund)
     ) 
\ No newline at end of file
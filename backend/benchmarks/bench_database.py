@@ -0,0 +1,143 @@
+"""
+Compare request concurrency of blocking and async database access.
+
+Runs the project ownership query that every search makes against a local
+stand-in for the Supabase REST API with a fixed response latency:
+
+- "sync" creates a Supabase client per request and calls the blocking
+  `.execute()` inside a coroutine, the way the routes used to
+- "async" awaits the shared pooled client through the repository layer
+
+Event loop lag is how late a 10 ms timer fires while the queries run; it
+is what every other request on the worker, such as SSE streams, waits.
+
+Run from the backend directory:
+    python -m benchmarks.bench_database --latency 20 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from typing import Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from supabase import create_client
+from app.core import database, repository
+from app.core.config import get_settings
+
+# Any JWT-shaped key passes client-side validation
+FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark"
+
+def serve(latency: float, ports):
+    """Serve one project row for every request after `latency` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps([{"id": "project"}]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # The default backlog of 5 drops connections under concurrency
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+def start_server(latency: float) -> Tuple[multiprocessing.Process, int]:
+    """Run the stand-in API in its own process so it does not share our GIL."""
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(latency, ports), daemon=True)
+    process.start()
+    return process, ports.get()
+
+async def sync_query(url: str):
+    supabase = create_client(url, FAKE_KEY)
+    supabase.table("projects")\
+        .select("id")\
+        .eq("id", "project")\
+        .eq("user_id", "user")\
+        .limit(1)\
+        .execute()
+
+async def async_query(url: str):
+    await repository.get_owned_project("project", "user")
+
+async def measure_lag(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+async def bench(query, url: str, concurrency: int, requests: int) -> dict:
+    remaining = iter(range(requests))
+    latencies = []
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await query(url)
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lags = [0.0]
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    latencies.sort()
+    return {
+        "requests_per_s": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_lag_ms": max(lags) * 1000,
+    }
+
+async def run(args):
+    server, port = start_server(args.latency / 1000)
+    url = f"http://127.0.0.1:{port}"
+
+    settings = get_settings()
+    settings.SUPABASE_URL = url
+    settings.SUPABASE_KEY = FAKE_KEY
+    database.create_database()
+
+    print(f"{args.latency} ms query latency, {args.requests} requests per run")
+    print(f"{'mode':<8}{'concurrency':>12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max lag ms':>12}")
+    try:
+        for mode, query in (("sync", sync_query), ("async", async_query)):
+            for concurrency in args.concurrency:
+                result = await bench(query, url, concurrency, args.requests)
+                print(
+                    f"{mode:<8}{concurrency:>12}{result['requests_per_s']:>10.1f}{result['p50_ms']:>10.1f}"
+                    f"{result['p95_ms']:>10.1f}{result['max_lag_ms']:>12.1f}"
+                )
+    finally:
+        await database.close_database()
+        server.terminate()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=20, help="simulated query latency in ms")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Compare the latency of collection and saved-word mutations before and
+after they moved onto single-statement Postgres functions.
+
+Migrates and seeds a scratch Postgres database like explain_queries, then
+runs each endpoint's database work both ways, inside transactions that
+are rolled back:
+
+- "before" sends the statements the routes used to make through
+  PostgREST, one round trip each: ownership check, existence check,
+  write, re-select
+- "after" calls the function the route now calls through RPC
+
+Times are measured on a direct connection, so they are database time plus
+a local round trip. Through Supabase every round trip also pays the
+network hop between the API and PostgREST; --rtt adds that many
+milliseconds per round trip to a modelled column.
+
+The seed step TRUNCATEs the tables; point it at a throwaway database only.
+
+Run from the backend directory:
+    python -m benchmarks.bench_mutations --database-url postgresql://postgres@localhost/scratch --rtt 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+import asyncpg
+from app.core.migrations import migrate
+from benchmarks.explain_queries import sample_params, seed
+
+# The SQL shape of each repository call the routes made before the move
+OWNED_COLLECTION = """SELECT c.*, to_json(p) AS projects FROM collections c JOIN projects p ON p.id = c.project_id
+    WHERE c.id = $1 AND p.user_id = $2 LIMIT 1"""
+FIND_WORDS = "SELECT * FROM saved_words WHERE collection_id = $1 AND word = ANY($2)"
+INSERT_WORDS = """INSERT INTO saved_words (collection_id, word)
+    SELECT $1, unnest($2::text[]) RETURNING *"""
+COLLECTION_WITH_WORDS = """SELECT c.*, (SELECT coalesce(json_agg(s), '[]') FROM saved_words s WHERE s.collection_id = c.id) AS saved_words
+    FROM collections c WHERE c.id = $1"""
+DELETE_WORD_BY_TEXT = "DELETE FROM saved_words WHERE collection_id = $1 AND word = $2 RETURNING *"
+OWNED_WORDS = """SELECT s.* FROM saved_words s
+    JOIN collections c ON c.id = s.collection_id JOIN projects p ON p.id = c.project_id
+    WHERE s.id = ANY($1) AND p.user_id = $2"""
+MOVE_WORDS = "UPDATE saved_words SET collection_id = $2 WHERE id = ANY($1) RETURNING *"
+DELETE_WORDS = "DELETE FROM saved_words WHERE id = ANY($1) RETURNING *"
+OWNED_COLLECTION_IDS = """SELECT c.id, c.project_id FROM collections c JOIN projects p ON p.id = c.project_id
+    WHERE c.id = ANY($1) AND p.user_id = $2"""
+OWNED_PROJECT = "SELECT id FROM projects WHERE id = $1 AND user_id = $2 LIMIT 1"
+UPDATE_COLLECTIONS_NAME = "UPDATE collections SET name = $2 WHERE id = ANY($1) RETURNING *"
+UPDATE_COLLECTIONS_PROJECT = "UPDATE collections SET project_id = $2 WHERE id = ANY($1) RETURNING *"
+DELETE_COLLECTIONS = "DELETE FROM collections WHERE id = ANY($1) RETURNING *"
+
+# Words that exist only in the source collection, so moving them does not
+# conflict with the target; inserted in each run's transaction
+MOVABLE_WORDS = [f"movable word {n}" for n in range(10)]
+BULK_WORDS = [f"bulk word {n}" for n in range(20)]
+
+Step = Tuple[str, List[str]]
+
+def endpoints(params: Dict[str, Any]) -> List[Tuple[str, List[Step], Step]]:
+    """(endpoint, statements before, function call after), with parameter names."""
+    return [
+        ("add word to collection",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (FIND_WORDS, ["collection_id", "new_word_list"]),
+          (INSERT_WORDS, ["collection_id", "new_word_list"]),
+          (COLLECTION_WITH_WORDS, ["collection_id"])],
+         ("SELECT * FROM add_word_to_collection($1, $2, $3)", ["user_id", "collection_id", "new_word"])),
+        ("remove word from collection",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (DELETE_WORD_BY_TEXT, ["collection_id", "existing_word"]),
+          (COLLECTION_WITH_WORDS, ["collection_id"])],
+         ("SELECT * FROM remove_word_from_collection($1, $2, $3)", ["user_id", "collection_id", "existing_word"])),
+        ("create saved word",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (FIND_WORDS, ["collection_id", "new_word_list"]),
+          (INSERT_WORDS, ["collection_id", "new_word_list"])],
+         ("SELECT * FROM save_words($1, $2, $3)", ["user_id", "collection_id", "new_word_list"])),
+        ("bulk save 20 words",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (FIND_WORDS, ["collection_id", "bulk_words"]),
+          (INSERT_WORDS, ["collection_id", "bulk_words"])],
+         ("SELECT * FROM save_words($1, $2, $3)", ["user_id", "collection_id", "bulk_words"])),
+        ("delete saved word",
+         [(OWNED_WORDS, ["one_word_id", "user_id"]),
+          (DELETE_WORDS, ["one_word_id"])],
+         ("SELECT * FROM delete_saved_words($1, $2)", ["user_id", "one_word_id"])),
+        ("bulk move 10 words",
+         [(OWNED_WORDS, ["movable_word_ids", "user_id"]),
+          (OWNED_COLLECTION, ["other_collection_id", "user_id"]),
+          (MOVE_WORDS, ["movable_word_ids", "other_collection_id"])],
+         ("SELECT * FROM move_saved_words($1, $2, $3)", ["user_id", "movable_word_ids", "other_collection_id"])),
+        ("bulk delete 10 words",
+         [(OWNED_WORDS, ["word_ids", "user_id"]),
+          (DELETE_WORDS, ["word_ids"])],
+         ("SELECT * FROM delete_saved_words($1, $2)", ["user_id", "word_ids"])),
+        ("update collection",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (UPDATE_COLLECTIONS_NAME, ["one_collection_id", "new_name"])],
+         ("SELECT * FROM rename_collections($1, $2, $3)", ["user_id", "one_collection_id", "new_name"])),
+        ("bulk move collections",
+         [(OWNED_COLLECTION_IDS, ["collection_ids", "user_id"]),
+          (OWNED_PROJECT, ["other_project_id", "user_id"]),
+          (UPDATE_COLLECTIONS_PROJECT, ["collection_ids", "other_project_id"])],
+         ("SELECT * FROM move_collections($1, $2, $3)", ["user_id", "collection_ids", "other_project_id"])),
+        ("delete collection",
+         [(OWNED_COLLECTION, ["collection_id", "user_id"]),
+          (DELETE_COLLECTIONS, ["one_collection_id"])],
+         ("SELECT * FROM delete_collections($1, $2)", ["user_id", "one_collection_id"])),
+    ]
+
+async def benchmark_params(conn: asyncpg.Connection) -> Dict[str, Any]:
+    params = await sample_params(conn)
+    existing_word = await conn.fetchval(
+        "SELECT word FROM saved_words WHERE collection_id = $1 LIMIT 1", params["collection_id"]
+    )
+    other_project = await conn.fetchval(
+        "SELECT id FROM projects WHERE user_id = $1 AND id <> $2 LIMIT 1", params["user_id"], params["project_id"]
+    )
+    return {
+        **params,
+        "new_word": "brand new word",
+        "new_word_list": ["brand new word"],
+        "bulk_words": BULK_WORDS,
+        "existing_word": existing_word,
+        "one_word_id": params["word_ids"][:1],
+        "one_collection_id": [params["collection_id"]],
+        "new_name": "renamed collection",
+        "other_project_id": other_project,
+    }
+
+async def timed_run(conn: asyncpg.Connection, statements: List[Step], params: Dict[str, Any]) -> float:
+    """Seconds to send `statements` one after another, in a rolled-back transaction."""
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        movable = await conn.fetch(
+            "INSERT INTO saved_words (collection_id, word) SELECT $1, unnest($2::text[]) RETURNING id",
+            params["collection_id"], MOVABLE_WORDS
+        )
+        run_params = {**params, "movable_word_ids": [row["id"] for row in movable]}
+        started = time.perf_counter()
+        for sql, names in statements:
+            await conn.fetch(sql, *[run_params[name] for name in names])
+        return time.perf_counter() - started
+    finally:
+        await transaction.rollback()
+
+async def run(args):
+    await migrate(args.database_url)
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        projects = await conn.fetchval("SELECT count(*) FROM projects")
+        if args.reseed or projects != args.projects:
+            print(f"Seeding {args.projects} projects, {args.words} saved words...")
+            await seed(conn, args.projects, args.users, args.collections_per_project, args.words)
+        params = await benchmark_params(conn)
+
+        print(f"{'endpoint':<30}{'trips':>7}{'before ms':>11}{'after ms':>10}{'speedup':>9}"
+              f"{f'before @{args.rtt:g}':>13}{f'after @{args.rtt:g}':>12}")
+        for name, before, after in endpoints(params):
+            times = {"before": [], "after": []}
+            for _ in range(args.runs):
+                # Alternate so caching and vacuum state affect both alike
+                times["before"].append(await timed_run(conn, before, params))
+                times["after"].append(await timed_run(conn, [after], params))
+            before_ms = statistics.median(times["before"]) * 1000
+            after_ms = statistics.median(times["after"]) * 1000
+            print(
+                f"{name:<30}{f'{len(before)} -> 1':>7}{before_ms:>11.2f}{after_ms:>10.2f}{before_ms / after_ms:>8.1f}x"
+                f"{before_ms + len(before) * args.rtt:>13.2f}{after_ms + args.rtt:>12.2f}"
+            )
+    finally:
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="scratch database; its tables are truncated")
+    parser.add_argument("--projects", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--collections-per-project", type=int, default=5)
+    parser.add_argument("--words", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=50, help="runs per endpoint and variant; the median is reported")
+    parser.add_argument("--rtt", type=float, default=5.0, help="modelled API-to-PostgREST round trip, in ms")
+    parser.add_argument("--reseed", action="store_true", help="reseed even if the data looks seeded")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare memory use and lookup throughput of the session dedup structures.
+
+Simulates many concurrent search sessions, each holding the words already
+streamed to it, the way the session store does for load more.
+
+Run from the backend directory:
+    python -m benchmarks.bench_word_dedup --sessions 10000 --words 200
+"""
+import argparse
+import random
+import string
+import time
+import tracemalloc
+from app.core.word_dedup import WORD_SET_TYPES, create_word_set
+
+def make_words(count: int, rng: random.Random) -> list:
+    """Generate suggestion-like words and short phrases."""
+    words = []
+    for _ in range(count):
+        parts = rng.randint(1, 3)
+        words.append(" ".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+            for _ in range(parts)
+        ))
+    return words
+
+def bench_mode(mode: str, sessions: int, words_per_session: int, lookups: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    vocabulary = make_words(words_per_session * 4, rng)
+
+    session_words = [rng.sample(vocabulary, words_per_session) for _ in range(sessions)]
+
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    word_sets = []
+    for words in session_words:
+        word_set = create_word_set(mode)
+        for word in words:
+            word_set.add(word)
+        word_sets.append(word_set)
+    build_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - start_memory
+    tracemalloc.stop()
+
+    # Half of the probes are words the session has seen, half are new
+    probes = []
+    for _ in range(lookups):
+        index = rng.randrange(sessions)
+        if rng.random() < 0.5:
+            probes.append((index, rng.choice(session_words[index])))
+        else:
+            probes.append((index, rng.choice(vocabulary)))
+
+    started = time.perf_counter()
+    hits = 0
+    for index, word in probes:
+        if word in word_sets[index]:
+            hits += 1
+    lookup_seconds = time.perf_counter() - started
+
+    total_words = sessions * words_per_session
+    return {
+        "mode": mode,
+        "memory_mb": memory / (1024 * 1024),
+        "bytes_per_word": memory / total_words,
+        "build_words_per_s": total_words / build_seconds,
+        "lookups_per_s": lookups / lookup_seconds,
+        "hit_ratio": hits / lookups,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--words", type=int, default=200, help="words per session")
+    parser.add_argument("--lookups", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--modes", nargs="+", default=list(WORD_SET_TYPES))
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions x {args.words} words, {args.lookups} lookups")
+    print(f"{'mode':<20}{'memory MB':>12}{'B/word':>10}{'build w/s':>14}{'lookup/s':>14}{'hits':>8}")
+    for mode in args.modes:
+        result = bench_mode(mode, args.sessions, args.words, args.lookups, args.seed)
+        print(
+            f"{result['mode']:<20}{result['memory_mb']:>12.1f}{result['bytes_per_word']:>10.1f}"
+            f"{result['build_words_per_s']:>14,.0f}{result['lookups_per_s']:>14,.0f}{result['hit_ratio']:>8.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Check that the API's queries use indexes at production-like data sizes.
+
+Migrates a scratch Postgres database, seeds it (10k projects and 1M saved
+words by default) and runs EXPLAIN ANALYZE on the SQL shape of each
+repository query, inside transactions that are rolled back. Reports the
+median execution time and the scans each plan uses, and exits non-zero if
+any query sequentially scans projects, collections or saved_words.
+
+With --compare, each query also runs with the migrations' secondary
+indexes dropped (in the same rolled-back transaction) to show their effect.
+
+The seed step TRUNCATEs the tables; point it at a throwaway database only.
+
+Run from the backend directory:
+    python -m benchmarks.explain_queries --database-url postgresql://postgres@localhost/scratch --compare
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import sys
+from typing import Any, Dict, List, Tuple
+import asyncpg
+from app.core.migrations import load_migrations, migrate
+
+LARGE_TABLES = {"projects", "collections", "saved_words"}
+
+# (name, SQL, parameter names) for the queries the repository sends, as
+# PostgREST runs them: filters, ordering and embedded saved_words
+QUERIES = [
+    ("get_owned_project",
+     "SELECT id FROM projects WHERE id = $1 AND user_id = $2 LIMIT 1",
+     ["project_id", "user_id"]),
+    ("list_projects",
+     "SELECT * FROM projects WHERE user_id = $1 ORDER BY updated_at DESC, id DESC",
+     ["user_id"]),
+    ("list_projects (page 2)",
+     """SELECT * FROM projects WHERE user_id = $1
+        AND updated_at <= $2 AND (updated_at < $2 OR (updated_at = $2 AND id < $3))
+        ORDER BY updated_at DESC, id DESC LIMIT 3""",
+     ["user_id", "project_updated_at", "project_id"]),
+    ("list_collections",
+     """SELECT c.*, (SELECT coalesce(json_agg(s), '[]') FROM saved_words s WHERE s.collection_id = c.id) AS saved_words
+        FROM collections c WHERE c.project_id = $1 ORDER BY c.updated_at DESC, c.id DESC""",
+     ["project_id"]),
+    ("list_collections (page 2)",
+     """SELECT * FROM collections WHERE project_id = $1
+        AND updated_at <= $2 AND (updated_at < $2 OR (updated_at = $2 AND id < $3))
+        ORDER BY updated_at DESC, id DESC LIMIT 3""",
+     ["project_id", "collection_updated_at", "collection_id"]),
+    ("find_collection_by_name",
+     "SELECT * FROM collections WHERE project_id = $1 AND name = $2 LIMIT 1",
+     ["project_id", "collection_name"]),
+    ("owned_collection_ids",
+     """SELECT c.id, c.project_id FROM collections c JOIN projects p ON p.id = c.project_id
+        WHERE c.id = ANY($1) AND p.user_id = $2""",
+     ["collection_ids", "user_id"]),
+    ("get_owned_collection",
+     """SELECT c.*, to_json(p) AS projects FROM collections c JOIN projects p ON p.id = c.project_id
+        WHERE c.id = $1 AND p.user_id = $2 LIMIT 1""",
+     ["collection_id", "user_id"]),
+    ("list_saved_words",
+     "SELECT * FROM saved_words WHERE collection_id = $1 ORDER BY created_at DESC, id DESC",
+     ["collection_id"]),
+    ("list_saved_words (page 2)",
+     """SELECT * FROM saved_words WHERE collection_id = $1
+        AND created_at <= $2 AND (created_at < $2 OR (created_at = $2 AND id < $3))
+        ORDER BY created_at DESC, id DESC LIMIT 10""",
+     ["collection_id", "word_created_at", "word_id"]),
+    ("save_words (rpc)",
+     "SELECT * FROM save_words($1, $2, $3)",
+     ["user_id", "collection_id", "words"]),
+    ("move_saved_words (rpc)",
+     "SELECT * FROM move_saved_words($1, $2, $3)",
+     ["user_id", "word_ids", "other_collection_id"]),
+    ("delete_saved_words (rpc)",
+     "SELECT * FROM delete_saved_words($1, $2)",
+     ["user_id", "word_ids"]),
+    ("delete_project (cascade)",
+     "DELETE FROM projects WHERE id = $1 AND user_id = $2",
+     ["project_id", "user_id"]),
+]
+
+async def seed(conn: asyncpg.Connection, projects: int, users: int, collections_per_project: int, words: int):
+    words_per_collection = max(1, words // (projects * collections_per_project))
+    await conn.execute("TRUNCATE projects, collections, saved_words, search_sessions")
+    await conn.execute("""
+        INSERT INTO projects (user_id, name, updated_at)
+        SELECT
+            ('00000000-0000-0000-0000-' || lpad(to_hex(i % $2), 12, '0'))::uuid,
+            'project ' || i,
+            now() - i * interval '1 minute'
+        FROM generate_series(1, $1) i
+    """, projects, users)
+    await conn.execute("""
+        INSERT INTO collections (project_id, name, updated_at)
+        SELECT p.id, 'collection ' || n, now() - random() * interval '30 days'
+        FROM projects p, generate_series(1, $1) n
+    """, collections_per_project)
+    await conn.execute("""
+        INSERT INTO saved_words (collection_id, word, created_at)
+        SELECT c.id, 'word ' || n, now() - random() * interval '30 days'
+        FROM collections c, generate_series(1, $1) n
+    """, words_per_collection)
+    await conn.execute("ANALYZE projects, collections, saved_words, search_sessions")
+
+async def sample_params(conn: asyncpg.Connection) -> Dict[str, Any]:
+    collection = await conn.fetchrow("""
+        SELECT c.id, c.name, c.updated_at, c.project_id, p.updated_at AS project_updated_at, p.user_id
+        FROM collections c JOIN projects p ON p.id = c.project_id
+        ORDER BY c.id LIMIT 1
+    """)
+    other = await conn.fetchval(
+        "SELECT id FROM collections WHERE project_id = $1 AND id <> $2 LIMIT 1",
+        collection["project_id"], collection["id"]
+    )
+    words = await conn.fetch(
+        "SELECT id, created_at FROM saved_words WHERE collection_id = $1 LIMIT 10", collection["id"]
+    )
+    word_ids = [row["id"] for row in words]
+    return {
+        "user_id": collection["user_id"],
+        "project_id": collection["project_id"],
+        "project_updated_at": collection["project_updated_at"],
+        "collection_id": collection["id"],
+        "collection_updated_at": collection["updated_at"],
+        "collection_name": collection["name"],
+        "collection_ids": [collection["id"], other],
+        "other_collection_id": other,
+        "word_id": words[0]["id"],
+        "word_created_at": words[0]["created_at"],
+        "word_ids": word_ids,
+        "words": ["word 1", "new word a", "new word b"],
+    }
+
+def secondary_indexes() -> List[str]:
+    """Names of the indexes the migrations create explicitly."""
+    names = []
+    for migration in load_migrations():
+        names.extend(re.findall(r"CREATE INDEX (?:CONCURRENTLY )?(?:IF NOT EXISTS )?(\w+)", migration.sql))
+    return names
+
+def plan_scans(plan: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(node type, relation or index) for every scan node in a plan."""
+    scans = []
+    if "Scan" in plan["Node Type"] and ("Relation Name" in plan or "Index Name" in plan):
+        scans.append((plan["Node Type"], plan.get("Index Name") or plan["Relation Name"]))
+    for child in plan.get("Plans", []):
+        scans.extend(plan_scans(child))
+    return scans
+
+async def explain(conn: asyncpg.Connection, sql: str, args: list, runs: int, drop_indexes: List[str]) -> dict:
+    times = []
+    scans = []
+    for _ in range(runs):
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            for index in drop_indexes:
+                await conn.execute(f"DROP INDEX IF EXISTS {index}")
+            result = await conn.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *args)
+        finally:
+            await transaction.rollback()
+        explained = json.loads(result)[0]
+        times.append(explained["Execution Time"])
+        scans = plan_scans(explained["Plan"])
+    return {"ms": statistics.median(times), "scans": scans}
+
+def seq_scans(scans: List[Tuple[str, str]]) -> List[str]:
+    return [relation for node, relation in scans if node == "Seq Scan" and relation in LARGE_TABLES]
+
+async def run(args) -> int:
+    await migrate(args.database_url)
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        projects = await conn.fetchval("SELECT count(*) FROM projects")
+        if args.reseed or projects != args.projects:
+            print(f"Seeding {args.projects} projects, {args.words} saved words...")
+            await seed(conn, args.projects, args.users, args.collections_per_project, args.words)
+        counts = await conn.fetchrow("""
+            SELECT (SELECT count(*) FROM projects) AS projects,
+                   (SELECT count(*) FROM collections) AS collections,
+                   (SELECT count(*) FROM saved_words) AS saved_words
+        """)
+        print(f"{counts['projects']} projects, {counts['collections']} collections, {counts['saved_words']} saved words")
+
+        params = await sample_params(conn)
+        indexes = secondary_indexes()
+        modes = [("indexed", [])]
+        if args.compare:
+            modes.insert(0, ("no index", indexes))
+
+        failures = []
+        print(f"{'query':<28}{'mode':<10}{'median ms':>10}  scans")
+        for name, sql, param_names in QUERIES:
+            query_args = [params[param] for param in param_names]
+            for mode, drop_indexes in modes:
+                result = await explain(conn, sql, query_args, args.runs, drop_indexes)
+                scans = ", ".join(f"{node} {relation}" for node, relation in result["scans"]) or "-"
+                print(f"{name:<28}{mode:<10}{result['ms']:>10.2f}  {scans}")
+                if not drop_indexes and seq_scans(result["scans"]):
+                    failures.append(name)
+    finally:
+        await conn.close()
+
+    if failures:
+        print(f"Sequential scans on large tables in: {', '.join(failures)}")
+        return 1
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="scratch database; its tables are truncated")
+    parser.add_argument("--projects", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--collections-per-project", type=int, default=5)
+    parser.add_argument("--words", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=5, help="EXPLAIN ANALYZE runs per query; the median is reported")
+    parser.add_argument("--reseed", action="store_true", help="reseed even if the data looks seeded")
+    parser.add_argument("--compare", action="store_true", help="also run each query without the secondary indexes")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
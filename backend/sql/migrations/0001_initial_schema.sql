@@ -23,7 +23,8 @@ CREATE TABLE IF NOT EXISTS saved_words (
     id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
     collection_id uuid NOT NULL REFERENCES collections(id) ON DELETE CASCADE,
     word text NOT NULL,
-    created_at timestamp with time zone DEFAULT now()
+    created_at timestamp with time zone DEFAULT now(),
+    CONSTRAINT saved_words_collection_word_key UNIQUE (collection_id, word)
 );
 
 -- Search Sessions Table
@@ -35,13 +36,31 @@ CREATE TABLE IF NOT EXISTS search_sessions (
     created_at timestamp with time zone DEFAULT now()
 );
 
--- Add RLS policies for search_sessions
+-- Add RLS policies for search_sessions. auth.uid() only exists on
+-- Supabase, so plain Postgres (local checks) gets the tables without them.
 ALTER TABLE search_sessions ENABLE ROW LEVEL SECURITY;
 
-CREATE POLICY "Users can read their own search sessions"
-    ON search_sessions FOR SELECT
-    USING (user_id = auth.uid());
+DO $$
+BEGIN
+    IF to_regprocedure('auth.uid()') IS NOT NULL THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_policies
+            WHERE tablename = 'search_sessions'
+              AND policyname = 'Users can read their own search sessions'
+        ) THEN
+            CREATE POLICY "Users can read their own search sessions"
+                ON search_sessions FOR SELECT
+                USING (user_id = auth.uid());
+        END IF;
 
-CREATE POLICY "Users can create their own search sessions"
-    ON search_sessions FOR INSERT
-    WITH CHECK (user_id = auth.uid()); 
\ No newline at end of file
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_policies
+            WHERE tablename = 'search_sessions'
+              AND policyname = 'Users can create their own search sessions'
+        ) THEN
+            CREATE POLICY "Users can create their own search sessions"
+                ON search_sessions FOR INSERT
+                WITH CHECK (user_id = auth.uid());
+        END IF;
+    END IF;
+END $$;
@@ -0,0 +1,232 @@
+-- Brainstormer Database Functions
+--
+-- Multi-step mutations run as one ownership-filtered statement each, called
+-- through PostgREST RPC. Every function takes the caller's user id and only
+-- touches rows in that user's projects.
+
+-- Saved words are unique per collection. Existing databases may hold
+-- duplicates from before the constraint; keep the oldest copy of each.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'saved_words_collection_word_key'
+    ) THEN
+        DELETE FROM saved_words
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (PARTITION BY collection_id, word ORDER BY created_at, id) AS copy
+                FROM saved_words
+            ) ranked
+            WHERE copy > 1
+        );
+
+        ALTER TABLE saved_words
+            ADD CONSTRAINT saved_words_collection_word_key UNIQUE (collection_id, word);
+    END IF;
+END $$;
+
+-- Collections the user owns, as a reusable filter
+CREATE OR REPLACE FUNCTION owned_collection(p_user_id uuid, p_collection_id uuid)
+RETURNS SETOF collections
+LANGUAGE sql STABLE AS $$
+    SELECT c.*
+    FROM collections c
+    JOIN projects p ON p.id = c.project_id
+    WHERE c.id = p_collection_id
+      AND p.user_id = p_user_id;
+$$;
+
+-- Save words to an owned collection, skipping ones already saved there.
+-- Returns a row per requested word with `inserted` telling new rows from
+-- existing ones; no rows means the collection was not found.
+CREATE OR REPLACE FUNCTION save_words(p_user_id uuid, p_collection_id uuid, p_words text[])
+RETURNS TABLE (id uuid, collection_id uuid, word text, created_at timestamp with time zone, inserted boolean)
+LANGUAGE sql AS $$
+    WITH owned AS (
+        SELECT * FROM owned_collection(p_user_id, p_collection_id)
+    ),
+    new_words AS (
+        INSERT INTO saved_words (collection_id, word)
+        SELECT owned.id, requested.word
+        FROM owned
+        CROSS JOIN (SELECT DISTINCT unnest(p_words) AS word) requested
+        ON CONFLICT (collection_id, word) DO NOTHING
+        RETURNING saved_words.id, saved_words.collection_id, saved_words.word, saved_words.created_at
+    )
+    SELECT new_words.*, true FROM new_words
+    UNION ALL
+    SELECT s.id, s.collection_id, s.word, s.created_at, false
+    FROM saved_words s
+    JOIN owned ON owned.id = s.collection_id
+    WHERE s.word = ANY(p_words);
+$$;
+
+-- Add one word to an owned collection and return the collection with all
+-- its words. No rows means the collection was not found.
+CREATE OR REPLACE FUNCTION add_word_to_collection(p_user_id uuid, p_collection_id uuid, p_word text)
+RETURNS TABLE (collection jsonb)
+LANGUAGE sql AS $$
+    WITH owned AS (
+        SELECT * FROM owned_collection(p_user_id, p_collection_id)
+    ),
+    new_word AS (
+        INSERT INTO saved_words (collection_id, word)
+        SELECT owned.id, p_word FROM owned
+        ON CONFLICT (collection_id, word) DO NOTHING
+        RETURNING saved_words.*
+    )
+    SELECT to_jsonb(owned) || jsonb_build_object(
+        'saved_words',
+        COALESCE((
+            SELECT jsonb_agg(to_jsonb(words))
+            FROM (
+                SELECT s.* FROM saved_words s WHERE s.collection_id = owned.id
+                UNION ALL
+                SELECT * FROM new_word
+            ) words
+        ), '[]'::jsonb)
+    )
+    FROM owned;
+$$;
+
+-- Remove one word from an owned collection and return the collection with
+-- its remaining words, and whether the word was there.
+CREATE OR REPLACE FUNCTION remove_word_from_collection(p_user_id uuid, p_collection_id uuid, p_word text)
+RETURNS TABLE (collection jsonb, removed boolean)
+LANGUAGE sql AS $$
+    WITH owned AS (
+        SELECT * FROM owned_collection(p_user_id, p_collection_id)
+    ),
+    removed_word AS (
+        DELETE FROM saved_words s
+        USING owned
+        WHERE s.collection_id = owned.id
+          AND s.word = p_word
+        RETURNING s.id
+    )
+    SELECT
+        to_jsonb(owned) || jsonb_build_object(
+            'saved_words',
+            COALESCE((
+                SELECT jsonb_agg(to_jsonb(s))
+                FROM saved_words s
+                WHERE s.collection_id = owned.id
+                  AND s.id NOT IN (SELECT removed_word.id FROM removed_word)
+            ), '[]'::jsonb)
+        ),
+        EXISTS (SELECT 1 FROM removed_word)
+    FROM owned;
+$$;
+
+-- Move owned words into an owned collection. A word the target already
+-- holds, or that is moved more than once, is merged into a single row.
+-- Returns the target's rows for the requested words.
+CREATE OR REPLACE FUNCTION move_saved_words(p_user_id uuid, p_word_ids uuid[], p_target_collection_id uuid)
+RETURNS SETOF saved_words
+LANGUAGE sql AS $$
+    WITH target AS (
+        SELECT * FROM owned_collection(p_user_id, p_target_collection_id)
+    ),
+    candidates AS (
+        SELECT
+            s.id,
+            s.word,
+            row_number() OVER (PARTITION BY s.word ORDER BY s.created_at, s.id) AS copy,
+            EXISTS (
+                SELECT 1 FROM saved_words t
+                WHERE t.collection_id = p_target_collection_id
+                  AND t.word = s.word
+            ) AS in_target
+        FROM saved_words s
+        JOIN collections c ON c.id = s.collection_id
+        JOIN projects p ON p.id = c.project_id
+        WHERE s.id = ANY(p_word_ids)
+          AND p.user_id = p_user_id
+          AND s.collection_id <> p_target_collection_id
+          AND EXISTS (SELECT 1 FROM target)
+    ),
+    merged AS (
+        DELETE FROM saved_words s
+        USING candidates m
+        WHERE s.id = m.id
+          AND (m.in_target OR m.copy > 1)
+        RETURNING s.id
+    ),
+    moved AS (
+        UPDATE saved_words s
+        SET collection_id = p_target_collection_id
+        FROM candidates m
+        WHERE s.id = m.id
+          AND NOT m.in_target
+          AND m.copy = 1
+        RETURNING s.*
+    )
+    SELECT * FROM moved
+    UNION ALL
+    SELECT t.*
+    FROM saved_words t
+    WHERE t.collection_id = p_target_collection_id
+      AND EXISTS (SELECT 1 FROM target)
+      AND (
+          t.id = ANY(p_word_ids)
+          OR t.word IN (SELECT m.word FROM candidates m WHERE m.in_target)
+      );
+$$;
+
+-- Delete owned words and return the deleted rows
+CREATE OR REPLACE FUNCTION delete_saved_words(p_user_id uuid, p_word_ids uuid[])
+RETURNS SETOF saved_words
+LANGUAGE sql AS $$
+    DELETE FROM saved_words s
+    USING collections c, projects p
+    WHERE s.id = ANY(p_word_ids)
+      AND c.id = s.collection_id
+      AND p.id = c.project_id
+      AND p.user_id = p_user_id
+    RETURNING s.*;
+$$;
+
+-- Rename owned collections and return the updated rows
+CREATE OR REPLACE FUNCTION rename_collections(p_user_id uuid, p_collection_ids uuid[], p_name text)
+RETURNS SETOF collections
+LANGUAGE sql AS $$
+    UPDATE collections c
+    SET name = p_name
+    FROM projects p
+    WHERE c.id = ANY(p_collection_ids)
+      AND p.id = c.project_id
+      AND p.user_id = p_user_id
+    RETURNING c.*;
+$$;
+
+-- Move owned collections into an owned project and return the moved rows
+CREATE OR REPLACE FUNCTION move_collections(p_user_id uuid, p_collection_ids uuid[], p_target_project_id uuid)
+RETURNS SETOF collections
+LANGUAGE sql AS $$
+    UPDATE collections c
+    SET project_id = p_target_project_id
+    FROM projects p
+    WHERE c.id = ANY(p_collection_ids)
+      AND p.id = c.project_id
+      AND p.user_id = p_user_id
+      AND EXISTS (
+          SELECT 1 FROM projects target
+          WHERE target.id = p_target_project_id
+            AND target.user_id = p_user_id
+      )
+    RETURNING c.*;
+$$;
+
+-- Delete owned collections and return the deleted rows
+CREATE OR REPLACE FUNCTION delete_collections(p_user_id uuid, p_collection_ids uuid[])
+RETURNS SETOF collections
+LANGUAGE sql AS $$
+    DELETE FROM collections c
+    USING projects p
+    WHERE c.id = ANY(p_collection_ids)
+      AND p.id = c.project_id
+      AND p.user_id = p_user_id
+    RETURNING c.*;
+$$;
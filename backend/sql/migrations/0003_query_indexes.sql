@@ -0,0 +1,27 @@
+-- migrate:no-transaction
+--
+-- Indexes for the filters and orderings the API queries use. Built
+-- concurrently so existing tables stay writable; each statement runs on
+-- its own, outside a transaction.
+
+-- list_projects: user_id = ? ORDER BY updated_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS projects_user_id_updated_at_idx
+    ON projects (user_id, updated_at DESC);
+
+-- list_collections: project_id = ? ORDER BY updated_at DESC. Also serves
+-- the project -> collections cascade and ownership joins.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS collections_project_id_updated_at_idx
+    ON collections (project_id, updated_at DESC);
+
+-- find_collection_by_name: project_id = ? AND name = ?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS collections_project_id_name_idx
+    ON collections (project_id, name);
+
+-- list_saved_words: collection_id = ? ORDER BY created_at DESC. Lookups by
+-- (collection_id, word) use the unique constraint from 0002.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS saved_words_collection_id_created_at_idx
+    ON saved_words (collection_id, created_at DESC);
+
+-- Deleting a project cascades to its search sessions
+CREATE INDEX CONCURRENTLY IF NOT EXISTS search_sessions_project_id_idx
+    ON search_sessions (project_id);
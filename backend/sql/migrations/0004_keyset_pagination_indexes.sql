@@ -0,0 +1,20 @@
+-- migrate:no-transaction
+--
+-- Listings page through rows on (sort column, id) in descending order.
+-- Add id to the listing indexes so each page is a single index range scan,
+-- then drop the indexes they replace.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS projects_user_id_updated_at_id_idx
+    ON projects (user_id, updated_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS collections_project_id_updated_at_id_idx
+    ON collections (project_id, updated_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS saved_words_collection_id_created_at_id_idx
+    ON saved_words (collection_id, created_at DESC, id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS projects_user_id_updated_at_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS collections_project_id_updated_at_idx;
+
+DROP INDEX CONCURRENTLY IF EXISTS saved_words_collection_id_created_at_idx;
@@ -0,0 +1,105 @@
+-- Per-project version stamp for conditional GETs (ETags). Any change to a
+-- project, its collections or their saved words bumps the project's
+-- version. Triggers are per statement, so a bulk save of many words bumps
+-- each affected project once.
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 0;
+
+-- Direct edits to a project, such as a rename. Bumps coming from the child
+-- tables below already change the version and are left alone.
+CREATE OR REPLACE FUNCTION bump_project_version()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.version = OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS projects_bump_version ON projects;
+CREATE TRIGGER projects_bump_version
+    BEFORE UPDATE ON projects
+    FOR EACH ROW EXECUTE FUNCTION bump_project_version();
+
+-- Collections: bump the projects they were added to, moved between or
+-- removed from
+CREATE OR REPLACE FUNCTION bump_versions_from_collections()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE projects SET version = version + 1
+        WHERE id IN (SELECT project_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE projects SET version = version + 1
+        WHERE id IN (SELECT project_id FROM new_rows UNION SELECT project_id FROM old_rows);
+    ELSE
+        UPDATE projects SET version = version + 1
+        WHERE id IN (SELECT project_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS collections_insert_bump_version ON collections;
+CREATE TRIGGER collections_insert_bump_version
+    AFTER INSERT ON collections
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_collections();
+
+DROP TRIGGER IF EXISTS collections_update_bump_version ON collections;
+CREATE TRIGGER collections_update_bump_version
+    AFTER UPDATE ON collections
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_collections();
+
+DROP TRIGGER IF EXISTS collections_delete_bump_version ON collections;
+CREATE TRIGGER collections_delete_bump_version
+    AFTER DELETE ON collections
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_collections();
+
+-- Saved words: bump the projects of the collections they changed in
+CREATE OR REPLACE FUNCTION bump_versions_from_saved_words()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE projects SET version = version + 1
+        WHERE id IN (
+            SELECT c.project_id FROM collections c
+            WHERE c.id IN (SELECT collection_id FROM new_rows)
+        );
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE projects SET version = version + 1
+        WHERE id IN (
+            SELECT c.project_id FROM collections c
+            WHERE c.id IN (SELECT collection_id FROM new_rows UNION SELECT collection_id FROM old_rows)
+        );
+    ELSE
+        UPDATE projects SET version = version + 1
+        WHERE id IN (
+            SELECT c.project_id FROM collections c
+            WHERE c.id IN (SELECT collection_id FROM old_rows)
+        );
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS saved_words_insert_bump_version ON saved_words;
+CREATE TRIGGER saved_words_insert_bump_version
+    AFTER INSERT ON saved_words
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_saved_words();
+
+DROP TRIGGER IF EXISTS saved_words_update_bump_version ON saved_words;
+CREATE TRIGGER saved_words_update_bump_version
+    AFTER UPDATE ON saved_words
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_saved_words();
+
+DROP TRIGGER IF EXISTS saved_words_delete_bump_version ON saved_words;
+CREATE TRIGGER saved_words_delete_bump_version
+    AFTER DELETE ON saved_words
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_versions_from_saved_words();
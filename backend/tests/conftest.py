@@ -0,0 +1,35 @@
+import os
+import pytest
+
+# Settings are read at import time; keep tests off Redis and real services
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["REDIS_ENABLED"] = "false"
+
+class Clock:
+    """Stands in for the time module, so tests move time by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> Clock:
+    """A clock for a module's `time`; test modules patch it in where they need it."""
+    return Clock()
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis, with Lua scripting, for the Redis-backed tiers."""
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from app.core.admission import (
+    FIRST_PAGE_LANE,
+    HEDGE_LANE,
+    LOAD_MORE_LANE,
+    PREFETCH_LANE,
+    AdmissionController,
+    AdmissionRejected,
+)
+
+async def queued(controller: AdmissionController, lane: str, order: list):
+    """Acquire a slot in `lane`, noting the lane once admitted."""
+    slot = await controller.acquire(lane)
+    order.append(lane)
+    return slot
+
+async def settle():
+    """Let queued tasks run up to their next wait."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def test_freed_slots_go_to_the_highest_priority_lane():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+    holder = await controller.acquire(FIRST_PAGE_LANE)
+    order = []
+    tasks = [
+        asyncio.ensure_future(queued(controller, lane, order))
+        for lane in (PREFETCH_LANE, LOAD_MORE_LANE, FIRST_PAGE_LANE)
+    ]
+    await settle()
+    assert order == []
+
+    prefetch, load_more, first_page = tasks
+    holder.release()
+    await settle()
+    assert order == [FIRST_PAGE_LANE]
+    first_page.result().release()
+    await settle()
+    assert order == [FIRST_PAGE_LANE, LOAD_MORE_LANE]
+    load_more.result().release()
+    await settle()
+    assert order == [FIRST_PAGE_LANE, LOAD_MORE_LANE, PREFETCH_LANE]
+    prefetch.result().release()
+    assert controller.in_flight == 0
+
+async def test_waiting_past_max_wait_is_rejected():
+    controller = AdmissionController(max_concurrent=1, max_wait=0.05)
+    holder = await controller.acquire(FIRST_PAGE_LANE)
+
+    with pytest.raises(AdmissionRejected) as raised:
+        await controller.acquire(LOAD_MORE_LANE)
+    assert raised.value.lane == LOAD_MORE_LANE
+    assert raised.value.retry_after_seconds() >= 1
+
+    holder.release()
+    assert controller.in_flight == 0
+    stats = controller.stats()["lanes"][LOAD_MORE_LANE]
+    assert stats["depth"] == 0 and stats["rejected"] == 1
+
+async def test_full_queue_is_rejected_without_waiting():
+    controller = AdmissionController(max_concurrent=1, max_wait=5, max_queue=1)
+    holder = await controller.acquire(FIRST_PAGE_LANE)
+    waiting = asyncio.ensure_future(controller.acquire(FIRST_PAGE_LANE))
+    await settle()
+
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(PREFETCH_LANE)
+
+    holder.release()
+    (await waiting).release()
+    assert controller.in_flight == 0
+
+async def test_cancelled_waiter_leaves_the_queue():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+    holder = await controller.acquire(FIRST_PAGE_LANE)
+    cancelled = asyncio.ensure_future(controller.acquire(FIRST_PAGE_LANE))
+    behind = asyncio.ensure_future(controller.acquire(LOAD_MORE_LANE))
+    await settle()
+
+    cancelled.cancel()
+    await settle()
+    assert cancelled.cancelled()
+    assert controller.stats()["lanes"][FIRST_PAGE_LANE]["depth"] == 0
+
+    # The freed slot skips the cancelled waiter
+    holder.release()
+    slot = await asyncio.wait_for(behind, 1)
+    slot.release()
+    assert controller.in_flight == 0
+
+async def test_waiter_cancelled_after_its_grant_hands_the_slot_back():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+    holder = await controller.acquire(FIRST_PAGE_LANE)
+    cancelled = asyncio.ensure_future(controller.acquire(FIRST_PAGE_LANE))
+    behind = asyncio.ensure_future(controller.acquire(LOAD_MORE_LANE))
+    await settle()
+
+    # Granted to the first waiter, which is cancelled before it resumes.
+    # Before Python 3.12 wait_for may return the slot despite the
+    # cancellation; either way the slot is not lost.
+    holder.release()
+    cancelled.cancel()
+    await settle()
+    if not cancelled.cancelled():
+        cancelled.result().release()
+
+    slot = await asyncio.wait_for(behind, 1)
+    assert controller.in_flight == 1
+    slot.release()
+    assert controller.in_flight == 0
+
+async def test_hedges_only_take_free_slots():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+    hedge = controller.try_acquire(HEDGE_LANE)
+    assert hedge is not None
+    assert controller.try_acquire(HEDGE_LANE) is None
+
+    hedge.release()
+    hedge.release()
+    assert controller.in_flight == 0
@@ -0,0 +1,108 @@
+import pytest
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(window_seconds=30, min_calls=4, error_rate=0.5, slow_seconds=10, open_seconds=30, probes=2)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.acquire().failure()
+    assert breaker.current_state() == OPEN
+
+def test_failures_open_the_circuit(clock):
+    breaker = make_breaker()
+    breaker.acquire().success()
+    breaker.acquire().success()
+    breaker.acquire().failure()
+    assert breaker.current_state() == CLOSED
+
+    breaker.acquire().failure()
+    assert breaker.current_state() == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.acquire()
+    assert raised.value.retry_after_seconds() == 30
+    assert breaker.rejected == 1
+
+def test_slow_calls_open_the_circuit(clock):
+    breaker = make_breaker(slow_rate=0.5)
+    permits = [breaker.acquire() for _ in range(4)]
+    clock.now += 11
+    for permit in permits:
+        permit.success()
+    assert breaker.current_state() == OPEN
+
+def test_healthy_probes_close_the_circuit(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.current_state() == HALF_OPEN
+
+    probes = [breaker.acquire(), breaker.acquire()]
+    assert all(permit.probe for permit in probes)
+    # Every probe slot is taken
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    probes[0].success()
+    assert breaker.current_state() == HALF_OPEN
+    probes[1].success()
+    assert breaker.current_state() == CLOSED
+    assert breaker.transitions == {"closed_to_open": 1, "open_to_half_open": 1, "half_open_to_closed": 1}
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    breaker.acquire().failure()
+    assert breaker.current_state() == OPEN
+    assert breaker.transitions["half_open_to_open"] == 1
+
+def test_abandon_counts_only_calls_that_responded_or_were_slow(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+
+    # Not yet responded: the probe slot is given back without an outcome
+    breaker.acquire().abandon()
+    assert breaker.current_state() == HALF_OPEN
+    assert breaker._probes_in_flight == 0
+
+    # Already responded: counts as a healthy probe
+    permit = breaker.acquire()
+    permit.mark_response()
+    permit.abandon()
+    assert breaker._probe_successes == 1
+
+    # Already slower than slow_seconds: counts as a slow probe
+    permit = breaker.acquire()
+    clock.now += 10
+    permit.abandon()
+    assert breaker.current_state() == OPEN
+
+def test_probes_from_an_earlier_half_open_period_are_ignored(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    stale = breaker.acquire()
+    breaker.acquire().failure()
+    clock.now += 30
+    assert breaker.current_state() == HALF_OPEN
+
+    current = [breaker.acquire(), breaker.acquire()]
+    stale.release()
+    # The stale permit did not free a slot for a third concurrent probe
+    assert not breaker.allows()
+    stale.success()
+    assert breaker._probe_successes == 0
+
+    for permit in current:
+        permit.success()
+    assert breaker.current_state() == CLOSED
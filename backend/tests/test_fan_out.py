@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from app.core.fan_out import interleave
+
+class Branch:
+    """Async iterator yielding `count` items, `delay` seconds apart, that records closing."""
+
+    def __init__(self, name: str, count: int, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.count = count
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    async def items(self):
+        try:
+            for index in range(self.count):
+                await asyncio.sleep(self.delay)
+                yield f"{self.name}{index}"
+            if self.fail:
+                raise RuntimeError(f"{self.name} failed")
+        finally:
+            self.closed = True
+
+async def test_interleave_merges_round_robin():
+    a, b = Branch("a", 3), Branch("b", 3)
+    merged = [item async for item in interleave([a.items, b.items])]
+    assert sorted(merged) == ["a0", "a1", "a2", "b0", "b1", "b2"]
+    # Neither branch gets two items ahead of the other
+    assert merged.index("a2") > merged.index("b0")
+    assert merged.index("b2") > merged.index("a0")
+
+async def test_interleave_drops_failed_branch():
+    good, bad = Branch("good", 2), Branch("bad", 1, fail=True)
+    merged = [item async for item in interleave([good.items, bad.items])]
+    assert "good0" in merged and "good1" in merged
+
+async def test_interleave_raises_when_every_branch_fails():
+    with pytest.raises(RuntimeError):
+        async for _ in interleave([Branch("a", 0, fail=True).items, Branch("b", 0, fail=True).items]):
+            pass
+
+async def test_stopping_early_releases_every_branch():
+    # The fast branch fills its buffer while the consumer stops
+    fast, slow = Branch("fast", 100), Branch("slow", 100, delay=10)
+    merged = interleave([fast.items, slow.items], buffer_size=4)
+    taken = []
+    async for item in merged:
+        taken.append(item)
+        if len(taken) == 3:
+            break
+    # Let the fast branch block on its full buffer
+    await asyncio.sleep(0.05)
+    await asyncio.wait_for(merged.aclose(), timeout=2)
+    assert fast.closed and slow.closed
+
+async def test_stopping_early_releases_queued_branches():
+    branches = [Branch(str(index), 50) for index in range(4)]
+    merged = interleave([branch.items for branch in branches], max_concurrency=2, buffer_size=2)
+    assert await merged.__anext__() is not None
+    await asyncio.wait_for(merged.aclose(), timeout=2)
+    running = asyncio.all_tasks() - {asyncio.current_task()}
+    assert not running
@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import pytest
+from app.core.admission import admission_controller
+from app.core.hedging import Hedger
+from app.core.token_usage import TokenUsage
+
+def chunk(text: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+class FakeStream:
+    """A streamed completion whose first chunk arrives after `delay` seconds; records closing."""
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        await asyncio.sleep(self.delay)
+        for index in range(2):
+            yield chunk(f"{self.name}{index} ")
+
+    async def close(self):
+        self.closed = True
+
+class Upstream:
+    """Stands in for the OpenAI call; the n-th request gets the n-th stream or error."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.opened: List[FakeStream] = []
+
+    async def start(self):
+        response = self.responses[len(self.opened)]
+        if isinstance(response, tuple):
+            delay, error = response
+            self.opened.append(None)
+            await asyncio.sleep(delay)
+            raise error
+        self.opened.append(response)
+        return response
+
+async def read(stream) -> str:
+    return "".join([item.choices[0].delta.content async for item in stream])
+
+def hedger(delay: float = 0.05) -> Hedger:
+    # Without samples the hedge delay is max_delay
+    return Hedger(min_delay=delay, max_delay=delay, max_rate=1.0, burst=5.0)
+
+async def test_fast_primary_is_not_hedged():
+    upstream = Upstream(FakeStream("primary"))
+    hedging = hedger()
+
+    stream = await hedging.open(upstream.start)
+
+    assert await read(stream) == "primary0 primary1 "
+    assert not stream.hedged
+    assert len(upstream.opened) == 1
+    assert hedging.stats()["hedged"] == 0
+
+async def test_primary_that_starts_first_wins_and_hedge_is_closed():
+    primary, hedge = FakeStream("primary", delay=0.1), FakeStream("hedge", delay=1.0)
+    upstream = Upstream(primary, hedge)
+    hedging = hedger()
+
+    stream = await hedging.open(upstream.start)
+
+    assert stream.hedged and not stream.hedge_won
+    assert await read(stream) == "primary0 primary1 "
+    assert hedge.closed and not primary.closed
+    assert hedging.hedge_wins == 0
+
+async def test_hedge_wins_and_slow_primary_is_closed():
+    primary, hedge = FakeStream("primary", delay=1.0), FakeStream("hedge")
+    upstream = Upstream(primary, hedge)
+    hedging = hedger()
+    usage = TokenUsage()
+
+    stream = await hedging.open(upstream.start, prompt_tokens=50, usage=usage)
+
+    assert stream.hedged and stream.hedge_won
+    assert await read(stream) == "hedge0 hedge1 "
+    assert primary.closed
+    assert hedging.hedge_wins == 1
+    # The cancelled request's prompt is the hedge's cost
+    assert usage.total_prompt_tokens == 50
+    assert hedging.extra_prompt_tokens == 50
+    # The hedge slot is given back once a winner is picked
+    assert admission_controller.in_flight == 0
+    await stream.close()
+    assert hedge.closed
+
+@pytest.mark.parametrize("failing", ["primary", "hedge"])
+async def test_one_failed_attempt_is_answered_by_the_other(failing):
+    error = (0.1, ConnectionError("upstream reset"))
+    if failing == "primary":
+        upstream = Upstream(error, FakeStream("hedge", delay=0.1))
+    else:
+        upstream = Upstream(FakeStream("primary", delay=0.2), error)
+    hedging = hedger()
+
+    stream = await hedging.open(upstream.start, prompt_tokens=50)
+
+    assert stream.hedged
+    assert stream.hedge_won == (failing == "primary")
+    winner = "hedge" if failing == "primary" else "primary"
+    assert await read(stream) == f"{winner}0 {winner}1 "
+    # Failed requests are not billed
+    assert hedging.extra_prompt_tokens == 0
+
+async def test_error_is_raised_when_every_attempt_fails():
+    upstream = Upstream((0.1, ConnectionError("first")), (0.1, ConnectionError("second")))
+
+    with pytest.raises(ConnectionError, match="first"):
+        await hedger().open(upstream.start)
+    assert admission_controller.in_flight == 0
@@ -0,0 +1,36 @@
+from app.core.line_splitter import IncrementalLineSplitter
+
+def split(chunks):
+    splitter = IncrementalLineSplitter()
+    lines = []
+    for chunk in chunks:
+        lines.extend(splitter.feed(chunk))
+    return lines, splitter.flush()
+
+def test_lines_split_across_chunks_are_joined():
+    assert split(["sol", "ar pa", "nel\nwind", " turbine\n"]) == (["solar panel", "wind turbine"], None)
+
+def test_chunk_with_several_lines():
+    assert split(["a\nb\nc\n"]) == (["a", "b", "c"], None)
+
+def test_final_line_without_newline_is_flushed():
+    assert split(["alpha\nbe", "ta"]) == (["alpha"], "beta")
+
+def test_empty_lines_and_chunks_are_kept_as_sent():
+    assert split(["", "a\n", "\n", "", "b"]) == (["a", ""], "b")
+
+def test_newline_at_chunk_start_ends_the_pending_line():
+    assert split(["alpha", "\nbeta"]) == (["alpha"], "beta")
+
+def test_flush_empties_the_splitter():
+    splitter = IncrementalLineSplitter()
+    splitter.feed("partial")
+    assert splitter.flush() == "partial"
+    assert splitter.flush() is None
+    assert splitter.feed("next\n") == ["next"]
+
+def test_matches_a_plain_split():
+    text = "".join(f"word {n}\n" for n in range(200)) + "tail"
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    lines, remainder = split(chunks)
+    assert lines + [remainder] == text.split("\n")
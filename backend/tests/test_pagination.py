@@ -0,0 +1,100 @@
+import base64
+import json
+import re
+import uuid
+import pytest
+from fastapi import HTTPException
+from app.core import pagination
+from app.core.pagination import InvalidCursor, after_cursor, decode_cursor, encode_cursor, page_request, split_page
+
+TIMESTAMP = "2024-05-01T12:00:00.123456+00:00"
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+class FakeQuery:
+    """Applies the PostgREST filters after_cursor adds to rows in memory."""
+
+    def __init__(self, rows, column):
+        self.rows = rows
+        self.column = column
+        self.filters = []
+
+    def lte(self, column, value):
+        self.filters.append(("lte", column, value))
+        self.rows = [row for row in self.rows if row[column] <= value]
+        return self
+
+    def or_(self, expression):
+        self.filters.append(("or", expression))
+        column = re.escape(self.column)
+        match = re.fullmatch(rf'{column}\.lt\."([^"]+)",and\({column}\.eq\."([^"]+)",id\.lt\.([0-9a-f-]+)\)', expression)
+        before, tied, row_id = match.groups()
+        self.rows = [
+            row for row in self.rows
+            if row[self.column] < before or (row[self.column] == tied and row["id"] < row_id)
+        ]
+        return self
+
+def test_cursor_round_trips():
+    row_id = str(uuid.uuid4())
+    cursor = encode_cursor(TIMESTAMP, row_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (TIMESTAMP, row_id)
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor({"updated_at": TIMESTAMP}),
+    raw_cursor([TIMESTAMP]),
+    raw_cursor([123, str(uuid.uuid4())]),
+    raw_cursor([TIMESTAMP, "42"]),
+    # Attempts to break out of the PostgREST filter
+    raw_cursor(['2024-05-01",id.gt.0', str(uuid.uuid4())]),
+    raw_cursor([TIMESTAMP, "0" * 35 + ")"]),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+def test_pages_break_timestamp_ties_on_id():
+    rows = sorted(
+        ({"id": str(uuid.uuid4()), "updated_at": TIMESTAMP if n < 5 else f"2024-04-0{n - 4}T00:00:00+00:00"} for n in range(8)),
+        key=lambda row: (row["updated_at"], row["id"]),
+        reverse=True
+    )
+
+    seen, cursor = [], None
+    while True:
+        candidates = rows if cursor is None else after_cursor(FakeQuery(rows, "updated_at"), "updated_at", cursor).rows
+        page, cursor = split_page(candidates[:3], "updated_at", 2)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    # Every row exactly once, in order, though five share a timestamp
+    assert seen == rows
+
+def test_after_cursor_filters_with_a_range_and_a_tie_break():
+    row_id = str(uuid.uuid4())
+    query = after_cursor(FakeQuery([], "created_at"), "created_at", encode_cursor(TIMESTAMP, row_id))
+    assert query.filters == [
+        ("lte", "created_at", TIMESTAMP),
+        ("or", f'created_at.lt."{TIMESTAMP}",and(created_at.eq."{TIMESTAMP}",id.lt.{row_id})'),
+    ]
+
+def test_last_page_has_no_cursor():
+    rows = [{"id": str(uuid.uuid4()), "created_at": TIMESTAMP} for _ in range(2)]
+    assert split_page(rows, "created_at", 2) == (rows, None)
+    assert split_page(rows, "created_at", None) == (rows, None)
+
+def test_page_request_defaults_caps_and_rejects(monkeypatch):
+    monkeypatch.setattr(pagination.settings, "LIST_PAGE_SIZE", 50)
+    monkeypatch.setattr(pagination.settings, "LIST_MAX_PAGE_SIZE", 200)
+    cursor = encode_cursor(TIMESTAMP, str(uuid.uuid4()))
+
+    assert page_request(None, None) == (None, None)
+    assert page_request(None, cursor) == (50, cursor)
+    assert page_request(1000, None) == (200, None)
+    with pytest.raises(HTTPException) as raised:
+        page_request(10, "tampered")
+    assert raised.value.status_code == 400
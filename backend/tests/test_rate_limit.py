@@ -0,0 +1,120 @@
+import uuid
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+from app.core import rate_limit
+from app.core.rate_limit import RATE_LIMITS, RateLimiter, limiter_for_path, rate_limit_middleware
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+def make_request(user_id: str = None, path: str = "/api/v1/projects") -> Request:
+    request = Request({"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b"", "client": ("10.0.0.1", 1234)})
+    request.state.user_id = user_id or str(uuid.uuid4())
+    return request
+
+class BrokenRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, script):
+        self.calls += 1
+        raise ConnectionError("Redis is down")
+
+def use_redis(monkeypatch, client):
+    monkeypatch.setattr(rate_limit, "get_redis_client", lambda: client)
+
+async def test_local_limit_allows_a_burst_then_one_per_interval(clock):
+    limiter = RateLimiter(times=3, seconds=60)
+    request = make_request()
+
+    decisions = [await limiter.check(request) for _ in range(4)]
+
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert [decision.remaining for decision in decisions[:3]] == [2, 1, 0]
+    assert decisions[3].retry_after_seconds() == 20
+    clock.now += 20
+    assert (await limiter.check(request)).allowed
+    assert limiter.local_checks == 5
+
+async def test_users_are_limited_separately(clock):
+    limiter = RateLimiter(times=1, seconds=60)
+    assert (await limiter.check(make_request("a"))).allowed
+    assert not (await limiter.check(make_request("a"))).allowed
+    assert (await limiter.check(make_request("b"))).allowed
+
+async def test_redis_script_limits_across_workers(fake_redis, monkeypatch):
+    use_redis(monkeypatch, fake_redis)
+    # Without headroom to spare the pre-filter never skips Redis
+    workers = [RateLimiter(times=3, seconds=60, headroom=1.0) for _ in range(2)]
+    request = make_request()
+
+    decisions = [await workers[n % 2].check(request) for n in range(4)]
+
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert 19 <= decisions[3].retry_after <= 20
+    assert sum(worker.redis_checks for worker in workers) == 4
+
+async def test_prefilter_skips_redis_while_there_is_headroom(clock, fake_redis, monkeypatch):
+    use_redis(monkeypatch, fake_redis)
+    limiter = RateLimiter(times=10, seconds=60, headroom=0.5, max_pending=5, sync_seconds=1)
+    request = make_request()
+
+    decisions = [await limiter.check(request) for _ in range(5)]
+
+    assert all(decision.allowed for decision in decisions)
+    assert limiter.redis_checks == 1 and limiter.prefilter_skips == 4
+    # Below the headroom the next check goes to Redis and charges the
+    # requests the pre-filter let through
+    assert (await limiter.check(request)).allowed
+    assert limiter.redis_checks == 2
+    other_worker = RateLimiter(times=10, seconds=60, headroom=1.0)
+    assert (await other_worker.check(request)).remaining == 3
+
+async def test_prefilter_syncs_with_redis_after_sync_seconds(clock, fake_redis, monkeypatch):
+    use_redis(monkeypatch, fake_redis)
+    limiter = RateLimiter(times=100, seconds=60, headroom=0.5, sync_seconds=1)
+    request = make_request()
+
+    await limiter.check(request)
+    await limiter.check(request)
+    assert limiter.prefilter_skips == 1
+    clock.now += 1
+    await limiter.check(request)
+    assert limiter.redis_checks == 2
+
+async def test_redis_errors_fall_back_to_local_limits(clock, monkeypatch):
+    broken = BrokenRedis()
+    use_redis(monkeypatch, broken)
+    limiter = RateLimiter(times=2, seconds=60, redis_retry_seconds=5)
+    request = make_request()
+
+    decisions = [await limiter.check(request) for _ in range(3)]
+
+    assert [decision.allowed for decision in decisions] == [True, True, False]
+    # Redis is not retried on every request while it is down
+    assert broken.calls == 1 and limiter.redis_errors == 1
+    clock.now += 5
+    await limiter.check(request)
+    assert broken.calls == 2
+
+def test_paths_map_to_limit_classes():
+    assert limiter_for_path("/api/v1/search/stream") is RATE_LIMITS["search"]
+    assert limiter_for_path("/api/v1/saved-words/bulk") is RATE_LIMITS["bulk"]
+    assert limiter_for_path("/api/v1/projects") is RATE_LIMITS["default"]
+
+async def test_middleware_answers_429_with_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter(times=1, seconds=60)
+    request = make_request()
+
+    async def call_next(request):
+        return Response("ok")
+
+    assert (await rate_limit_middleware(request, call_next, limiter)).status_code == 200
+    response = await rate_limit_middleware(request, call_next, limiter)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+    assert limiter.limited == 1
@@ -0,0 +1,103 @@
+import pytest
+from app.core import response_cache as response_cache_module
+from app.core.ownership_cache import OwnershipCache
+from app.core.response_cache import PROJECTS_SCOPE, ResponseCache, project_scope
+
+@pytest.fixture
+def ownership(monkeypatch):
+    ownership = OwnershipCache()
+    monkeypatch.setattr(response_cache_module, "ownership_cache", ownership)
+    return ownership
+
+def use_redis(monkeypatch, client):
+    monkeypatch.setattr(response_cache_module, "get_redis_client", lambda: client)
+
+async def cached(cache: ResponseCache, user_id: str, scope: str, variant: str = "/projects?"):
+    return (await cache.lookup(user_id, scope, variant)).value
+
+async def fill(cache: ResponseCache, user_id: str, scope: str, value, variant: str = "/projects?"):
+    read = await cache.lookup(user_id, scope, variant)
+    assert read.value is None
+    await cache.store(read, value)
+
+async def test_reads_are_cached_per_variant():
+    cache = ResponseCache()
+    await fill(cache, "u1", PROJECTS_SCOPE, {"page": 1}, "/projects?limit=1")
+    assert await cached(cache, "u1", PROJECTS_SCOPE, "/projects?limit=1") == {"page": 1}
+    assert await cached(cache, "u1", PROJECTS_SCOPE, "/projects?limit=2") is None
+
+async def test_invalidating_a_scope_bumps_its_generation():
+    cache = ResponseCache()
+    await fill(cache, "u1", project_scope("p1"), "p1 v1")
+    await fill(cache, "u1", project_scope("p2"), "p2 v1")
+
+    await cache.invalidate_projects("u1", ["p1"])
+
+    assert await cached(cache, "u1", project_scope("p1")) is None
+    assert await cached(cache, "u1", project_scope("p2")) == "p2 v1"
+
+async def test_write_during_a_read_invalidates_what_the_read_stores():
+    cache = ResponseCache()
+    read = await cache.lookup("u1", PROJECTS_SCOPE, "/projects?")
+    # A write lands between the database read and the store
+    await cache.invalidate("u1", [PROJECTS_SCOPE])
+    await cache.store(read, "stale")
+    assert await cached(cache, "u1", PROJECTS_SCOPE) is None
+
+async def test_invalidations_are_scoped_to_the_user():
+    cache = ResponseCache()
+    for user_id in ("u1", "u2"):
+        await fill(cache, user_id, PROJECTS_SCOPE, user_id)
+        await fill(cache, user_id, project_scope("p1"), user_id)
+
+    await cache.invalidate_user("u1")
+
+    # The user scope covers every read of that user and nobody else's
+    assert await cached(cache, "u1", PROJECTS_SCOPE) is None
+    assert await cached(cache, "u1", project_scope("p1")) is None
+    assert await cached(cache, "u2", PROJECTS_SCOPE) == "u2"
+    assert await cached(cache, "u2", project_scope("p1")) == "u2"
+
+async def test_collection_writes_invalidate_their_project(ownership):
+    cache = ResponseCache()
+    await ownership.add_collections("u1", [("c1", "p1")])
+    await fill(cache, "u1", project_scope("p1"), "p1")
+    await fill(cache, "u1", project_scope("p2"), "p2")
+
+    await cache.invalidate_collections("u1", ["c1"])
+
+    assert await cached(cache, "u1", project_scope("p1")) is None
+    assert await cached(cache, "u1", project_scope("p2")) == "p2"
+
+async def test_collection_writes_with_unknown_project_invalidate_the_user(ownership):
+    cache = ResponseCache()
+    await ownership.add_collections("u1", [("c1", "p1")])
+    await fill(cache, "u1", project_scope("p2"), "p2")
+
+    # e.g. a bulk move whose collections are not all in the ownership index
+    await cache.invalidate_collections("u1", ["c1", "c2"])
+
+    assert await cached(cache, "u1", project_scope("p2")) is None
+
+async def test_memory_is_bounded():
+    cache = ResponseCache(max_entries=2, max_entry_bytes=100)
+    for n in range(3):
+        await fill(cache, "u1", project_scope(f"p{n}"), n)
+    assert len(cache.local) == 2
+    assert await cached(cache, "u1", project_scope("p0")) is None
+
+    await fill(cache, "u1", PROJECTS_SCOPE, "x" * 200)
+    assert await cached(cache, "u1", PROJECTS_SCOPE) is None
+    assert cache.oversized == 1
+
+async def test_redis_shares_entries_and_invalidations_between_workers(fake_redis, monkeypatch):
+    use_redis(monkeypatch, fake_redis)
+    worker_a, worker_b = ResponseCache(), ResponseCache()
+
+    await fill(worker_a, "u1", PROJECTS_SCOPE, ["p1"])
+    assert await cached(worker_b, "u1", PROJECTS_SCOPE) == ["p1"]
+    assert worker_b.redis_hits == 1
+
+    await worker_a.invalidate("u1", [PROJECTS_SCOPE])
+    # Worker B's local copy is keyed by the old generation
+    assert await cached(worker_b, "u1", PROJECTS_SCOPE) is None
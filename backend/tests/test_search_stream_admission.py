@@ -0,0 +1,117 @@
+import asyncio
+import uuid
+import pytest
+from starlette.requests import Request
+from app.core import admission, repository
+from app.core.stream_coalescer import stream_coalescer
+from app.core.suggestion_cache import suggestion_cache
+from app.routes import search_streaming
+from app.routes.search_streaming import StreamSearchRequest, search_keywords_stream
+
+async def _never_receive():
+    await asyncio.Event().wait()
+
+def make_request() -> Request:
+    request = Request(
+        {"type": "http", "method": "POST", "path": "/api/v1/search/stream", "headers": [], "query_string": b""},
+        _never_receive
+    )
+    request.state.user_id = str(uuid.uuid4())
+    return request
+
+async def read_all(body) -> str:
+    async def join():
+        return "".join([chunk async for chunk in body])
+    return await asyncio.wait_for(join(), 2)
+
+async def read_until(body, text: str) -> str:
+    """Read SSE chunks until one contains `text`."""
+    read = ""
+    while text not in read:
+        read += await asyncio.wait_for(body.__anext__(), 1)
+    return read
+
+@pytest.fixture
+def controller(monkeypatch):
+    """The shared admission controller, cut down to one slot and a short wait."""
+    controller = admission.admission_controller
+    monkeypatch.setattr(controller, "max_concurrent", 1)
+    monkeypatch.setattr(controller, "max_wait", 0.05)
+    assert controller.in_flight == 0
+    return controller
+
+def admitted_first_pages(controller) -> int:
+    return controller.stats()["lanes"][admission.FIRST_PAGE_LANE]["admitted"]
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    async def owns_project(project_id, user_id):
+        return True
+    monkeypatch.setattr(repository, "verify_project_owner", owns_project)
+    monkeypatch.setattr(search_streaming.settings, "TOKEN_QUOTA_ENABLED", False)
+    monkeypatch.setattr(search_streaming.settings, "PREFETCH_ENABLED", False)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Replace OpenAI with a generation that sends one word, then waits for `finish`."""
+    finish = asyncio.Event()
+    started = []
+
+    async def generation(*args, **kwargs):
+        started.append(args)
+        yield {"word": "alpha", "match_type": "or"}
+        await finish.wait()
+        yield {"word": "beta", "match_type": "or"}
+
+    monkeypatch.setattr(search_streaming, "generate_suggestions", generation)
+    return finish, started
+
+async def test_cached_replay_takes_no_slot(controller):
+    query = f"cached {uuid.uuid4()}"
+    await suggestion_cache.set([query], "or", [{"word": "alpha", "match_type": "or"}])
+    holder = await controller.acquire(admission.FIRST_PAGE_LANE)
+
+    response = await search_keywords_stream(StreamSearchRequest(query=query, project_id="p"), make_request())
+    body = await read_all(response.body_iterator)
+
+    assert "alpha" in body and '"cached": true' in body
+    assert controller.in_flight == 1
+    holder.release()
+
+async def test_coalesced_subscribers_share_one_slot(controller, upstream):
+    finish, started = upstream
+    search = StreamSearchRequest(query=f"shared {uuid.uuid4()}", project_id="p")
+    joined = stream_coalescer.coalesced_subscribers
+    admitted = admitted_first_pages(controller)
+
+    first = (await search_keywords_stream(search, make_request())).body_iterator
+    await read_until(first, "alpha")
+    second = (await search_keywords_stream(search, make_request())).body_iterator
+    await read_until(second, "alpha")
+
+    assert len(started) == 1
+    assert stream_coalescer.coalesced_subscribers == joined + 1
+    assert controller.in_flight == 1
+    assert admitted_first_pages(controller) == admitted + 1
+
+    finish.set()
+    for body in (first, second):
+        assert "beta" in await read_all(body)
+    # Released when the shared generation ended
+    assert controller.in_flight == 0
+
+async def test_generation_without_a_free_slot_ends_with_busy_error(controller, upstream):
+    _, started = upstream
+    holder = await controller.acquire(admission.FIRST_PAGE_LANE)
+
+    response = await search_keywords_stream(
+        StreamSearchRequest(query=f"busy {uuid.uuid4()}", project_id="p"),
+        make_request()
+    )
+    body = await read_all(response.body_iterator)
+
+    assert response.status_code == 200
+    assert "Search is busy" in body and '"retry_after"' in body
+    assert started == []
+    holder.release()
+    assert controller.in_flight == 0
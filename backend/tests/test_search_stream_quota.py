@@ -0,0 +1,94 @@
+import asyncio
+import uuid
+import pytest
+from starlette.requests import Request
+from app.core import repository
+from app.core.suggestion_cache import suggestion_cache
+from app.core.token_quota import settle_after, token_quota
+from app.core.token_usage import TokenUsage
+from app.routes import search_streaming
+from app.routes.search_streaming import StreamSearchRequest, search_keywords_stream
+
+async def _never_receive():
+    await asyncio.Event().wait()
+
+def make_request(user_id: str) -> Request:
+    request = Request(
+        {"type": "http", "method": "POST", "path": "/api/v1/search/stream", "headers": [], "query_string": b""},
+        _never_receive
+    )
+    request.state.user_id = user_id
+    return request
+
+async def exhaust_budget(user_id: str):
+    decision = await token_quota.reserve(user_id, token_quota.user_limit)
+    assert decision.allowed
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    async def owns_project(project_id, user_id):
+        return True
+    monkeypatch.setattr(repository, "verify_project_owner", owns_project)
+    monkeypatch.setattr(search_streaming.settings, "TOKEN_QUOTA_ENABLED", True)
+    monkeypatch.setattr(search_streaming.settings, "PREFETCH_ENABLED", False)
+
+async def test_cached_first_page_is_served_without_budget():
+    user_id = str(uuid.uuid4())
+    query = f"cached {uuid.uuid4()}"
+    await suggestion_cache.set([query], "or", [{"word": "alpha", "match_type": "or"}])
+    await exhaust_budget(user_id)
+
+    response = await search_keywords_stream(StreamSearchRequest(query=query, project_id="p"), make_request(user_id))
+
+    assert response.status_code == 200
+    body = "".join([chunk async for chunk in response.body_iterator])
+    assert "alpha" in body
+    assert '"cached": true' in body
+
+async def test_generation_without_budget_is_rejected():
+    user_id = str(uuid.uuid4())
+    await exhaust_budget(user_id)
+
+    response = await search_keywords_stream(
+        StreamSearchRequest(query=f"uncached {uuid.uuid4()}", project_id="p"),
+        make_request(user_id)
+    )
+
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+async def test_reservation_is_refunded_when_stream_never_starts():
+    user_id = str(uuid.uuid4())
+
+    response = await search_keywords_stream(
+        StreamSearchRequest(query=f"uncached {uuid.uuid4()}", project_id="p"),
+        make_request(user_id)
+    )
+    assert response.status_code == 200
+
+    # The client left before the body was read; only the background task runs
+    await response.background()
+
+    assert (await token_quota.reserve(user_id, token_quota.user_limit)).allowed
+
+async def test_cancelled_prefetch_settles_what_it_used():
+    user_id = str(uuid.uuid4())
+    decision = await token_quota.reserve(user_id, 1000)
+    usage = TokenUsage()
+
+    async def generation():
+        usage.prompt_tokens = 100
+        yield "word"
+        await asyncio.Event().wait()
+
+    async def drain():
+        async for _ in settle_after(generation(), decision, usage):
+            pass
+
+    task = asyncio.ensure_future(drain())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert decision.settled
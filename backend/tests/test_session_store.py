@@ -0,0 +1,111 @@
+import pytest
+from app.core import session_store
+from app.core.session_store import InMemorySessionStore, RedisSessionStore
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(session_store, "time", clock)
+    return clock
+
+@pytest.fixture
+def redis_store(fake_redis, monkeypatch):
+    monkeypatch.setattr(session_store, "get_redis_client", lambda: fake_redis)
+    return RedisSessionStore(ttl_seconds=60)
+
+class BrokenRedis:
+    def pipeline(self):
+        raise ConnectionError("Redis is down")
+
+async def test_words_are_kept_per_session(clock):
+    store = InMemorySessionStore()
+    await store.add("s1", ["Alpha", "beta"])
+
+    words = await store.load("s1")
+    assert "alpha" in words and "beta" in words
+    # Loads are copies; only add records words
+    words.add("gamma")
+    assert "gamma" not in await store.load("s1")
+    assert len(await store.load("s2")) == 0
+
+async def test_sessions_expire_after_their_last_use(clock):
+    store = InMemorySessionStore(ttl_seconds=60)
+    await store.add("idle", ["a"])
+    await store.add("active", ["b"])
+
+    clock.now += 50
+    await store.load("active")
+    clock.now += 20
+
+    assert len(await store.load("idle")) == 0
+    assert "b" in await store.load("active")
+    stats = await store.stats()
+    assert stats["expirations"] == 1 and stats["evictions"] == 0
+
+async def test_least_recently_used_session_is_evicted_over_the_memory_cap(clock):
+    store = InMemorySessionStore()
+    await store.add("old", ["a"])
+    await store.add("recent", ["b"])
+    store.max_bytes = (await store.stats())["estimated_bytes"]
+    await store.load("old")
+
+    await store.add("new", ["c"])
+
+    assert len(await store.load("recent")) == 0
+    assert "a" in await store.load("old") and "c" in await store.load("new")
+    stats = await store.stats()
+    assert stats["evictions"] == 1
+    assert stats["estimated_bytes"] <= store.max_bytes
+
+async def test_session_over_the_memory_cap_on_its_own_is_kept(clock):
+    store = InMemorySessionStore(max_bytes=1)
+    await store.add("big", ["a", "b", "c"])
+    assert len(await store.load("big")) == 3
+
+async def test_session_count_is_capped(clock):
+    store = InMemorySessionStore(max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        await store.add(session_id, ["word"])
+    stats = await store.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+async def test_redis_sessions_are_shared_between_stores(redis_store):
+    await redis_store.add("s1", ["Alpha"])
+    # Another worker's store reads the same session
+    other = RedisSessionStore(ttl_seconds=60)
+    assert "alpha" in await other.load("s1")
+
+async def test_redis_expirations_are_counted_from_the_index(clock, redis_store):
+    await redis_store.add("s1", ["a"])
+    await redis_store.add("s2", ["b"])
+    assert (await redis_store.stats())["entries"] == 2
+
+    clock.now += 61
+    stats = await redis_store.stats()
+    assert stats["entries"] == 0
+    assert stats["expirations"] == 2
+    assert "evictions" not in stats
+
+async def test_redis_falls_back_to_memory_when_unreachable(redis_store, monkeypatch):
+    monkeypatch.setattr(session_store, "get_redis_client", lambda: BrokenRedis())
+
+    await redis_store.add("s1", ["a"])
+
+    assert "a" in await redis_store.load("s1")
+    assert redis_store.redis_errors == 2
+
+@pytest.mark.parametrize("mode", ["set", "fingerprint", "fingerprint_bloom"])
+async def test_each_dedup_mode_round_trips_through_redis(redis_store, mode):
+    await redis_store.add("s1", ["Alpha", "beta"], mode)
+    words = await redis_store.load("s1", mode)
+    assert "ALPHA" in words and "beta" in words and "gamma" not in words
+
+async def test_dedup_modes_of_a_session_are_kept_apart(clock, redis_store):
+    await redis_store.add("s1", ["a"], "set")
+    await redis_store.add("s1", ["b"], "fingerprint")
+
+    assert "b" not in await redis_store.load("s1", "set")
+    assert "a" not in await redis_store.load("s1", "fingerprint")
+    # One index entry per session and mode
+    assert (await redis_store.stats())["entries"] == 2
+    clock.now += 61
+    assert (await redis_store.stats())["expirations"] == 2
@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import uuid
+import pytest
+from app.core.migrations import load_migrations, migrate
+
+# A throwaway Postgres database; its tables are truncated
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+asyncpg = pytest.importorskip("asyncpg")
+
+@pytest.fixture
+async def conn():
+    await migrate(DATABASE_URL)
+    # Migrations are recorded, so a second run applies nothing
+    assert await migrate(DATABASE_URL) == []
+    connection = await asyncpg.connect(DATABASE_URL)
+    await connection.execute("TRUNCATE projects, collections, saved_words, search_sessions")
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+async def make_collection(conn, user_id: uuid.UUID, words=()) -> uuid.UUID:
+    project_id = await conn.fetchval("INSERT INTO projects (user_id, name) VALUES ($1, 'p') RETURNING id", user_id)
+    collection_id = await conn.fetchval(
+        "INSERT INTO collections (project_id, name) VALUES ($1, 'c') RETURNING id", project_id
+    )
+    for word in words:
+        await conn.execute("INSERT INTO saved_words (collection_id, word) VALUES ($1, $2)", collection_id, word)
+    return collection_id
+
+async def words_in(conn, collection_id: uuid.UUID):
+    rows = await conn.fetch("SELECT word FROM saved_words WHERE collection_id = $1", collection_id)
+    return sorted(row["word"] for row in rows)
+
+async def test_save_words_skips_existing_and_duplicates(conn):
+    user_id = uuid.uuid4()
+    collection_id = await make_collection(conn, user_id, ["old"])
+
+    rows = await conn.fetch("SELECT * FROM save_words($1, $2, $3)", user_id, collection_id, ["old", "new", "new"])
+
+    assert sorted((row["word"], row["inserted"]) for row in rows) == [("new", True), ("old", False)]
+    assert await words_in(conn, collection_id) == ["new", "old"]
+
+async def test_functions_ignore_other_users_rows(conn):
+    owner, intruder = uuid.uuid4(), uuid.uuid4()
+    collection_id = await make_collection(conn, owner, ["kept"])
+    word_ids = [row["id"] for row in await conn.fetch("SELECT id FROM saved_words")]
+
+    assert await conn.fetch("SELECT * FROM save_words($1, $2, $3)", intruder, collection_id, ["x"]) == []
+    assert await conn.fetch("SELECT * FROM add_word_to_collection($1, $2, 'x')", intruder, collection_id) == []
+    assert await conn.fetch("SELECT * FROM remove_word_from_collection($1, $2, 'kept')", intruder, collection_id) == []
+    assert await conn.fetch("SELECT * FROM delete_saved_words($1, $2)", intruder, word_ids) == []
+    assert await conn.fetch("SELECT * FROM rename_collections($1, $2, 'mine')", intruder, [collection_id]) == []
+    assert await conn.fetch("SELECT * FROM delete_collections($1, $2)", intruder, [collection_id]) == []
+
+    assert await words_in(conn, collection_id) == ["kept"]
+    assert await conn.fetchval("SELECT name FROM collections WHERE id = $1", collection_id) == "c"
+
+async def test_add_and_remove_word_return_the_collection(conn):
+    user_id = uuid.uuid4()
+    collection_id = await make_collection(conn, user_id, ["a"])
+
+    for _ in range(2):
+        added = await conn.fetchval("SELECT collection FROM add_word_to_collection($1, $2, 'b')", user_id, collection_id)
+    assert sorted(word["word"] for word in json.loads(added)["saved_words"]) == ["a", "b"]
+
+    row = await conn.fetchrow("SELECT * FROM remove_word_from_collection($1, $2, 'a')", user_id, collection_id)
+    assert row["removed"] is True
+    assert [word["word"] for word in json.loads(row["collection"])["saved_words"]] == ["b"]
+
+    row = await conn.fetchrow("SELECT * FROM remove_word_from_collection($1, $2, 'a')", user_id, collection_id)
+    assert row["removed"] is False
+
+async def test_move_saved_words_merges_into_target(conn):
+    user_id = uuid.uuid4()
+    source_id = await make_collection(conn, user_id, ["shared", "only source"])
+    target_id = await make_collection(conn, user_id, ["shared"])
+    word_ids = [row["id"] for row in await conn.fetch("SELECT id FROM saved_words WHERE collection_id = $1", source_id)]
+
+    rows = await conn.fetch("SELECT * FROM move_saved_words($1, $2, $3)", user_id, word_ids, target_id)
+
+    assert sorted(row["word"] for row in rows) == ["only source", "shared"]
+    assert await words_in(conn, source_id) == []
+    assert await words_in(conn, target_id) == ["only source", "shared"]
+
+async def test_move_collections_requires_owned_target(conn):
+    owner, other = uuid.uuid4(), uuid.uuid4()
+    collection_id = await make_collection(conn, owner)
+    foreign_project = await conn.fetchval("INSERT INTO projects (user_id, name) VALUES ($1, 'x') RETURNING id", other)
+    own_project = await conn.fetchval("INSERT INTO projects (user_id, name) VALUES ($1, 'y') RETURNING id", owner)
+
+    assert await conn.fetch("SELECT * FROM move_collections($1, $2, $3)", owner, [collection_id], foreign_project) == []
+    moved = await conn.fetch("SELECT * FROM move_collections($1, $2, $3)", owner, [collection_id], own_project)
+    assert [row["project_id"] for row in moved] == [own_project]
+
+async def test_unique_constraint_migration_keeps_oldest_duplicate(conn):
+    user_id = uuid.uuid4()
+    collection_id = await make_collection(conn, user_id)
+    await conn.execute("ALTER TABLE saved_words DROP CONSTRAINT saved_words_collection_word_key")
+    try:
+        for age in (1, 2, 3):
+            await conn.execute(
+                "INSERT INTO saved_words (collection_id, word, created_at) VALUES ($1, 'dup', now() - $2 * interval '1 day')",
+                collection_id, age
+            )
+
+        migration = next(migration for migration in load_migrations() if migration.version == 2)
+        # The block that removes duplicates and adds the constraint
+        await conn.execute(re.search(r"DO \$\$.*?END \$\$;", migration.sql, re.S).group(0))
+
+        rows = await conn.fetch("SELECT created_at FROM saved_words WHERE collection_id = $1", collection_id)
+        oldest = await conn.fetchval("SELECT now() - interval '3 days'")
+        assert len(rows) == 1
+        assert abs((rows[0]["created_at"] - oldest).total_seconds()) < 60
+    finally:
+        await conn.execute("""
+            DO $$ BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'saved_words_collection_word_key') THEN
+                    ALTER TABLE saved_words ADD CONSTRAINT saved_words_collection_word_key UNIQUE (collection_id, word);
+                END IF;
+            END $$
+        """)
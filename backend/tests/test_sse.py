@@ -0,0 +1,47 @@
+import asyncio
+import json
+from app.core.sse import batch_items, format_sse
+
+class Source:
+    """Async iterator over (delay, item) pairs that records closing."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.closed = False
+
+    async def items(self):
+        try:
+            for delay, item in self.steps:
+                await asyncio.sleep(delay)
+                yield item
+        finally:
+            self.closed = True
+
+def test_format_sse_frames_one_message():
+    frame = format_sse({"type": "suggestion", "data": {"word": "a"}})
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    assert json.loads(frame[len("data: "):]) == {"type": "suggestion", "data": {"word": "a"}}
+
+async def test_first_item_is_sent_alone_then_batches_fill_to_max_size():
+    source = Source([(0, n) for n in range(8)])
+    batches = [batch async for batch in batch_items(source.items(), max_size=3, max_delay=10)]
+    assert batches == [[0], [1, 2, 3], [4, 5, 6], [7]]
+
+async def test_partial_batch_is_flushed_at_the_deadline():
+    # Items 1 and 2 arrive quickly, then the source stalls past max_delay
+    source = Source([(0, 0), (0, 1), (0, 2), (0.2, 3)])
+    batches = [batch async for batch in batch_items(source.items(), max_size=10, max_delay=0.05)]
+    assert batches == [[0], [1, 2], [3]]
+
+async def test_remaining_items_are_flushed_when_the_source_ends():
+    source = Source([(0, n) for n in range(3)])
+    batches = [batch async for batch in batch_items(source.items(), max_size=10, max_delay=10)]
+    assert batches == [[0], [1, 2]]
+    assert source.closed
+
+async def test_source_is_closed_when_batches_stop_being_read():
+    source = Source([(0, 0), (10, 1)])
+    batches = batch_items(source.items(), max_size=10, max_delay=10)
+    assert await batches.__anext__() == [0]
+    await asyncio.wait_for(batches.aclose(), 1)
+    assert source.closed
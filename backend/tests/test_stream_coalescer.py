@@ -0,0 +1,94 @@
+import asyncio
+from app.core.stream_coalescer import StreamCoalescer
+
+class Upstream:
+    """A generation that yields `items` then waits for `finish`; records starts and cancellation."""
+
+    def __init__(self, items, error: Exception = None):
+        self.items = items
+        self.error = error
+        self.finish = asyncio.Event()
+        self.starts = 0
+        self.cancelled = False
+
+    async def generate(self):
+        self.starts += 1
+        try:
+            for item in self.items:
+                yield item
+            await self.finish.wait()
+            if self.error is not None:
+                raise self.error
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+async def collect(source, into: list):
+    async for item in source:
+        into.append(item)
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def test_late_subscriber_joins_the_running_generation():
+    coalescer = StreamCoalescer()
+    upstream = Upstream(["a", "b"])
+    first, second = [], []
+
+    first_task = asyncio.ensure_future(collect(coalescer.subscribe("q", upstream.generate), first))
+    await settle()
+    assert first == ["a", "b"]
+    second_task = asyncio.ensure_future(collect(coalescer.subscribe("q", upstream.generate), second))
+    await settle()
+
+    upstream.finish.set()
+    await asyncio.gather(first_task, second_task)
+
+    # The late subscriber replays from the start of the one generation
+    assert first == second == ["a", "b"]
+    assert upstream.starts == 1
+    assert coalescer.stats()["coalesced_subscribers"] == 1
+    assert coalescer.stats()["inflight"] == 0
+
+async def test_finished_generation_is_not_joined():
+    coalescer = StreamCoalescer()
+    upstream = Upstream(["a"])
+    upstream.finish.set()
+
+    for _ in range(2):
+        items = []
+        await collect(coalescer.subscribe("q", upstream.generate), items)
+        assert items == ["a"]
+    assert upstream.starts == 2
+
+async def test_error_reaches_every_subscriber():
+    coalescer = StreamCoalescer()
+    upstream = Upstream(["a"], error=RuntimeError("upstream failed"))
+    received = [[], []]
+    tasks = [asyncio.ensure_future(collect(coalescer.subscribe("q", upstream.generate), items)) for items in received]
+    await settle()
+
+    upstream.finish.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert [str(result) for result in results] == ["upstream failed", "upstream failed"]
+    assert received == [["a"], ["a"]]
+    assert coalescer.stats()["failed_generations"] == 1
+
+async def test_last_subscriber_leaving_cancels_the_upstream():
+    coalescer = StreamCoalescer()
+    upstream = Upstream(["a"])
+    subscribers = [coalescer.subscribe("q", upstream.generate) for _ in range(2)]
+    for subscriber in subscribers:
+        assert await subscriber.__anext__() == "a"
+
+    await subscribers[0].aclose()
+    await settle()
+    assert not upstream.cancelled
+
+    await subscribers[1].aclose()
+    await settle()
+    assert upstream.cancelled
+    assert coalescer.stats()["cancelled_generations"] == 1
+    assert coalescer.stats()["inflight"] == 0
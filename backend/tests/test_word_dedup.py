@@ -0,0 +1,72 @@
+import pytest
+from app.core.word_dedup import BloomFingerprintSet, FingerprintSet, create_word_set, fingerprint
+
+MODES = ["set", "fingerprint", "fingerprint_bloom"]
+WORDS = [f"word {n}" for n in range(5000)]
+
+@pytest.mark.parametrize("mode", MODES)
+def test_add_reports_new_words_only(mode):
+    words = create_word_set(mode)
+    assert words.add("Alpha")
+    assert not words.add("alpha")
+    assert not words.add("ALPHA")
+    assert words.add("beta")
+    assert len(words) == 2
+
+@pytest.mark.parametrize("mode", MODES)
+def test_membership_ignores_case(mode):
+    words = create_word_set(mode)
+    words.add("Solar Panel")
+    assert "solar panel" in words
+    assert "SOLAR PANEL" in words
+    assert "solar" not in words
+
+@pytest.mark.parametrize("mode", MODES)
+def test_membership_survives_growth(mode):
+    words = create_word_set(mode)
+    for word in WORDS:
+        assert words.add(word)
+    assert len(words) == len(WORDS)
+    assert all(word in words for word in WORDS)
+    assert not any(f"other {n}" in words for n in range(1000))
+
+@pytest.mark.parametrize("mode", MODES)
+def test_members_rebuild_the_same_set(mode):
+    words = create_word_set(mode)
+    for word in WORDS[:100]:
+        words.add(word)
+    # How sessions are read back from Redis
+    rebuilt = create_word_set(mode, list(words.members()))
+    assert len(rebuilt) == 100
+    assert all(word in rebuilt for word in WORDS[:100])
+
+@pytest.mark.parametrize("mode", MODES)
+def test_copies_are_independent(mode):
+    words = create_word_set(mode)
+    words.add("a")
+    clone = words.copy()
+    clone.add("b")
+    assert "b" not in words
+    assert "a" in clone and len(clone) == 2
+
+def test_bloom_filter_has_no_false_negatives():
+    # A filter far too small for its words is saturated, not wrong
+    for bloom_bits in (64, BloomFingerprintSet.DEFAULT_BLOOM_BITS):
+        words = BloomFingerprintSet(bloom_bits=bloom_bits)
+        for word in WORDS:
+            words.add(word)
+        assert all(word in words for word in WORDS)
+
+def test_fingerprint_members_are_signed_64_bit():
+    words = FingerprintSet()
+    for word in WORDS[:200]:
+        words.add(word)
+    values = [int(member) for member in words.members()]
+    assert all(-(1 << 63) <= value < (1 << 63) and value != 0 for value in values)
+
+def test_fingerprints_ignore_case():
+    assert fingerprint("Alpha") == fingerprint("alpha") != fingerprint("beta")
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        create_word_set("bitmap")